@@ -64,6 +64,10 @@ def create_app(test_config=None):
     app.register_blueprint(audio_blueprint)
     app.register_blueprint(report_blueprint)
 
+    # 註冊指標端點與請求計時
+    from routes.metrics_routes import init_metrics
+    init_metrics(app)
+
     # 主頁路由重定向到儀表板
     @app.route('/')
     def index():
@@ -114,13 +118,41 @@ def create_app(test_config=None):
         except ImportError:
             return text
 
-    # 創建數據庫表格
+    # 創建數據庫表格，並為既有的資料表補上新版本加入的欄位
+    from models.schema_upgrades import upgrade_schema
     with app.app_context():
         db.create_all()
+        upgrade_schema(db.engine, db.metadata)
+
+    # 初始化工作排程器，恢復上次中斷的工作並在關閉時等待執行中的工作完成
+    _init_job_scheduler(app)
 
     return app
 
 
+def _init_job_scheduler(app):
+    """初始化工作排程器並恢復被中斷的工作"""
+    import atexit
+
+    # 導入處理器以註冊各類工作的處理函數
+    import processors.audio_processor  # noqa: F401
+    import processors.report_generator  # noqa: F401
+    from processors.job_scheduler import get_job_scheduler
+
+    scheduler = get_job_scheduler(app)
+
+    # 只有伺服器入口 (run.py) 啟用恢復，其他以 create_app() 建立的應用不接手中斷的工作
+    if app.config.get('JOB_RECOVERY_ON_STARTUP', False):
+        with app.app_context():
+            try:
+                scheduler.recover_abandoned_jobs()
+            except Exception as e:
+                app.logger.error(f"恢復中斷的工作時發生錯誤: {e}")
+
+    atexit.register(scheduler.shutdown, wait=True, timeout=app.config.get('JOB_SHUTDOWN_TIMEOUT', 30))
+
+
 if __name__ == '__main__':
-    app = create_app()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app = create_app({'JOB_RECOVERY_ON_STARTUP': True})
+    # 不使用重新載入器: 監看行程也會建立應用並恢復工作，其進度與隊列位置對處理請求的子行程不可見
+    app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批次處理命令列工具
+將目錄或萬用字元指定的錄音登記到資料庫並完成轉錄 (可選擇同時生成報告)，
+結果會出現在指定使用者的網頁儀表板中；已處理完成的錄音會略過
+
+用法:
+    python batch.py archive/ --user me@example.com --recursive --workers 2 --report
+    python batch.py "archive/2023-*.mp3" --user me@example.com --log backfill.jsonl
+"""
+
+import argparse
+import datetime
+import sys
+
+from app import create_app
+
+
+def parse_args():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="批次處理錄音")
+    parser.add_argument("inputs", nargs="+", help="錄音檔案、目錄或萬用字元")
+    parser.add_argument("--user", required=True, help="擁有這些錄音的使用者 email")
+    parser.add_argument("--recursive", action="store_true", help="遞迴搜尋子目錄 (萬用字元可使用 **)")
+    parser.add_argument("--whisper-model", default=None, help="Whisper 模型名稱，預設使用 config.py 的設定")
+    parser.add_argument("--language", default=None, help="語言代碼，預設使用 config.py 的設定")
+    parser.add_argument("--speakers", type=int, default=None, help="固定的說話者人數")
+    parser.add_argument("--speaker-min", type=int, default=None, help="最小說話者人數")
+    parser.add_argument("--speaker-max", type=int, default=None, help="最大說話者人數")
+    parser.add_argument("--workers", type=int, default=None, help="同時處理的錄音數量 (共用已載入的模型)")
+    parser.add_argument("--device", default=None, help="計算設備 (cpu 或 cuda)")
+    parser.add_argument("--report", action="store_true", help="轉錄完成後生成報告")
+    parser.add_argument("--report-workers", type=int, default=None, help="同時生成的報告數量")
+    parser.add_argument("--ollama-model", default=None, help="生成報告使用的模型")
+    parser.add_argument("--prompt-file", default=None, help="生成報告使用的系統提示詞檔案")
+    parser.add_argument("--title-prefix", default=None, help="報告標題前綴")
+    parser.add_argument("--retry-failed", action="store_true", help="重新處理先前失敗的錄音")
+    parser.add_argument("--log", dest="log_path", default=None,
+                        help="JSON Lines 記錄檔路徑，預設為 batch_<時間>.jsonl")
+    parser.add_argument("--progress-interval", type=float, default=30, help="寫入進度事件的間隔 (秒)")
+    parser.add_argument("--dry-run", action="store_true", help="只列出找到的錄音，不處理")
+    return parser.parse_args()
+
+
+def build_config(args):
+    """依命令列參數覆寫應用配置"""
+    # 批次處理不接手網頁伺服器被中斷的工作，只由 BatchRunner 恢復本批錄音被中斷的工作
+    overrides = {'JOB_RECOVERY_ON_STARTUP': False}
+    if args.workers:
+        overrides['AUDIO_WORKER_COUNT'] = args.workers
+    if args.report_workers:
+        overrides['LLM_WORKER_COUNT'] = args.report_workers
+    if args.device:
+        overrides['DEVICE'] = args.device
+    return overrides
+
+
+def main():
+    """主函數"""
+    args = parse_args()
+    app = create_app(build_config(args))
+
+    from models.user import User
+    from processors.batch_runner import BatchLog, BatchRunner, discover_audio_files
+    from processors.job_scheduler import get_job_scheduler
+
+    with app.app_context():
+        user = User.query.filter_by(email=args.user).first()
+        if user is None:
+            print(f"找不到使用者: {args.user}")
+            sys.exit(1)
+
+        paths = discover_audio_files(args.inputs, app.config['ALLOWED_EXTENSIONS'], args.recursive)
+        print(f"找到 {len(paths)} 個錄音")
+        if args.dry_run:
+            for path in paths:
+                print(f"  {path}")
+            return
+        if not paths:
+            return
+
+        report_options = None
+        if args.report:
+            system_prompt = None
+            if args.prompt_file:
+                with open(args.prompt_file, "r", encoding="utf-8") as f:
+                    system_prompt = f.read()
+            report_options = {
+                "title_prefix": args.title_prefix,
+                "ollama_model": args.ollama_model,
+                "system_prompt": system_prompt,
+            }
+
+        log_path = args.log_path or f"batch_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        log = BatchLog(log_path)
+        print(f"記錄檔: {log_path}")
+
+        runner = BatchRunner(
+            app,
+            user,
+            log,
+            options={
+                "whisper_model": args.whisper_model,
+                "language": args.language,
+                "speakers_count": args.speakers,
+                "speaker_min": args.speaker_min,
+                "speaker_max": args.speaker_max,
+            },
+            report_options=report_options,
+            retry_failed=args.retry_failed,
+            progress_interval=args.progress_interval,
+        )
+
+        try:
+            summary = runner.run(paths)
+        except KeyboardInterrupt:
+            # 尚未完成的錄音保持處理中，以相同參數重新執行批次處理時恢復
+            log.write("interrupted")
+            print("已中斷，等待執行中的工作結束...")
+            get_job_scheduler().shutdown(wait=True, timeout=app.config.get('JOB_SHUTDOWN_TIMEOUT', 30))
+            sys.exit(130)
+        finally:
+            log.close()
+
+    print(f"完成 {summary['completed']} 個，略過 {summary['skipped']} 個，失敗 {summary['failed']} 個，"
+          f"報告 {summary['reports']} 份，耗時 {summary['seconds']:.0f} 秒")
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
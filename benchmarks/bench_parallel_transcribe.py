@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多行程分段轉錄效能測試
+以不同的工作行程數量轉錄同一段錄音，回報即時因子 (RTF = 轉錄耗時 / 錄音長度)
+
+用法:
+    python benchmarks/bench_parallel_transcribe.py audio.wav --model base --workers 1,2,4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.audio_decode import decode_canonical, waveform_duration
+from utils.audio_vad import split_on_silence
+from processors.parallel_transcriber import (
+    transcribe_parallel, shutdown_shard_pool, default_threads_per_worker
+)
+
+
+def parse_args():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="多行程分段轉錄效能測試")
+    parser.add_argument("audio", help="音訊檔案路徑")
+    parser.add_argument("--model", default="base", help="Whisper 模型名稱")
+    parser.add_argument("--language", default=None, help="語言代碼，若未指定則自動偵測")
+    parser.add_argument("--workers", default="1,2,4", help="要測試的行程數量，以逗號分隔")
+    parser.add_argument("--threads", type=int, default=None, help="每個行程的線程數，預設平均分配 CPU 核心")
+    parser.add_argument("--shard-seconds", type=float, default=120, help="每個分段的最長秒數")
+    parser.add_argument("--json", dest="json_path", default=None, help="將結果輸出為 JSON 檔案")
+    return parser.parse_args()
+
+
+def run_once(audio_path, shards, args, workers):
+    """以指定行程數量轉錄一次，返回 (載入模型耗時, 轉錄耗時, 片段數)"""
+    shutdown_shard_pool()
+    threads = args.threads or default_threads_per_worker(workers)
+    options = {"language": args.language} if args.language else {}
+
+    # 先以一個極短分段預熱，讓每個行程載入模型，不計入轉錄耗時
+    warmup_start = time.perf_counter()
+    warmup = [{"start": 0, "end": min(shards[0]["end"], 16000)}] * workers
+    transcribe_parallel(audio_path, warmup, args.model, options, workers, threads)
+    warmup_seconds = time.perf_counter() - warmup_start
+
+    start = time.perf_counter()
+    result = transcribe_parallel(audio_path, shards, args.model, options, workers, threads)
+    elapsed = time.perf_counter() - start
+
+    return warmup_seconds, elapsed, len(result["segments"])
+
+
+def main():
+    """主函數"""
+    args = parse_args()
+    worker_counts = [int(value) for value in args.workers.split(",") if value.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, "bench_16k.f32")
+        waveform = decode_canonical(args.audio, cache_path=cache_path)
+        duration = waveform_duration(waveform)
+        shards = split_on_silence(waveform, max_window_seconds=args.shard_seconds)
+
+        if not shards:
+            print("音訊沒有任何內容")
+            sys.exit(1)
+
+        print(f"音訊長度: {duration:.1f} 秒，分段數: {len(shards)}，模型: {args.model}，"
+              f"CPU 核心數: {os.cpu_count()}")
+        print(f"{'行程數':>6} {'線程/行程':>10} {'預熱(秒)':>10} {'轉錄(秒)':>10} {'RTF':>8} {'加速比':>8} {'片段數':>8}")
+
+        results = []
+        baseline = None
+        for workers in worker_counts:
+            warmup_seconds, elapsed, segment_count = run_once(cache_path, shards, args, workers)
+            baseline = baseline or elapsed
+            row = {
+                "workers": workers,
+                "threads_per_worker": args.threads or default_threads_per_worker(workers),
+                "warmup_seconds": round(warmup_seconds, 3),
+                "elapsed_seconds": round(elapsed, 3),
+                "rtf": round(elapsed / duration, 4),
+                "speedup": round(baseline / elapsed, 2),
+                "segments": segment_count,
+            }
+            results.append(row)
+            print(f"{row['workers']:>6} {row['threads_per_worker']:>10} {row['warmup_seconds']:>10.2f} "
+                  f"{row['elapsed_seconds']:>10.2f} {row['rtf']:>8.3f} {row['speedup']:>8.2f} {row['segments']:>8}")
+
+        shutdown_shard_pool()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "audio": args.audio,
+                "duration": duration,
+                "model": args.model,
+                "shards": len(shards),
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+音訊處理流程離線效能測試
+以合成的多人對話錄音與假的 Whisper / Pyannote 引擎完整執行 AudioProcessor，
+量測框架本身的開銷: 解碼、整合結果、輸出 CSV/TXT、繪製圖表與進度寫入資料庫的次數；
+不需要 GPU、網路或下載模型
+
+結果可輸出為 JSON，並與先前 (例如其他 commit) 的結果比較，超過門檻的退步會以非零狀態碼結束
+
+用法:
+    python benchmarks/bench_pipeline.py --durations 60,600,3600 --json after.json --baseline before.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from benchmarks.fake_engines import (
+    FakeWhisper, FakeDiarizationPipeline, install_fake_engines, write_synthetic_wav
+)
+
+# 不屬於 StageMetric 的額外量測項目
+TOTAL = "總耗時"
+RENDER_FULL = "繪製完整圖表"
+RENDER_THUMBNAIL = "繪製縮圖"
+
+
+def parse_args():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="音訊處理流程離線效能測試")
+    parser.add_argument("--durations", default="60,600", help="合成錄音的長度 (秒)，以逗號分隔")
+    parser.add_argument("--speakers", type=int, default=3, help="說話者人數")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="合成錄音的取樣率 (非 16 kHz 時會量測重新取樣)")
+    parser.add_argument("--channels", type=int, default=2, help="合成錄音的聲道數")
+    parser.add_argument("--repeat", type=int, default=3, help="每個長度重複執行的次數 (取中位數)")
+    parser.add_argument("--whisper-rtf", type=float, default=0.0, help="假 Whisper 模擬的即時率 (0 表示不模擬運算時間)")
+    parser.add_argument("--diarize-rtf", type=float, default=0.0, help="假 Pyannote 模擬的即時率 (0 表示不模擬運算時間)")
+    parser.add_argument("--streaming-min", type=float, default=None,
+                        help="改用串流轉錄的錄音長度 (秒)，預設使用 config.py 的設定")
+    parser.add_argument("--sequential", action="store_true", help="依序 (而非同時) 執行轉錄與說話者分割")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--json", dest="json_path", default=None, help="將結果輸出為 JSON 檔案")
+    parser.add_argument("--baseline", default=None, help="與先前輸出的 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=0.2, help="視為退步的耗時增加比例")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="耗時差距小於此秒數時不視為退步")
+    return parser.parse_args()
+
+
+def build_config(work_dir, args):
+    """建立指向暫存目錄的應用配置"""
+    output_folder = os.path.join(work_dir, "outputs")
+    config = {
+        "TESTING": True,
+        "SECRET_KEY": "bench",
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(work_dir, "bench.db"),
+        "UPLOAD_FOLDER": os.path.join(work_dir, "uploads"),
+        "OUTPUT_FOLDER": output_folder,
+        "TRANSCRIPT_FOLDER": os.path.join(output_folder, "transcripts"),
+        "VISUALIZATION_FOLDER": os.path.join(output_folder, "visualizations"),
+        "REPORT_FOLDER": os.path.join(output_folder, "reports"),
+        "REPORT_DEBUG_FOLDER": os.path.join(output_folder, "debug"),
+        "STATIC_VISUALIZATION_FOLDER": os.path.join(work_dir, "static", "visualizations"),
+        "DEVICE": "cpu",
+        # 每次都完整處理，不使用結果快取
+        "RESULT_CACHE_ENABLED": False,
+        "CPU_PARALLEL_WORKERS": 0,
+        "PARALLEL_TRANSCRIBE_DIARIZE": not args.sequential,
+        # 縮圖由效能測試同步繪製並個別計時，避免背景繪圖影響下一次執行
+        "DEFAULT_VISUALIZE": False,
+        "JOB_RECOVERY_ON_STARTUP": False,
+        "METRICS_ENABLED": False,
+    }
+    if args.streaming_min is not None:
+        config["STREAMING_TRANSCRIBE_MIN_DURATION"] = args.streaming_min
+    return config
+
+
+class CommitCounter:
+    """計算資料庫 commit 次數 (進度寫入、狀態更新等)"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Session, "after_commit", self._on_commit)
+
+    def _on_commit(self, session):
+        self.count += 1
+
+    def close(self):
+        event.remove(Session, "after_commit", self._on_commit)
+
+
+def git_revision():
+    """取得目前的 git commit，無法取得時返回 None"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, *args):
+    """執行函數並返回耗時 (秒)"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_once(app, user_id, audio_path, counter):
+    """
+    處理一次合成錄音
+
+    Returns:
+        dict: {"timings": {階段名稱: 秒數}, "db_commits": 次數, "segments": 片段數}
+    """
+    from extensions import db
+    from models.db_models import AudioFile, ProcessingStatus
+    from processors.audio_processor import AudioProcessor, latest_transcript
+    from processors.stage_metrics import latest_run_metrics
+    from utils.visualization import ensure_rendered, FULL, THUMBNAIL
+
+    audio_file = AudioFile(
+        filename=os.path.basename(audio_path),
+        original_filename=os.path.basename(audio_path),
+        file_path=audio_path,
+        file_size=os.path.getsize(audio_path),
+        whisper_model="fake",
+        user_id=user_id,
+    )
+    db.session.add(audio_file)
+    db.session.commit()
+
+    processor = AudioProcessor(audio_file.id)
+    commits_before = counter.count
+    elapsed = timed(processor._process_audio_file)
+    db_commits = counter.count - commits_before
+
+    db.session.refresh(audio_file)
+    if audio_file.status != ProcessingStatus.COMPLETED:
+        raise RuntimeError(f"處理失敗: {audio_file.error_message}")
+
+    timings = {TOTAL: elapsed}
+    for metric in latest_run_metrics(audio_file_id=audio_file.id):
+        timings[metric.stage] = metric.wall_seconds
+
+    transcript = latest_transcript(audio_file.id)
+    base_path = os.path.splitext(transcript.csv_path)[0]
+    timings[RENDER_FULL] = timed(ensure_rendered, transcript.csv_path, f"{base_path}_full.png", FULL)
+    timings[RENDER_THUMBNAIL] = timed(ensure_rendered, transcript.csv_path, f"{base_path}_thumb.png", THUMBNAIL)
+
+    with open(transcript.csv_path, encoding="utf-8") as f:
+        segments = sum(1 for _ in f) - 1
+
+    return {"timings": timings, "db_commits": db_commits, "segments": segments}
+
+
+def summarize(runs):
+    """以中位數彙整多次執行的結果"""
+    stages = []
+    for run in runs:
+        stages.extend(stage for stage in run["timings"] if stage not in stages)
+
+    return {
+        "timings": {
+            stage: round(statistics.median(run["timings"][stage] for run in runs if stage in run["timings"]), 4)
+            for stage in stages
+        },
+        "db_commits": int(statistics.median(run["db_commits"] for run in runs)),
+        "segments": runs[0]["segments"],
+    }
+
+
+def compare(results, baseline_path, threshold, min_seconds):
+    """
+    與先前的結果比較
+
+    Returns:
+        list: 退步的項目 [(錄音長度, 階段名稱, 先前秒數, 目前秒數), ...]
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    previous = {str(row["duration"]): row for row in baseline.get("results", [])}
+    regressions = []
+
+    print(f"\n與 {baseline_path} (commit {baseline.get('meta', {}).get('git_revision')}) 比較:")
+    print(f"{'長度(秒)':>8}  {'階段':<10} {'先前(秒)':>10} {'目前(秒)':>10} {'變化':>8}")
+
+    for row in results:
+        old = previous.get(str(row["duration"]))
+        if old is None:
+            continue
+
+        for stage, seconds in row["timings"].items():
+            old_seconds = old["timings"].get(stage)
+            if old_seconds is None:
+                continue
+
+            change = (seconds - old_seconds) / old_seconds if old_seconds > 0 else 0.0
+            regressed = change > threshold and seconds - old_seconds > min_seconds
+            if regressed:
+                regressions.append((row["duration"], stage, old_seconds, seconds))
+
+            print(f"{row['duration']:>8}  {stage:<10} {old_seconds:>10.3f} {seconds:>10.3f} "
+                  f"{change:>+8.1%}{'  (退步)' if regressed else ''}")
+
+        if row["db_commits"] != old.get("db_commits"):
+            print(f"{row['duration']:>8}  資料庫寫入次數: {old.get('db_commits')} -> {row['db_commits']}")
+
+    return regressions
+
+
+def main():
+    """主函數"""
+    args = parse_args()
+    durations = [float(value) for value in args.durations.split(",") if value.strip()]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        from app import create_app
+        from extensions import db
+        from models.user import User
+        from processors.model_registry import get_model_registry
+
+        app = create_app(build_config(work_dir, args))
+        counter = CommitCounter()
+
+        results = []
+        with app.app_context():
+            install_fake_engines(
+                get_model_registry(app.config),
+                whisper=FakeWhisper(compute_rtf=args.whisper_rtf, seed=args.seed),
+                diarization=FakeDiarizationPipeline(args.speakers, compute_rtf=args.diarize_rtf, seed=args.seed),
+            )
+
+            user = User(email="bench@example.com", password="-", name="bench")
+            db.session.add(user)
+            db.session.commit()
+
+            print(f"說話者: {args.speakers}，取樣率: {args.sample_rate} Hz，聲道數: {args.channels}，"
+                  f"重複次數: {args.repeat}，CPU 核心數: {os.cpu_count()}")
+
+            for duration in durations:
+                runs = []
+                for _ in range(args.repeat):
+                    # 每次使用獨立的上傳目錄，與實際上傳相同
+                    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], uuid.uuid4().hex)
+                    os.makedirs(upload_dir)
+                    audio_path = os.path.join(upload_dir, f"bench_{int(duration)}s.wav")
+                    write_synthetic_wav(audio_path, duration, args.speakers, args.seed,
+                                        sample_rate=args.sample_rate, channels=args.channels)
+                    runs.append(run_once(app, user.id, audio_path, counter))
+
+                row = {"duration": duration, **summarize(runs)}
+                results.append(row)
+
+                print(f"\n錄音長度 {duration:.0f} 秒 (片段數 {row['segments']}，資料庫寫入 {row['db_commits']} 次):")
+                for stage, seconds in row["timings"].items():
+                    print(f"  {stage:<10} {seconds:>10.3f} 秒  RTF {seconds / duration:.5f}")
+
+        counter.close()
+
+    output = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入: {args.json_path}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} 個項目的耗時增加超過 {args.threshold:.0%}")
+            sys.exit(1)
+        print("\n沒有發現效能退步")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+說話者指派效能測試
+比較逐一比對 (O(N·M)) 與排序區間演算法的耗時，並確認兩者結果完全相同
+
+用法:
+    python benchmarks/bench_speaker_assignment.py --transcripts 10000 --speakers 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.speaker_assignment import assign_speakers
+
+
+def parse_args():
+    """解析命令列參數"""
+    parser = argparse.ArgumentParser(description="說話者指派效能測試")
+    parser.add_argument("--transcripts", type=int, default=10000, help="轉錄片段數量")
+    parser.add_argument("--speakers", type=int, default=10000, help="說話者片段數量")
+    parser.add_argument("--labels", type=int, default=6, help="說話者人數")
+    parser.add_argument("--naive-sample", type=int, default=500,
+                        help="以逐一比對驗證的轉錄片段數量 (0 表示全部)，並以此推估完整耗時")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    return parser.parse_args()
+
+
+def make_segments(count, duration, rng, speaker_labels=None):
+    """產生依時間排列、長度隨機且可能重疊的片段"""
+    segments = []
+    step = duration / count
+    for index in range(count):
+        start = max(0.0, index * step + rng.uniform(-step, step))
+        segment = {"start": start, "end": start + rng.uniform(0.2, 3 * step)}
+        if speaker_labels:
+            segment["speaker"] = rng.choice(speaker_labels)
+        segments.append(segment)
+    return segments
+
+
+def assign_naive(transcript_segments, speaker_segments):
+    """原本的逐一比對實作"""
+    labels = []
+    for ts in transcript_segments:
+        max_overlap = 0
+        assigned_speaker = "unknown"
+
+        for ss in speaker_segments:
+            overlap_start = max(ts["start"], ss["start"])
+            overlap_end = min(ts["end"], ss["end"])
+            overlap = max(0, overlap_end - overlap_start)
+
+            if overlap > max_overlap:
+                max_overlap = overlap
+                assigned_speaker = ss["speaker"]
+
+        labels.append(assigned_speaker)
+    return labels
+
+
+def main():
+    """主函數"""
+    args = parse_args()
+    rng = random.Random(args.seed)
+    labels = [f"SPEAKER_{index:02d}" for index in range(args.labels)]
+
+    # 以每個轉錄片段約 4 秒估計錄音長度
+    duration = args.transcripts * 4.0
+    transcripts = make_segments(args.transcripts, duration, rng)
+    speakers = make_segments(args.speakers, duration, rng, labels)
+    print(f"轉錄片段: {len(transcripts)}，說話者片段: {len(speakers)}，錄音長度: {duration / 3600:.1f} 小時")
+
+    start = time.perf_counter()
+    fast = assign_speakers(transcripts, speakers)
+    fast_seconds = time.perf_counter() - start
+    print(f"排序區間演算法: {fast_seconds * 1000:.1f} 毫秒")
+
+    sample = args.naive_sample or len(transcripts)
+    sample = min(sample, len(transcripts))
+    start = time.perf_counter()
+    naive = assign_naive(transcripts[:sample], speakers)
+    naive_seconds = time.perf_counter() - start
+    estimated = naive_seconds * len(transcripts) / sample
+
+    label = "逐一比對" if sample == len(transcripts) else f"逐一比對 (以 {sample} 個片段推估)"
+    print(f"{label}: {estimated * 1000:.1f} 毫秒")
+    print(f"加速比: {estimated / fast_seconds:.1f}x")
+
+    if naive != fast[:sample]:
+        mismatches = sum(1 for a, b in zip(naive, fast) if a != b)
+        print(f"結果不一致: {mismatches} 個片段")
+        sys.exit(1)
+
+    print(f"結果一致 (已驗證 {sample} 個片段，其中 {fast[:sample].count('unknown')} 個為 unknown)")
+
+
+if __name__ == "__main__":
+    main()
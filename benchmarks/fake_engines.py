@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+效能測試用的假引擎與合成音訊
+以決定性的假 Whisper 模型與假 Pyannote 管線取代真實模型，讓音訊處理流程可以在沒有 GPU、
+不下載模型的環境中完整執行，只量測框架本身的開銷 (解碼、整合、輸出檔案、進度寫入等)
+
+假引擎沿用真實引擎的進度回報方式 (Whisper 的 tqdm 進度條、Pyannote 的 hook)，
+因此進度轉接器與取消檢查的開銷也會計入
+"""
+
+import random
+import time
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+# 合成音訊的說話者音高 (Hz)
+_SPEAKER_PITCHES = (110, 145, 190, 230, 270, 320, 360, 410)
+
+# 假轉錄文字使用的字詞
+_WORDS = ("我們", "今天", "討論", "專案", "進度", "目前", "已經", "完成", "測試", "下一步",
+          "需要", "確認", "預算", "時程", "客戶", "回饋", "問題", "處理", "報告", "會議")
+
+# Whisper 每個影格對應的取樣數 (16 kHz，hop length 160)，每個解碼視窗 3000 個影格 (30 秒)
+_SAMPLES_PER_FRAME = 160
+_FRAMES_PER_WINDOW = 3000
+
+Segment = namedtuple("Segment", ["start", "end"])
+
+
+def speaker_schedule(duration, speakers=3, seed=0, mean_turn=8.0, pause=0.5):
+    """
+    產生決定性的說話者輪替時間表
+
+    Args:
+        duration: 錄音長度 (秒)
+        speakers: 說話者人數
+        seed: 亂數種子
+        mean_turn: 平均每次發言長度 (秒)
+        pause: 兩次發言之間的靜音長度 (秒)
+
+    Returns:
+        list: [(起點秒數, 終點秒數, 說話者編號), ...]
+    """
+    rng = random.Random(seed)
+    turns = []
+    position = 0.0
+    speaker = 0
+    while position < duration:
+        length = min(rng.uniform(0.3, 1.7) * mean_turn, duration - position)
+        turns.append((position, position + length, speaker))
+        position += length + pause
+        # 下一位說話者與目前不同
+        speaker = (speaker + rng.randrange(1, speakers)) % speakers if speakers > 1 else 0
+    return turns
+
+
+def write_synthetic_wav(path, duration, speakers=3, seed=0, sample_rate=16000, channels=1, block_seconds=60):
+    """
+    寫入多人對話的合成錄音 (16 位元 PCM WAV)
+
+    每位說話者以不同音高的諧波加上約每秒 4 次的音節起伏模擬語音，發言之間保留靜音，
+    讓靜音切割與串流轉錄可以找到切點；以區塊寫入，長錄音也不會佔用大量記憶體
+
+    Args:
+        path: 輸出路徑
+        duration: 錄音長度 (秒)
+        speakers: 說話者人數
+        seed: 亂數種子 (與 FakeDiarizationPipeline 相同時，分割結果與錄音內容一致)
+        sample_rate: 取樣率
+        channels: 聲道數
+        block_seconds: 每次寫入的區塊長度 (秒)
+
+    Returns:
+        list: speaker_schedule 產生的說話者時間表
+    """
+    turns = speaker_schedule(duration, speakers, seed)
+    total_samples = int(duration * sample_rate)
+    block_samples = int(block_seconds * sample_rate)
+    noise = np.random.default_rng(seed)
+
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+
+        turn_index = 0
+        for block_start in range(0, total_samples, block_samples):
+            block_end = min(block_start + block_samples, total_samples)
+            t = np.arange(block_start, block_end) / sample_rate
+            block = noise.normal(0, 0.002, len(t))
+
+            # 找出與此區塊重疊的發言
+            while turn_index < len(turns) and turns[turn_index][1] < t[0]:
+                turn_index += 1
+            index = turn_index
+            while index < len(turns) and turns[index][0] <= t[-1]:
+                start, end, speaker = turns[index]
+                mask = (t >= start) & (t < end)
+                pitch = _SPEAKER_PITCHES[speaker % len(_SPEAKER_PITCHES)]
+                tt = t[mask]
+                voice = (np.sin(2 * np.pi * pitch * tt)
+                         + 0.5 * np.sin(4 * np.pi * pitch * tt)
+                         + 0.25 * np.sin(6 * np.pi * pitch * tt))
+                envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * tt) ** 2
+                block[mask] += 0.2 * voice * envelope
+                index += 1
+
+            samples = (np.clip(block, -1, 1) * 32767).astype("<i2")
+            if channels > 1:
+                samples = np.repeat(samples[:, None], channels, axis=1)
+            wav.writeframes(samples.tobytes())
+
+    return turns
+
+
+def _simulate_compute(total_seconds, steps, on_step):
+    """將模擬的運算時間平均分配到各步驟，每步完成後呼叫 on_step(已完成步數)"""
+    for completed in range(1, steps + 1):
+        if total_seconds > 0:
+            time.sleep(total_seconds / steps)
+        on_step(completed)
+
+
+class FakeWhisper:
+    """假的 Whisper 模型，以固定間隔產生決定性的轉錄片段"""
+
+    def __init__(self, segment_seconds=5.0, words_per_segment=8, compute_rtf=0.0, language="zh", seed=0):
+        """
+        Args:
+            segment_seconds: 每個轉錄片段的長度 (秒)
+            words_per_segment: 每個片段的字詞數
+            compute_rtf: 模擬的運算時間與音訊長度的比例 (0 表示不模擬)
+            language: 回報的偵測語言
+            seed: 亂數種子
+        """
+        self.segment_seconds = segment_seconds
+        self.words_per_segment = words_per_segment
+        self.compute_rtf = compute_rtf
+        self.language = language
+        self.seed = seed
+
+    def transcribe(self, audio, verbose=None, **options):
+        """與 whisper.Whisper.transcribe 相同的介面，返回相同格式的結果"""
+        duration = len(audio) / (_SAMPLES_PER_FRAME * 100)
+        total_frames = len(audio) // _SAMPLES_PER_FRAME
+        rng = random.Random(f"{self.seed}-{len(audio)}")
+
+        # 與真實 Whisper 相同，透過 whisper.transcribe 模組中的 tqdm 逐視窗回報進度
+        import whisper.transcribe as whisper_transcribe
+        windows = max(1, -(-total_frames // _FRAMES_PER_WINDOW))
+        with whisper_transcribe.tqdm.tqdm(total=total_frames, unit="frames",
+                                          disable=verbose is not False) as pbar:
+            def on_step(completed):
+                pbar.update(min(_FRAMES_PER_WINDOW, total_frames - (completed - 1) * _FRAMES_PER_WINDOW))
+            _simulate_compute(duration * self.compute_rtf, windows, on_step)
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.segment_seconds, duration)
+            words = [rng.choice(_WORDS) for _ in range(self.words_per_segment)]
+            text = "".join(words)
+            segment = {
+                "id": len(segments),
+                "seek": int(start * 100) // _FRAMES_PER_WINDOW * _FRAMES_PER_WINDOW,
+                "start": round(start, 2),
+                "end": round(end, 2),
+                "text": text,
+                "tokens": [rng.randrange(50257) for _ in range(self.words_per_segment)],
+                "temperature": 0.0,
+                "avg_logprob": -0.3,
+                "compression_ratio": 1.2,
+                "no_speech_prob": 0.01,
+            }
+            if options.get("word_timestamps") and words:
+                # 與真實 Whisper 相同，逐字時間戳記平均分布在片段內
+                step = (end - start) / len(words)
+                segment["words"] = [
+                    {"word": word, "start": round(start + i * step, 2), "end": round(start + (i + 1) * step, 2),
+                     "probability": 0.9}
+                    for i, word in enumerate(words)
+                ]
+            segments.append(segment)
+            start = end
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": options.get("language") or self.language,
+        }
+
+
+class FakeAnnotation:
+    """提供 pyannote.core.Annotation 中處理流程會用到的介面"""
+
+    def __init__(self, tracks):
+        self._tracks = tracks
+
+    def itertracks(self, yield_label=False):
+        for index, (start, end, label) in enumerate(self._tracks):
+            if yield_label:
+                yield Segment(start, end), index, label
+            else:
+                yield Segment(start, end), index
+
+    def labels(self):
+        return sorted({label for _, _, label in self._tracks})
+
+
+class FakeDiarizationPipeline:
+    """假的 Pyannote 說話者分割管線，依 speaker_schedule 返回與合成錄音一致的結果"""
+
+    # 回報批次進度的步驟與批次數
+    _BATCHED_STEPS = (("segmentation", 20), ("speaker_counting", 0), ("embeddings", 40), ("discrete_diarization", 0))
+
+    def __init__(self, speakers=3, compute_rtf=0.0, seed=0):
+        """
+        Args:
+            speakers: 未指定說話者人數時使用的人數
+            compute_rtf: 模擬的運算時間與音訊長度的比例 (0 表示不模擬)
+            seed: 亂數種子 (應與 write_synthetic_wav 相同)
+        """
+        self.speakers = speakers
+        self.compute_rtf = compute_rtf
+        self.seed = seed
+
+    def __call__(self, file, hook=None, num_speakers=None, min_speakers=None, max_speakers=None):
+        """與 pyannote.audio.Pipeline.__call__ 相同的介面"""
+        duration = file["waveform"].shape[-1] / file["sample_rate"]
+
+        speakers = num_speakers or self.speakers
+        if min_speakers:
+            speakers = max(speakers, min_speakers)
+        if max_speakers:
+            speakers = min(speakers, max_speakers)
+
+        # 與 pyannote 3.x 相同: 批次步驟以 completed/total 回報進度，每個步驟結束時傳入產物
+        batched_weight = sum(batches for _, batches in self._BATCHED_STEPS)
+        for step_name, batches in self._BATCHED_STEPS:
+            if hook is not None and batches:
+                def on_step(completed, step_name=step_name, batches=batches):
+                    hook(step_name, None, file=file, total=batches, completed=completed)
+                _simulate_compute(duration * self.compute_rtf * batches / batched_weight, batches, on_step)
+            if hook is not None:
+                hook(step_name, None, file=file)
+
+        turns = speaker_schedule(duration, speakers, self.seed)
+        return FakeAnnotation([(start, end, f"SPEAKER_{speaker:02d}") for start, end, speaker in turns])
+
+
+def install_fake_engines(registry, whisper=None, diarization=None):
+    """
+    在模型註冊表中以假引擎取代 Whisper 與說話者分割模型的載入函數
+
+    Args:
+        registry: ModelRegistry 實例
+        whisper: FakeWhisper 實例 (預設使用預設參數建立)
+        diarization: FakeDiarizationPipeline 實例 (預設使用預設參數建立)
+    """
+    whisper = whisper or FakeWhisper()
+    diarization = diarization or FakeDiarizationPipeline()
+    registry.register_loader('whisper', lambda name, device, dtype=None, **kwargs: whisper)
+    registry.register_loader('diarization', lambda name, device, dtype=None, **kwargs: diarization)
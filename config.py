@@ -26,6 +26,9 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'ogg', 'flac', 'm4a'}
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100 MB 上傳限制
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 分段上傳每個分段的大小 (需小於 MAX_CONTENT_LENGTH)
+UPLOAD_MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024  # 分段上傳的檔案大小上限 (4 GB)
+UPLOAD_SESSION_TTL = 24 * 3600  # 未完成的分段上傳保留多久 (秒)，超過後刪除已接收的內容
 
 # 輸出目錄配置
 BASE_DIR = Path(__file__).resolve().parent
@@ -39,17 +42,60 @@ REPORT_DEBUG_FOLDER = os.path.join(OUTPUT_FOLDER, 'debug')  # 調試資訊儲存
 STATIC_OUTPUT_FOLDER = os.path.join(BASE_DIR, 'static', 'outputs')
 STATIC_VISUALIZATION_FOLDER = os.path.join(STATIC_OUTPUT_FOLDER, 'visualizations')
 
+# 轉錄結果快取 (重複上傳相同錄音且設定相同時直接使用先前的結果)
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, 'cache')
+RESULT_CACHE_MAX_MB = 1024  # 快取總大小上限 (MB)，超過時淘汰最久未使用的項目
+
+# LLM 回應快取 (有設定 seed 或 temperature 為 0 時，相同的請求直接重播先前的輸出)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, 'llm_cache')
+LLM_CACHE_MAX_MB = 256  # 快取總大小上限 (MB)，超過時淘汰最久未使用的項目
+LLM_CACHE_REPLAY_TOKENS_PER_SECOND = 0  # 重播快取輸出的速度 (片段/秒)，0 表示立即送出
+
 # 音訊轉錄配置
 DEFAULT_WHISPER_MODEL = "large"  # 可選: tiny, base, small, medium, large
 DEFAULT_LANGUAGE = "zh"  # 語言代碼 (例如: zh, en)，若為 None 則自動檢測
+WHISPER_WORD_TIMESTAMPS = True  # 是否在 Whisper 原始結果中保存逐字時間戳記 (會略微增加轉錄時間)
 DEVICE = "cuda"  # 計算設備 (cpu 或 cuda)，若為 None 則自動選擇
 PREPROCESS_AUDIO = True  # 是否自動預處理音訊(轉換聲道等)
+KEEP_CANONICAL_AUDIO = False  # 處理完成後是否保留解碼後的 16 kHz 波形檔案 (*.f32)
+PARALLEL_TRANSCRIBE_DIARIZE = True  # 是否同時執行語音轉文字與說話者分割
+RECOGNITION_THREADS = None  # 語音轉文字與說話者分割共用的 torch 線程數 (整個行程共用)，若為 None 則使用 CPU 核心數
+STREAMING_TRANSCRIBE_MIN_DURATION = 1800  # 錄音長度達此秒數時改用分段串流轉錄，若為 None 則停用
+STREAMING_WINDOW_SECONDS = 600  # 串流轉錄每個視窗的最長秒數 (會在此範圍內的靜音處切割)
+STREAMING_PROMPT_CHARS = 200  # 延續到下一個視窗的前文字數
+CPU_PARALLEL_WORKERS = 0  # 使用 CPU 轉錄時平行轉錄的行程數量，0 或 1 表示停用
+CPU_PARALLEL_THREADS_PER_WORKER = None  # 每個轉錄行程的 torch 線程數，若為 None 則平均分配 CPU 核心
+CPU_PARALLEL_SHARD_SECONDS = 120  # 平行轉錄每個分段的最長秒數 (會在此範圍內的靜音處切割)
+CPU_PARALLEL_MIN_DURATION = 300  # 錄音長度達此秒數時才使用平行轉錄
+
+# 工作排程配置 (限制同時執行的工作數量，其餘依序排隊)
+AUDIO_WORKER_COUNT = 1  # 同時執行的音訊處理工作數量
+LLM_WORKER_COUNT = 2  # 同時執行的報告生成工作數量
+JOB_HEARTBEAT_INTERVAL = 15  # 工作心跳更新間隔 (秒)
+JOB_LEASE_TIMEOUT = 120  # 心跳逾時多久 (秒) 後視為工作已被遺棄
+JOB_MAX_ATTEMPTS = 3  # 被中斷的工作最多嘗試執行的次數，超過則標記為失敗
+JOB_RECOVERY_ON_STARTUP = False  # 啟動時是否恢復被中斷的工作 (伺服器入口 run.py 會啟用)
+JOB_SHUTDOWN_TIMEOUT = 30  # 關閉時等待執行中工作完成的最長時間 (秒)
+PROGRESS_PERSIST_INTERVAL = 2.0  # 處理進度寫回資料庫的最短間隔 (秒)，步驟切換時立即寫入
+PROGRESS_REPORT_INTERVAL = 1.0  # Whisper/Pyannote 內部進度回報的最短間隔 (秒)
+
+# 指標配置 (/metrics 端點，Prometheus 文字格式)
+METRICS_ENABLED = True  # 是否啟用指標收集與 /metrics 端點
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # 若設定，抓取時需帶上 Authorization: Bearer <token>
 
 # 說話者分割選項(預設)
 DEFAULT_SPEAKERS_COUNT = None  # 固定的說話者數量，例如: 2
 DEFAULT_SPEAKER_MIN = 2  # 最小說話者數量
 DEFAULT_SPEAKER_MAX = 10  # 最大說話者數量
 DEFAULT_VISUALIZE = True  # 是否生成說話者分割的可視化圖表
+SPEAKER_CANDIDATE_COUNTS = (2, 3, 4, 5, 6)  # 轉錄頁面試算分群結果時的候選說話者數量
+
+# 模型註冊表配置 (行程內共享已載入的模型)
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.0"  # 說話者分割模型
+MODEL_REGISTRY_IDLE_TTL = 30 * 60  # 模型閒置多久 (秒) 後自動卸載，None 表示不卸載
+MODEL_REGISTRY_MAX_MEMORY_MB = None  # 模型權重的記憶體預算 (MB)，超出時卸載最久未使用的模型，None 表示不限制
 
 # LLM 生成參數配置
 DEFAULT_TEMPERATURE = 0.7      # 溫度參數，控制隨機性 (0.0-1.0)，值越低越確定性
@@ -68,12 +114,27 @@ DEFAULT_HF_TOKEN = os.environ.get('HF_TOKEN') or "hf_knwZyGEtONIIZUWakhKfLlPvAXt
 DEFAULT_OLLAMA_HOST = os.environ.get('OLLAMA_HOST') or "192.168.1.14"  # Ollama 主機地址
 DEFAULT_OLLAMA_PORT = os.environ.get('OLLAMA_PORT') or "11434"  # Ollama 端口
 DEFAULT_OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL') or "phi4:14b"  # 預設模型
+OLLAMA_CONNECT_TIMEOUT = 5  # 連線到 Ollama 的逾時 (秒)
+OLLAMA_READ_TIMEOUT = 300  # 等待 Ollama 回應的逾時 (秒)，串流生成時為兩個片段之間的最長間隔
+OLLAMA_TAGS_TIMEOUT = 3  # 查詢模型列表的逾時 (秒)
+OLLAMA_MAX_RETRIES = 3  # 連線錯誤的最大重試次數 (已送出的請求不會重試)
+OLLAMA_POOL_SIZE = 10  # Ollama 連線池大小，應不小於同時進行的生成請求數
+OLLAMA_MAX_NUM_CTX = 32768  # num_ctx 上限 (受 GPU 記憶體限制)，實際上限為此值與模型上限中較小者
 
 # 報告生成配置
-MAX_REPORT_TOKENS = 4000  # 報告生成的最大 token 數量
+MAX_REPORT_TOKENS = 4000  # 報告生成的最大 token 數量 (Ollama 的 num_predict)
+REPORT_MIN_NUM_CTX = 2048  # 報告請求的最小 context 長度 (num_ctx)
+REPORT_NUM_CTX_STEP = 1024  # num_ctx 依提示詞加輸出的大小以此為單位向上取整
+REPORT_TOKEN_ESTIMATE_MARGIN = 1.2  # token 估算值的餘裕倍數 (估算可能低於實際分詞結果)
 REPORT_STREAM_CHUNK_SIZE = 50  # 每次從 LLM 獲取的 token 數量
 REPORT_FORMATS = ["markdown", "pdf"]  # 支援的報告格式
 
+# 逐字稿壓縮配置 (由轉錄 CSV 建立送給 LLM 的精簡逐字稿)
+REPORT_COMPACT_TRANSCRIPT = True  # 合併同一說話者的連續片段並減少時間標記
+REPORT_TIME_MARKER_INTERVAL = 60  # 時間標記的間隔 (秒)，0 表示不標示時間
+REPORT_STRIP_FILLERS = False  # 是否移除語助詞
+REPORT_FILLER_WORDS = ["嗯", "呃", "欸", "um", "uh", "uhm", "erm"]  # 要移除的語助詞
+
 # 系統提示詞（用於 LLM 生成報告）
 DEFAULT_SYSTEM_PROMPT = """
 你是一個專業的會議紀錄助手。你的任務是根據會議逐字稿生成一份結構良好的會議紀錄。
@@ -88,4 +149,32 @@ DEFAULT_SYSTEM_PROMPT = """
 7. 結論：總結會議的結果和下一步計劃
 
 請使用markdown格式，使報告易於閱讀。報告應該清晰、專業，並忠實反映逐字稿中的重要信息。並且必須使用繁體中文回答！
-"""
\ No newline at end of file
+"""
+
+# 長逐字稿分層摘要 (map-reduce) 配置
+REPORT_MAP_REDUCE_ENABLED = True  # 逐字稿超過提示詞預算時先分段摘要再生成報告
+REPORT_PROMPT_TOKEN_BUDGET = 6000  # 單一提示詞中逐字稿/摘要的 token 預算
+REPORT_MAP_CONCURRENCY = 2  # 同時進行摘要的請求數量
+REPORT_SUMMARY_MAX_TOKENS = 800  # 每段摘要的最大 token 數量
+REPORT_MAX_SUMMARY_LEVELS = 4  # 最多合併摘要的層數
+
+# 分段摘要提示詞（第 1 層，輸入為逐字稿片段）
+REPORT_MAP_PROMPT = """
+你是一個專業的會議紀錄助手。你會收到一段會議逐字稿的其中一部分，請為這部分整理一份精簡的摘要。
+
+請保留：
+1. 發言人員與其主要觀點
+2. 討論的議題與做出的決定
+3. 提到的行動項目、負責人與時間
+4. 重要的數字、日期與名稱
+
+只根據這部分的內容摘要，不要推測其他部分。使用條列式，並且必須使用繁體中文回答！
+"""
+
+# 合併摘要提示詞（第 2 層以後，輸入為多段依時間順序排列的摘要）
+REPORT_REDUCE_PROMPT = """
+你是一個專業的會議紀錄助手。你會收到同一場會議依時間順序排列的多段摘要，請將它們合併為一份更精簡的摘要。
+
+請保留所有發言人員、決定、行動項目 (含負責人與時間) 以及重要的數字、日期與名稱，刪除重複的內容，並維持時間順序。
+使用條列式，並且必須使用繁體中文回答！
+"""
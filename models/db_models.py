@@ -30,6 +30,14 @@ class ReportStatus(enum.Enum):
     CANCELED = "canceled"  # 取消
 
 
+class JobState(enum.Enum):
+    """背景工作狀態枚舉"""
+    QUEUED = "queued"  # 排隊中
+    RUNNING = "running"  # 執行中
+    COMPLETED = "completed"  # 完成
+    FAILED = "failed"  # 失敗
+
+
 class AudioFile(db.Model):
     """音訊檔案模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +46,7 @@ class AudioFile(db.Model):
     file_path = db.Column(db.String(255), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)  # 檔案大小 (bytes)
     duration = db.Column(db.Float, nullable=True)  # 音訊時長 (秒)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # 檔案內容的 SHA-256 雜湊值
 
     # 音訊處理設定
     whisper_model = db.Column(db.String(50), nullable=False)
@@ -59,6 +68,7 @@ class AudioFile(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     transcripts = db.relationship('Transcript', backref='audio_file', lazy=True, cascade="all, delete-orphan")
     reports = db.relationship('Report', backref='audio_file', lazy=True, cascade="all, delete-orphan")
+    stage_metrics = db.relationship('StageMetric', backref='audio_file', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<AudioFile {self.original_filename}>'
@@ -72,6 +82,8 @@ class Transcript(db.Model):
     csv_path = db.Column(db.String(255), nullable=True)
     txt_path = db.Column(db.String(255), nullable=True)
     visualization_path = db.Column(db.String(255), nullable=True)
+    whisper_result_path = db.Column(db.String(255), nullable=True)  # Whisper 原始結果 (gzip JSON)
+    diarization_state_path = db.Column(db.String(255), nullable=True)  # 說話者分割中間結果 (npz)
 
     # 轉錄內容摘要
     total_duration = db.Column(db.Float, nullable=True)  # 總時長 (秒)
@@ -114,6 +126,10 @@ class Report(db.Model):
     markdown_path = db.Column(db.String(255), nullable=True)
     pdf_path = db.Column(db.String(255), nullable=True)
 
+    # 逐字稿提示詞大小 (估算 token 數)
+    prompt_tokens_raw = db.Column(db.Integer, nullable=True)  # 原始 TXT 逐字稿
+    prompt_tokens_compacted = db.Column(db.Integer, nullable=True)  # 壓縮後實際送出的逐字稿
+
     # 狀態
     status = db.Column(db.Enum(ReportStatus), default=ReportStatus.GENERATING)
     progress = db.Column(db.Float, default=0)  # 生成進度 (0-100)
@@ -128,6 +144,89 @@ class Report(db.Model):
     audio_file_id = db.Column(db.Integer, db.ForeignKey('audio_file.id'), nullable=False)
     transcript_id = db.Column(db.Integer, db.ForeignKey('transcript.id'), nullable=True)
     transcript = db.relationship('Transcript', backref='reports')
+    stage_metrics = db.relationship('StageMetric', backref='report', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Report {self.title}>'
+
+
+class Job(db.Model):
+    """背景工作模型，持久化排程中的音訊處理與報告生成工作，以便重啟後恢復"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(20), nullable=False)  # 工作類型 (audio / llm)
+    target_id = db.Column(db.Integer, nullable=False)  # 對應的 AudioFile 或 Report ID
+    payload = db.Column(db.Text, nullable=True)  # 傳給處理函數的參數 (JSON)，例如音訊工作的執行模式
+
+    # 執行狀態
+    state = db.Column(db.Enum(JobState), default=JobState.QUEUED, nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)  # 已嘗試執行次數
+    error_message = db.Column(db.Text, nullable=True)  # 若執行失敗，錯誤訊息
+
+    # 租約資訊 (持有此工作的行程與其最後心跳時間)
+    lease_owner = db.Column(db.String(100), nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    # 時間戳記
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Job {self.job_type}:{self.target_id} {self.state.value}>'
+
+
+class UploadSession(db.Model):
+    """分段上傳工作階段模型，記錄已接收的分段以便中斷後續傳"""
+    id = db.Column(db.String(36), primary_key=True)  # 上傳 ID (同時作為上傳目錄名稱)
+    filename = db.Column(db.String(255), nullable=False)  # 保存的檔案名稱
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(255), nullable=False)
+
+    # 分段資訊
+    total_size = db.Column(db.BigInteger, nullable=False)  # 檔案總大小 (bytes)
+    chunk_size = db.Column(db.Integer, nullable=False)  # 每個分段的大小 (bytes)，最後一個分段可較小
+    received_chunks = db.Column(db.Integer, default=0, nullable=False)  # 已連續接收的分段數量
+    received_bytes = db.Column(db.BigInteger, default=0, nullable=False)  # 已連續接收的位元組數
+
+    # 時間戳記
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # 關聯
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received_bytes}/{self.total_size}>'
+
+
+class StageMetric(db.Model):
+    """處理階段效能指標模型，記錄音訊處理與報告生成各階段的耗時與資源用量"""
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), nullable=False, index=True)  # 同一次執行的各階段共用此 ID
+    stage = db.Column(db.String(50), nullable=False)  # 階段名稱
+    succeeded = db.Column(db.Boolean, default=True, nullable=False)  # 階段是否成功完成
+
+    # 耗時與資源用量
+    wall_seconds = db.Column(db.Float, nullable=False)  # 牆鐘時間 (秒)
+    cpu_seconds = db.Column(db.Float, nullable=True)  # 行程 CPU 時間 (秒)
+    peak_rss_mb = db.Column(db.Float, nullable=True)  # 行程記憶體峰值 (MB)
+
+    # 音訊處理量
+    audio_seconds = db.Column(db.Float, nullable=True)  # 處理的音訊長度 (秒)
+    real_time_factor = db.Column(db.Float, nullable=True)  # 即時率 (處理時間 / 音訊長度)
+
+    # LLM 用量
+    prompt_tokens = db.Column(db.Integer, nullable=True)  # 提示詞 token 數
+    output_tokens = db.Column(db.Integer, nullable=True)  # 生成 token 數
+    ttft_seconds = db.Column(db.Float, nullable=True)  # 首個 token 延遲 (秒)
+    tokens_per_second = db.Column(db.Float, nullable=True)  # 生成速度 (token/秒)
+
+    # 時間戳記
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 關聯
+    audio_file_id = db.Column(db.Integer, db.ForeignKey('audio_file.id'), nullable=True, index=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('report.id'), nullable=True, index=True)
+
+    def __repr__(self):
+        return f'<StageMetric {self.stage} {self.wall_seconds:.2f}s>'
@@ -0,0 +1,72 @@
+"""
+資料庫結構升級
+db.create_all() 只會建立不存在的資料表，不會為既有的資料表新增欄位；
+新版本在既有資料表加入的欄位登記在 COLUMN_UPGRADES，應用啟動時檢查資料庫並以 ALTER TABLE 補上缺少的欄位
+
+只支援可為 NULL 的欄位 (既有的資料列沒有值)；欄位型別與索引取自模型定義
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+# 設定日誌
+logger = logging.getLogger("schema_upgrades")
+
+# 在既有資料表加入的欄位: (資料表, 欄位)，依加入順序排列
+COLUMN_UPGRADES = [
+    ("audio_file", "content_hash"),
+    ("transcript", "whisper_result_path"),
+    ("transcript", "diarization_state_path"),
+    ("job", "payload"),
+    ("report", "prompt_tokens_raw"),
+    ("report", "prompt_tokens_compacted"),
+]
+
+
+def upgrade_schema(engine, metadata, upgrades=None):
+    """
+    為既有的資料表補上缺少的欄位
+
+    資料表不存在時略過 (由 create_all 建立完整的資料表)
+
+    Args:
+        engine: SQLAlchemy Engine
+        metadata: 模型的 MetaData (db.metadata)
+        upgrades: (資料表, 欄位) 列表，預設為 COLUMN_UPGRADES
+
+    Returns:
+        list: 新增的 (資料表, 欄位)
+    """
+    upgrades = COLUMN_UPGRADES if upgrades is None else upgrades
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    for table_name, column_name in upgrades:
+        if table_name not in tables:
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        if column_name in existing:
+            continue
+
+        table = metadata.tables[table_name]
+        column = table.c[column_name]
+        if not column.nullable:
+            raise ValueError(f"無法自動新增不可為 NULL 的欄位: {table_name}.{column_name}")
+
+        column_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE {preparer.quote(table_name)} "
+                f"ADD COLUMN {preparer.quote(column_name)} {column_type}"
+            ))
+            for index in table.indexes:
+                if column_name in index.columns:
+                    index.create(connection)
+
+        logger.info(f"已為資料表 {table_name} 新增欄位 {column_name}")
+        added.append((table_name, column_name))
+
+    return added
@@ -4,24 +4,37 @@
 """
 import os
 import torch
-import whisper
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from pyannote.audio import Pipeline
-from pyannote.audio.pipelines.utils.hook import ProgressHook
-from pydub import AudioSegment
 import datetime
 import sys
 import logging
 from pathlib import Path
 import warnings
-import librosa
-import soundfile as sf
 import threading
 import queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from flask import current_app
 from models.db_models import AudioFile, Transcript, ProcessingStatus, TranscriptStatus
+from processors.model_registry import get_model_registry
+from processors.result_cache import get_result_cache, make_cache_key
+from utils.audio_probe import probe_audio
+from utils.audio_decode import decode_canonical, waveform_duration, to_pyannote_input, CANONICAL_SAMPLE_RATE
+from utils.audio_vad import split_on_silence, window_span
+from utils.speaker_assignment import assign_speakers
+from utils.visualization import render_in_background, thumbnail_path_for, THUMBNAIL
+from utils.result_artifacts import save_whisper_result, load_whisper_result
+from processors.diarization_state import (
+    DiarizationCapture, save_diarization_state, load_diarization_state, recluster, candidate_clusterings,
+    candidates_path_for, save_candidates
+)
+from processors.parallel_transcriber import transcribe_parallel
+from processors.engine_hooks import whisper_callback, make_pyannote_hook, StageCancelled
+from processors.progress_adapters import StageProgress
+from processors.stage_metrics import StageMetrics
+from processors.job_scheduler import get_job_scheduler, register_job_handler, JOB_TYPE_AUDIO
+from processors.progress_bus import get_progress_bus
 from app import db
 
 # 設定日誌
@@ -37,6 +50,21 @@ warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 
+# 步驟 3 中平行執行的子階段
+STAGE_TRANSCRIBE = "轉錄"
+STAGE_DIARIZE = "說話者分割"
+
+# 音訊工作的執行模式 (提交時保存在工作參數中)
+AUDIO_JOB_FULL = "full"
+AUDIO_JOB_REDIARIZE = "rediarize"
+
+
+# 結果快取中 Whisper 原始結果與說話者分割中間結果的檔案名稱
+_WHISPER_ARTIFACT = "whisper.json.gz"
+_DIARIZATION_ARTIFACT = "diarization.npz"
+_CANDIDATES_ARTIFACT = "speaker_candidates.json"
+
+
 class AudioProcessorException(Exception):
     """音訊處理器異常"""
     pass
@@ -58,31 +86,67 @@ class ProgressReporter:
         self.current_step = 0
         self.step_progress = 0
 
-    def update_step(self, step_index, message=""):
-        """更新當前步驟"""
-        self.current_step = step_index
-        self.step_progress = 0
-        self._update_db_progress()
+        # 平行執行的子階段進度 (子階段名稱 -> 0-100)
+        self.stage_progress = {}
+        self._lock = threading.Lock()
+
+        # 平行子階段在其他線程回報進度，先在此取得共享的進度匯流排
+        self.bus = get_progress_bus()
+
+    def update_step(self, step_index, message="", parallel_stages=None):
+        """
+        更新當前步驟
+
+        Args:
+            step_index: 步驟編號
+            message: 步驟說明
+            parallel_stages: 此步驟中平行執行的子階段名稱 (可選)，步驟進度為各子階段進度的平均值
+        """
+        with self._lock:
+            self.current_step = step_index
+            self.step_progress = 0
+            self.stage_progress = {stage: 0 for stage in (parallel_stages or [])}
+        self._update_db_progress(message, force=True)
         logger.info(f"[檔案 {self.audio_file_id}] 步驟 {step_index}/{self.total_steps}: {message}")
 
+    def update_stage_progress(self, stage, progress, message=""):
+        """更新平行子階段的進度百分比 (0-100)"""
+        with self._lock:
+            self.stage_progress[stage] = max(0, min(100, progress))
+            step_progress = sum(self.stage_progress.values()) / len(self.stage_progress)
+
+        self.update_step_progress(step_progress, f"[{stage}] {message}" if message else "")
+
     def update_step_progress(self, progress, message=""):
         """更新當前步驟的進度百分比 (0-100)"""
         self.step_progress = max(0, min(100, progress))
-        self._update_db_progress()
+        self._update_db_progress(message)
         if message:
             logger.info(f"[檔案 {self.audio_file_id}] 步驟 {self.current_step} 進度: {progress:.1f}% - {message}")
 
-    def _update_db_progress(self):
-        """更新資料庫中的進度"""
+    def _update_db_progress(self, message="", force=False):
+        """
+        發布進度到進度匯流排，並依節流間隔寫回資料庫
+
+        Args:
+            message: 進度說明
+            force: 是否為狀態轉換 (立即寫回資料庫)
+        """
         # 計算總體進度百分比
         overall_progress = ((self.current_step - 1) * 100 + self.step_progress) / self.total_steps
+        completed = self.current_step == self.total_steps and self.step_progress == 100
+
+        # 狀態查詢端點直接讀取匯流排，資料庫只在間隔到期或狀態轉換時寫入
+        if not self.bus.publish(JOB_TYPE_AUDIO, self.audio_file_id, overall_progress, message,
+                                force=force or completed):
+            return
 
         # 更新資料庫
         try:
             audio_file = AudioFile.query.get(self.audio_file_id)
             if audio_file:
                 audio_file.progress = overall_progress
-                if self.current_step == self.total_steps and self.step_progress == 100:
+                if completed:
                     audio_file.status = ProcessingStatus.COMPLETED
                     audio_file.processed_at = datetime.datetime.now(datetime.UTC)
 
@@ -104,7 +168,8 @@ class AudioProcessor:
         """
         self.audio_file_id = audio_file_id
         self.progress_callback = progress_callback
-        self.reporter = ProgressReporter(audio_file_id)
+        self.reporter = ProgressReporter(audio_file_id, total_steps=4)
+        self.metrics = StageMetrics(audio_file_id=audio_file_id)
 
         # 從資料庫載入音訊檔案資訊
         self.audio_file = AudioFile.query.get(audio_file_id)
@@ -136,29 +201,28 @@ class AudioProcessor:
 
         # 其他變數，會在處理過程中設定
         self.whisper_model = None
+        self.whisper_model_name = None
+        self.device = None
         self.diarization_pipeline = None
+        self.waveform = None
+        self.canonical_audio_path = None
+        self.whisper_result_path = None
+        self.diarization_state_path = None
+        self.diarization_capture = DiarizationCapture()
 
     def process_async(self):
-        """非同步處理音訊檔案"""
+        """非同步處理音訊檔案 (相同錄音與設定已處理過時直接使用快取結果)"""
+        if self._materialize_cached_result():
+            return True
+
         # 更新音訊檔案狀態為處理中
         self.audio_file.status = ProcessingStatus.PROCESSING
         self.audio_file.progress = 0
         db.session.commit()
+        get_progress_bus().discard(JOB_TYPE_AUDIO, self.audio_file_id)
 
-        # 獲取應用上下文和當前音訊檔案ID
-        app = current_app._get_current_object()
-        audio_file_id = self.audio_file_id
-
-        # 啟動處理線程
-        def run_with_app_context():
-            with app.app_context():
-                # 在新的線程中重新獲取音訊檔案對象
-                processor = AudioProcessor(audio_file_id)
-                processor._process_audio_file()
-
-        process_thread = threading.Thread(target=run_with_app_context)
-        process_thread.daemon = True
-        process_thread.start()
+        # 提交到工作排程器，依序在音訊工作線程中處理
+        get_job_scheduler().submit(JOB_TYPE_AUDIO, self.audio_file_id, payload={"mode": AUDIO_JOB_FULL})
 
         return True
 
@@ -167,96 +231,304 @@ class AudioProcessor:
         try:
             # 步驟 1: 載入模型
             self.reporter.update_step(1, "初始化和載入模型")
-            self._load_models()
+            with self.metrics.stage("載入模型"):
+                self._load_models()
 
             # 步驟 2: 預處理音訊
             self.reporter.update_step(2, "預處理音訊檔案")
-            processed_audio = self._preprocess_audio()
+            with self.metrics.stage("預處理音訊") as record:
+                processed_audio = self._preprocess_audio()
+                record["audio_seconds"] = waveform_duration(processed_audio)
 
-            # 步驟 3: 執行語音轉文字
-            self.reporter.update_step(3, "執行語音轉文字")
-            transcription = self._transcribe_audio(processed_audio)
+            # 步驟 3: 同時執行語音轉文字與說話者分割
+            self.reporter.update_step(3, "執行語音轉文字與說話者分割",
+                                      parallel_stages=[STAGE_TRANSCRIBE, STAGE_DIARIZE])
+            with self.metrics.stage("語音辨識", self.audio_file.duration):
+                transcription, diarization = self._run_recognition_stages(processed_audio)
 
-            # 步驟 4: 執行說話者分割
-            self.reporter.update_step(4, "執行說話者分割")
-            diarization = self._diarize_audio(processed_audio)
+            # 保存 Whisper 原始結果與說話者分割中間結果，之後修正說話者設定時不需重新轉錄
+            with self.metrics.stage("保存中間結果"):
+                base_name = self._output_base_name()
+                self._save_whisper_result(transcription, base_name)
+                self._save_diarization_state(base_name)
 
-            # 步驟 5: 整合結果並生成輸出
-            self.reporter.update_step(5, "整合結果並生成輸出")
-            final_result = self._integrate_results(transcription, diarization)
+            with self.metrics.stage("試算說話者數量"):
+                self._save_speaker_candidates()
 
-            # 更新完成狀態
-            self.audio_file.status = ProcessingStatus.COMPLETED
-            self.audio_file.processed_at = datetime.datetime.now(datetime.UTC)
+            # 步驟 4: 整合結果並生成輸出
+            self.reporter.update_step(4, "整合結果並生成輸出")
+            with self.metrics.stage("整合結果", self.audio_file.duration):
+                final_result = self._integrate_results(transcription, diarization, base_name)
 
-            db.session.commit()
+            self._complete(final_result, transcription.get("language"))
+
+        except Exception as e:
+            self._fail(e)
+
+        finally:
+            self._release_models()
+            self._cleanup_waveform()
+            self.metrics.save()
+
+    def rediarize_async(self, transcript_id=None):
+        """
+        非同步重新執行說話者分割
+
+        沿用指定轉錄的 Whisper 原始結果，只重新執行說話者分割與結果整合；
+        呼叫前應已更新音訊檔案的說話者數量設定
+
+        Args:
+            transcript_id: 沿用其 Whisper 原始結果的轉錄 ID，為 None 時使用最新一份轉錄
+        """
+        source = _source_transcript(self.audio_file_id, transcript_id)
+        if source is None:
+            raise AudioProcessorException(f"找不到音訊檔案 {self.audio_file_id} 的轉錄 {transcript_id}")
+
+        # 相同設定已處理過時直接使用快取結果
+        self.whisper_result_path = source.whisper_result_path
+        self.diarization_state_path = source.diarization_state_path
+        if self._materialize_cached_result():
+            return True
+
+        self.audio_file.status = ProcessingStatus.PROCESSING
+        self.audio_file.progress = 0
+        self.audio_file.error_message = None
+        db.session.commit()
+        get_progress_bus().discard(JOB_TYPE_AUDIO, self.audio_file_id)
+
+        # 與完整處理使用相同的音訊工作隊列，以工作參數標示只重新執行說話者分割及沿用的轉錄
+        get_job_scheduler().submit(JOB_TYPE_AUDIO, self.audio_file_id,
+                                   payload={"mode": AUDIO_JOB_REDIARIZE, "transcript_id": source.id})
+
+        return True
+
+    def _rediarize_audio_file(self, whisper_result_path, diarization_state_path=None):
+        """
+        沿用 Whisper 原始結果，重新執行說話者分割並產生新的轉錄記錄
+
+        有保存說話者分割中間結果時只重新分群，不需解碼音訊或重新計算嵌入向量
+        """
+        try:
+            # 步驟 1: 載入說話者分割模型
+            self.reporter.update_step(1, "初始化和載入說話者分割模型")
+            with self.metrics.stage("載入模型"):
+                self._load_models(load_whisper=False)
+                transcription = load_whisper_result(whisper_result_path)
+
+            if diarization_state_path:
+                # 步驟 2: 讀取中間結果
+                self.reporter.update_step(2, "讀取說話者分割中間結果")
+                with self.metrics.stage("讀取中間結果"):
+                    state = load_diarization_state(diarization_state_path)
+
+                # 步驟 3: 只重新分群
+                self.reporter.update_step(3, "重新分群說話者")
+                with self.metrics.stage("重新分群", self.audio_file.duration):
+                    options = self._build_diarization_options()
+                    logger.info(f"以保存的嵌入向量重新分群: {options}")
+                    with get_model_registry(self.app_config).exclusive(self.diarization_pipeline):
+                        diarization = recluster(self.diarization_pipeline, state, **options)
+                self.diarization_state_path = diarization_state_path
+            else:
+                # 步驟 2: 預處理音訊
+                self.reporter.update_step(2, "預處理音訊檔案")
+                with self.metrics.stage("預處理音訊") as record:
+                    processed_audio = self._preprocess_audio()
+                    record["audio_seconds"] = waveform_duration(processed_audio)
+
+                # 步驟 3: 只執行說話者分割
+                self.reporter.update_step(3, "重新執行說話者分割", parallel_stages=[STAGE_DIARIZE])
+                diarization = self._diarize_audio(processed_audio, self._build_diarization_options())
+
+            # 新的轉錄記錄沿用同一份 Whisper 原始結果，並使用獨立的檔案名稱
+            self.whisper_result_path = whisper_result_path
+            with self.metrics.stage("保存中間結果"):
+                base_name = self._output_base_name()
+                if not diarization_state_path:
+                    self._save_diarization_state(base_name)
+
+            with self.metrics.stage("試算說話者數量"):
+                self._save_speaker_candidates()
 
-            # 回報處理完成
-            if self.progress_callback:
-                self.progress_callback(100, "處理完成")
+            # 步驟 4: 整合結果並生成輸出
+            self.reporter.update_step(4, "整合結果並生成輸出")
+            with self.metrics.stage("整合結果", self.audio_file.duration):
+                final_result = self._integrate_results(transcription, diarization, base_name)
 
-            logger.info(f"音訊檔案 {self.audio_file.original_filename} 處理完成")
+            self._complete(final_result, transcription.get("language"))
 
         except Exception as e:
-            # 處理失敗
-            logger.error(f"處理音訊檔案時發生錯誤: {e}")
+            self._fail(e)
 
-            self.audio_file.status = ProcessingStatus.FAILED
-            self.audio_file.error_message = str(e)
-            db.session.commit()
+        finally:
+            self._release_models()
+            self._cleanup_waveform()
+            self.metrics.save()
+
+    def _complete(self, final_result, language=None):
+        """標記處理完成，並在背景繪製網頁縮圖與存入結果快取"""
+        self.audio_file.status = ProcessingStatus.COMPLETED
+        self.audio_file.progress = 100
+        self.audio_file.processed_at = datetime.datetime.now(datetime.UTC)
+
+        db.session.commit()
+        get_progress_bus().discard(JOB_TYPE_AUDIO, self.audio_file_id)
+
+        # 轉錄已完成後才在背景繪製網頁縮圖並存入結果快取
+        self._render_thumbnail(final_result)
+        self._store_cached_result(final_result, language)
+
+        # 回報處理完成
+        if self.progress_callback:
+            self.progress_callback(100, "處理完成")
+
+        logger.info(f"音訊檔案 {self.audio_file.original_filename} 處理完成")
+
+    def _fail(self, e):
+        """標記處理失敗"""
+        logger.error(f"處理音訊檔案時發生錯誤: {e}")
+
+        db.session.rollback()
+        self.audio_file.status = ProcessingStatus.FAILED
+        self.audio_file.error_message = str(e)
+        db.session.commit()
+        get_progress_bus().discard(JOB_TYPE_AUDIO, self.audio_file_id)
+
+        if self.progress_callback:
+            self.progress_callback(-1, f"處理失敗: {e}")
+
+    def _output_base_name(self):
+        """輸出檔案的基本名稱；已有轉錄記錄時加上時間戳記，避免覆蓋先前的轉錄結果"""
+        base_name = os.path.splitext(os.path.basename(self.audio_file.original_filename))[0]
+        if latest_transcript(self.audio_file_id):
+            base_name = f"{base_name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return base_name
+
+    def _save_whisper_result(self, transcription, base_name):
+        """保存 Whisper 原始結果，保存失敗不影響處理流程"""
+        path = os.path.join(self.transcript_dir, f"{base_name}_whisper.json.gz")
+        try:
+            self.whisper_result_path = save_whisper_result(transcription, path)
+        except Exception as e:
+            logger.warning(f"保存 Whisper 原始結果失敗: {e}")
+            self.whisper_result_path = None
+
+    def _save_diarization_state(self, base_name):
+        """保存說話者分割中間結果，保存失敗不影響處理流程"""
+        path = os.path.join(self.transcript_dir, f"{base_name}_diarization.npz")
+        try:
+            self.diarization_state_path = save_diarization_state(self.diarization_capture, path)
+        except Exception as e:
+            logger.warning(f"保存說話者分割中間結果失敗: {e}")
+            self.diarization_state_path = None
 
-            if self.progress_callback:
-                self.progress_callback(-1, f"處理失敗: {e}")
+    def _save_speaker_candidates(self):
+        """
+        以保存的中間結果試算各候選說話者數量的分群結果，供轉錄頁面比較
+
+        在音訊工作中趁說話者分割模型仍載入時計算；已有試算結果或試算失敗時略過，不影響處理流程
+        """
+        speaker_counts = self.app_config.get('SPEAKER_CANDIDATE_COUNTS', (2, 3, 4, 5, 6))
+        if not self.diarization_state_path or not speaker_counts:
+            return
+
+        path = candidates_path_for(self.diarization_state_path)
+        if os.path.exists(path):
+            return
+
+        try:
+            state = load_diarization_state(self.diarization_state_path)
+            with get_model_registry(self.app_config).exclusive(self.diarization_pipeline):
+                candidates = candidate_clusterings(self.diarization_pipeline, state, speaker_counts)
+            save_candidates(candidates, path)
+        except Exception as e:
+            logger.warning(f"試算候選說話者數量失敗: {e}")
+
+    def _load_models(self, load_whisper=True):
+        """
+        從模型註冊表取得 Whisper 和 Pyannote 模型
 
-    def _load_models(self):
-        """載入 Whisper 和 Pyannote 模型"""
+        Args:
+            load_whisper: 是否載入 Whisper 模型 (重新執行說話者分割時不需要)
+        """
         try:
             # 設定設備
             device = self.audio_file.device if hasattr(self.audio_file, 'device') else (
                     self.app_config.get('DEVICE') or ("cuda" if torch.cuda.is_available() else "cpu")
             )
             logger.info(f"使用設備: {device}")
+            self.device = device
+
+            registry = get_model_registry(self.app_config)
 
             # 載入 Whisper 模型
             whisper_model_name = self.audio_file.whisper_model or self.app_config.get('DEFAULT_WHISPER_MODEL', 'base')
-            self.reporter.update_step_progress(10, f"載入 Whisper {whisper_model_name} 模型")
-
-            logger.info(f"正在載入 Whisper {whisper_model_name} 模型...")
-            self.whisper_model = whisper.load_model(whisper_model_name)
-            logger.info("Whisper 模型載入完成")
+            self.whisper_model_name = whisper_model_name
+            if load_whisper and self._cpu_parallel_expected(self.audio_file.duration):
+                # 平行轉錄由各子行程自行載入 Whisper，父行程不持有模型；最後未使用平行轉錄時在轉錄前才載入
+                logger.info("將使用多行程平行轉錄，主行程不載入 Whisper 模型")
+            elif load_whisper:
+                self.reporter.update_step_progress(10, f"載入 Whisper {whisper_model_name} 模型")
+                self._acquire_whisper()
 
             # 載入 Pyannote 模型
             self.reporter.update_step_progress(50, "載入說話者分割模型")
 
             hf_token = self.app_config.get('DEFAULT_HF_TOKEN')
-            logger.info("正在載入說話者分割模型...")
+            diarization_model_name = self.app_config.get('DIARIZATION_MODEL', 'pyannote/speaker-diarization-3.0')
+            logger.info("正在取得說話者分割模型...")
 
             try:
-                if hf_token:
-                    self.diarization_pipeline = Pipeline.from_pretrained(
-                        "pyannote/speaker-diarization-3.0",
-                        use_auth_token=hf_token
-                    ).to(torch.device(device))
-                else:
-                    logger.warning("未提供 HuggingFace token，將嘗試使用預先下載的模型或公開訪問")
-                    self.diarization_pipeline = Pipeline.from_pretrained(
-                        "pyannote/speaker-diarization-3.0"
-                    ).to(torch.device(device))
-
+                self.diarization_pipeline = registry.acquire(
+                    'diarization',
+                    diarization_model_name,
+                    device,
+                    hf_token=hf_token
+                )
                 logger.info("說話者分割模型載入完成")
 
             except Exception as e:
                 logger.error(f"載入說話者分割模型時發生錯誤: {e}")
                 raise AudioProcessorException(f"無法載入說話者分割模型: {e}")
 
+            stats = registry.stats()
+            logger.info(f"模型註冊表: 命中 {stats['hits']} 次, 未命中 {stats['misses']} 次, "
+                        f"累計節省載入時間 {stats['load_seconds_saved']:.1f} 秒")
+
             self.reporter.update_step_progress(100, "模型載入完成")
 
         except Exception as e:
             logger.error(f"載入模型時發生錯誤: {e}")
             raise AudioProcessorException(f"載入模型時發生錯誤: {e}")
 
+    def _acquire_whisper(self):
+        """從模型註冊表取得 Whisper 模型"""
+        logger.info(f"正在取得 Whisper {self.whisper_model_name} 模型...")
+        registry = get_model_registry(self.app_config)
+        self.whisper_model = registry.acquire('whisper', self.whisper_model_name, self.device)
+        logger.info("Whisper 模型載入完成")
+
+    def _release_models(self):
+        """將模型參考歸還給模型註冊表"""
+        registry = get_model_registry(self.app_config)
+        registry.release(self.whisper_model)
+        registry.release(self.diarization_pipeline)
+        self.whisper_model = None
+        self.diarization_pipeline = None
+
+    def _cleanup_waveform(self):
+        """釋放解碼後的波形，並依設定刪除暫存的波形檔案"""
+        self.waveform = None
+
+        if self.canonical_audio_path and not self.app_config.get('KEEP_CANONICAL_AUDIO', False):
+            try:
+                if os.path.exists(self.canonical_audio_path):
+                    os.remove(self.canonical_audio_path)
+            except OSError as e:
+                logger.warning(f"刪除暫存波形檔案失敗: {e}")
+
     def _preprocess_audio(self):
-        """預處理音訊檔案，如有需要則轉換為單聲道"""
+        """預處理音訊檔案，解碼一次為 16 kHz 單聲道波形，供後續所有步驟共用"""
         try:
             audio_path = self.audio_file.file_path
 
@@ -280,171 +552,369 @@ class AudioProcessor:
             self.audio_file.duration = wav_info['duration']
             db.session.commit()
 
-            # 如果是多聲道，轉換為單聲道
-            self.reporter.update_step_progress(50, "檢查並轉換為單聲道")
-
-            if wav_info['n_channels'] > 1:
-                logger.info("檢測到多聲道音訊，正在轉換為單聲道...")
-
-                # 準備單聲道檔案路徑
-                base_name = os.path.splitext(os.path.basename(audio_path))[0]
-                mono_path = os.path.join(self.output_dir, f"{base_name}_mono.wav")
+            # 解碼為標準波形 (同時完成重新取樣與轉換為單聲道)
+            self.reporter.update_step_progress(50, "解碼為 16 kHz 單聲道波形")
 
-                # 轉換為單聲道
-                mono_path = self._convert_to_mono(audio_path, mono_path)
+            base_name = os.path.splitext(os.path.basename(audio_path))[0]
+            self.canonical_audio_path = os.path.join(self.output_dir, f"{base_name}_16k.f32")
+            self.waveform = decode_canonical(audio_path, cache_path=self.canonical_audio_path)
 
-                self.reporter.update_step_progress(100, "預處理完成，已轉換為單聲道")
-                return mono_path
+            if len(self.waveform) == 0:
+                raise AudioProcessorException("解碼後的音訊沒有任何內容")
 
-            # 如果已經是單聲道，直接返回原始路徑
-            self.reporter.update_step_progress(100, "預處理完成，已是單聲道")
-            return audio_path
+            self.reporter.update_step_progress(
+                100, f"預處理完成，已解碼 {waveform_duration(self.waveform):.1f} 秒音訊"
+            )
+            return self.waveform
 
         except Exception as e:
             logger.error(f"預處理音訊檔案時發生錯誤: {e}")
             raise AudioProcessorException(f"預處理音訊檔案時發生錯誤: {e}")
 
     def _get_wav_info(self, wav_file):
-        """獲取音訊檔案資訊"""
-        try:
-            # 使用 librosa 載入音訊檔案
-            y, sr = librosa.load(wav_file, sr=None, mono=False)
+        """獲取音訊檔案資訊 (只讀取檔案標頭，不解碼整個檔案)"""
+        info = probe_audio(wav_file)
+        if info is None:
+            logger.error(f"讀取音訊檔案資訊失敗: {wav_file}")
+            return None
 
-            # 計算音訊時長
-            duration = librosa.get_duration(y=y, sr=sr)
+        logger.info(f"音訊資訊來源: {info['source']} ({info['format']})")
+        return info
 
-            # 確定聲道數
-            if y.ndim > 1:
-                n_channels = y.shape[0]
-            else:
-                n_channels = 1
-
-            return {
-                "sample_rate": sr,
-                "sample_width": 2,  # 假設 16 位元 (2 bytes)
-                "n_channels": n_channels,
-                "n_frames": len(y) if n_channels == 1 else len(y[0]),
-                "duration": duration
+    def _run_recognition_stages(self, waveform):
+        """
+        同時執行語音轉文字與說話者分割
+
+        兩個階段互不依賴，各自在獨立線程中執行，共用同一個 torch intra-op 線程池
+        (torch.set_num_threads 的設定作用於整個行程，無法為各階段分別設定)；
+        任一階段失敗時會通知另一個階段盡快取消，並拋出先發生的錯誤
+
+        Returns:
+            tuple: (Whisper 轉錄結果, Pyannote 分割結果)
+        """
+        # 在主線程中準備選項，避免在其他線程中存取資料庫物件
+        transcribe_options = self._build_transcribe_options()
+        diarization_options = self._build_diarization_options()
+
+        parallel = self.app_config.get('PARALLEL_TRANSCRIBE_DIARIZE', True)
+
+        # 在啟動階段線程前設定一次兩個階段共用的線程數
+        torch.set_num_threads(self.app_config.get('RECOGNITION_THREADS') or os.cpu_count() or 1)
+
+        app = current_app._get_current_object()
+        cancel_event = threading.Event()
+
+        def run_stage(func, *args):
+            with app.app_context():
+                try:
+                    return func(*args)
+                except Exception:
+                    cancel_event.set()
+                    raise
+
+        stages = {
+            STAGE_TRANSCRIBE: (self._transcribe_audio, waveform, transcribe_options, cancel_event),
+            STAGE_DIARIZE: (self._diarize_audio, waveform, diarization_options, cancel_event),
+        }
+
+        with ThreadPoolExecutor(max_workers=2 if parallel else 1,
+                                thread_name_prefix=f"audio-{self.audio_file_id}") as executor:
+            futures = {
+                executor.submit(run_stage, *stage_args): stage
+                for stage, stage_args in stages.items()
             }
-        except Exception as e:
-            logger.error(f"讀取音訊檔案資訊失敗: {e}")
-            return None
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
 
-    def _convert_to_mono(self, wav_file, output_path=None):
-        """將音訊檔案轉換為單聲道"""
-        try:
-            if output_path is None:
-                base_name = os.path.splitext(wav_file)[0]
-                output_path = f"{base_name}_mono.wav"
+            # 若有階段失敗，取消尚未開始的階段並等待執行中的階段結束
+            errors = [f for f in done if f.exception() is not None]
+            if errors:
+                cancel_event.set()
+                for future in futures:
+                    future.cancel()
+                wait(futures)
 
-            # 使用 librosa 取得音訊資料
-            y, sr = librosa.load(wav_file, sr=None, mono=False)
+                # 優先回報真正的錯誤，而不是因取消而產生的 StageCancelled
+                errors.sort(key=lambda f: isinstance(f.exception(), StageCancelled))
+                raise errors[0].exception()
 
-            # 檢查是否已是單聲道
-            if y.ndim == 1 or (y.ndim > 1 and y.shape[0] == 1):
-                logger.info("檔案已是單聲道，無需轉換")
-                return wav_file
+            results = {stage: future.result() for future, stage in futures.items()}
 
-            # 轉換為單聲道
-            logger.info(f"將 {wav_file} 轉換為單聲道")
-            mono_y = librosa.to_mono(y)
+        return results[STAGE_TRANSCRIBE], results[STAGE_DIARIZE]
 
-            # 使用 soundfile 儲存檔案
-            sf.write(output_path, mono_y, sr, subtype='PCM_16')
+    def _build_transcribe_options(self):
+        """準備 Whisper 轉錄選項"""
+        transcribe_options = {}
+        language = self.audio_file.language or self.app_config.get('DEFAULT_LANGUAGE')
 
-            logger.info(f"單聲道檔案已儲存至 {output_path}")
-            return output_path
-        except Exception as e:
-            logger.error(f"轉換檔案為單聲道時發生錯誤: {e}")
-            # 如果失敗，嘗試使用 pydub
-            try:
-                logger.info("嘗試使用 pydub 轉換為單聲道...")
-                audio = AudioSegment.from_file(wav_file)
-                mono_audio = audio.set_channels(1)
-                mono_audio.export(output_path, format="wav")
-                logger.info(f"使用 pydub 轉換成功，檔案儲存至 {output_path}")
-                return output_path
-            except Exception as e2:
-                logger.error(f"使用 pydub 轉換檔案為單聲道時發生錯誤: {e2}")
-                return wav_file
-
-    def _transcribe_audio(self, audio_path):
-        """使用 Whisper 模型進行語音轉文字"""
-        try:
-            # 準備轉錄選項
-            transcribe_options = {}
-            language = self.audio_file.language or self.app_config.get('DEFAULT_LANGUAGE')
+        if language:
+            transcribe_options["language"] = language
 
-            if language:
-                transcribe_options["language"] = language
+        # 逐字時間戳記隨 Whisper 原始結果一起保存
+        if self.app_config.get('WHISPER_WORD_TIMESTAMPS', True):
+            transcribe_options["word_timestamps"] = True
 
-            # 執行轉錄
-            self.reporter.update_step_progress(10, "開始轉錄")
-            logger.info(f"使用 Whisper 轉錄音訊: {audio_path}")
+        return transcribe_options
 
-            result = self.whisper_model.transcribe(
-                audio_path,
-                verbose=False,
-                **transcribe_options
-            )
+    def _build_diarization_options(self):
+        """準備 Pyannote 說話者分割選項"""
+        diarization_options = {}
+
+        # 設定說話者數量參數
+        speakers_count = self.audio_file.speakers_count
+        speaker_min = self.audio_file.speaker_min or self.app_config.get('DEFAULT_SPEAKER_MIN')
+        speaker_max = self.audio_file.speaker_max or self.app_config.get('DEFAULT_SPEAKER_MAX')
+
+        if speakers_count is not None:
+            diarization_options["num_speakers"] = speakers_count
+        else:
+            if speaker_min is not None:
+                diarization_options["min_speakers"] = speaker_min
+            if speaker_max is not None:
+                diarization_options["max_speakers"] = speaker_max
+
+        return diarization_options
 
-            self.reporter.update_step_progress(100, "轉錄完成")
-            logger.info("Whisper 轉錄完成")
+    def _transcribe_audio(self, waveform, transcribe_options, cancel_event=None):
+        """使用 Whisper 模型對已解碼的波形進行語音轉文字"""
+        try:
+            duration = waveform_duration(waveform)
+            streaming_min = self.app_config.get('STREAMING_TRANSCRIBE_MIN_DURATION')
+
+            cancel_event = cancel_event or threading.Event()
+            progress = self._stage_progress(STAGE_TRANSCRIBE, duration)
+
+            with self.metrics.stage(STAGE_TRANSCRIBE, duration):
+                use_parallel = self._use_cpu_parallel(duration)
+                if not use_parallel and self.whisper_model is None:
+                    self._acquire_whisper()
+
+                if use_parallel:
+                    result = self._transcribe_parallel(waveform, transcribe_options, cancel_event, progress)
+                elif streaming_min is not None and duration >= streaming_min:
+                    result = self._transcribe_streaming(waveform, transcribe_options, cancel_event, progress)
+                else:
+                    # 執行轉錄
+                    self.reporter.update_stage_progress(STAGE_TRANSCRIBE, 10, "開始轉錄")
+                    logger.info(f"使用 Whisper 轉錄音訊: {duration:.1f} 秒")
+
+                    # 透過回調回報每個 30 秒視窗的解碼進度並檢查取消訊號
+                    with get_model_registry(self.app_config).exclusive(self.whisper_model), \
+                            whisper_callback(progress.whisper_callback(cancel_event)):
+                        result = self.whisper_model.transcribe(
+                            waveform,
+                            verbose=False,
+                            **transcribe_options
+                        )
+
+            progress.update(1.0, "轉錄完成", force=True)
+            logger.info(f"Whisper 轉錄完成，處理速度 {progress.throughput:.1f} 音訊秒/秒")
 
             return result
 
+        except StageCancelled:
+            logger.info("轉錄已因其他階段失敗而取消")
+            raise
         except Exception as e:
             logger.error(f"轉錄音訊時發生錯誤: {e}")
             raise AudioProcessorException(f"轉錄音訊時發生錯誤: {e}")
 
-    def _diarize_audio(self, audio_path):
-        """使用 Pyannote 進行說話者分割"""
-        try:
-            # 準備分割選項
-            diarization_options = {}
+    def _transcribe_streaming(self, waveform, transcribe_options, cancel_event=None, progress=None):
+        """
+        串流轉錄長錄音
 
-            # 設定說話者數量參數
-            speakers_count = self.audio_file.speakers_count
-            speaker_min = self.audio_file.speaker_min or self.app_config.get('DEFAULT_SPEAKER_MIN')
-            speaker_max = self.audio_file.speaker_max or self.app_config.get('DEFAULT_SPEAKER_MAX')
+        在靜音處將波形切割為長度有上限的視窗，依序轉錄並將時間戳記換算回整段錄音的時間軸；
+        每次只複製一個視窗的取樣，記憶體用量不隨錄音長度增加
 
-            if speakers_count is not None:
-                diarization_options["num_speakers"] = speakers_count
-            else:
-                if speaker_min is not None:
-                    diarization_options["min_speakers"] = speaker_min
-                if speaker_max is not None:
-                    diarization_options["max_speakers"] = speaker_max
+        Args:
+            waveform: 已解碼的波形
+            transcribe_options: Whisper 轉錄選項
+            cancel_event: threading.Event，被設定時中止轉錄 (可選)
+            progress: StageProgress 實例 (可選)
 
+        Returns:
+            dict: 與 whisper_model.transcribe 相同格式的結果
+        """
+        windows = split_on_silence(
+            waveform,
+            max_window_seconds=self.app_config.get('STREAMING_WINDOW_SECONDS', 600),
+        )
+        prompt_chars = self.app_config.get('STREAMING_PROMPT_CHARS', 200)
+        options = dict(transcribe_options)
+        progress = progress or self._stage_progress(STAGE_TRANSCRIBE, waveform_duration(waveform))
+
+        logger.info(f"使用 Whisper 串流轉錄音訊: {waveform_duration(waveform):.1f} 秒，共 {len(windows)} 個視窗")
+
+        segments = []
+        texts = []
+        language = options.get("language")
+        previous_text = ""
+
+        for index, window in enumerate(windows, start=1):
+            start, end = window["start"], window["end"]
+
+            if not window["silent"]:
+                # 以前一個視窗的結尾文字作為提示，延續上下文
+                if previous_text:
+                    options["initial_prompt"] = previous_text[-prompt_chars:]
+                else:
+                    options.pop("initial_prompt", None)
+
+                chunk = np.array(waveform[start:end], dtype=np.float32)
+                callback = progress.whisper_callback(
+                    cancel_event,
+                    window_start=start / CANONICAL_SAMPLE_RATE,
+                    window_seconds=(end - start) / CANONICAL_SAMPLE_RATE,
+                    message=f"轉錄第 {index}/{len(windows)} 個視窗"
+                )
+                with get_model_registry(self.app_config).exclusive(self.whisper_model), whisper_callback(callback):
+                    result = self.whisper_model.transcribe(chunk, verbose=False, **options)
+                del chunk
+
+                # 以第一個視窗偵測到的語言轉錄其餘視窗，避免每個視窗各自偵測
+                if language is None:
+                    language = result.get("language")
+                    if language:
+                        options["language"] = language
+
+                offset = start / CANONICAL_SAMPLE_RATE
+                for segment in result.get("segments", []):
+                    segments.append(self._shift_segment(segment, offset, start, len(segments)))
+
+                window_text = result.get("text", "").strip()
+                if window_text:
+                    texts.append(window_text)
+                    previous_text = window_text
+            else:
+                logger.info(f"視窗 {index} ({window_span(window)}) 只有背景噪音 "
+                            f"(音量 {window['level_db']:.1f} dB)，略過")
+
+            progress.update(end / len(waveform), f"已轉錄 {index}/{len(windows)} 個視窗")
+
+        separator = "" if language in ("zh", "ja", "ko") else " "
+        return {
+            "text": separator.join(texts),
+            "segments": segments,
+            "language": language,
+        }
+
+    def _cpu_parallel_expected(self, duration):
+        """依設定、設備與錄音長度判斷是否會使用多行程分段轉錄 (載入模型時尚未產生暫存波形檔案)"""
+        workers = self.app_config.get('CPU_PARALLEL_WORKERS') or 0
+        return (
+            workers > 1
+            and str(self.device) == "cpu"
+            and duration is not None
+            and duration >= self.app_config.get('CPU_PARALLEL_MIN_DURATION', 300)
+        )
+
+    def _use_cpu_parallel(self, duration):
+        """是否使用多行程分段轉錄 (僅適用於 CPU 且錄音足夠長時)"""
+        return (
+            self._cpu_parallel_expected(duration)
+            and self.canonical_audio_path is not None
+            and os.path.exists(self.canonical_audio_path)
+        )
+
+    def _transcribe_parallel(self, waveform, transcribe_options, cancel_event, progress):
+        """在靜音處切割錄音，以行程池平行轉錄各分段"""
+        workers = self.app_config.get('CPU_PARALLEL_WORKERS')
+        shards = []
+        for shard in split_on_silence(
+            waveform,
+            max_window_seconds=self.app_config.get('CPU_PARALLEL_SHARD_SECONDS', 120),
+        ):
+            if shard["silent"]:
+                logger.info(f"分段 {window_span(shard)} 只有背景噪音 (音量 {shard['level_db']:.1f} dB)，略過")
+            else:
+                shards.append(shard)
+
+        logger.info(f"使用 {workers} 個行程平行轉錄音訊: {waveform_duration(waveform):.1f} 秒，"
+                    f"共 {len(shards)} 個分段")
+
+        def on_progress(completed, total):
+            if cancel_event.is_set():
+                raise StageCancelled("轉錄已取消")
+            progress.update(completed / total, f"平行轉錄 {completed}/{total} 個分段")
+
+        return transcribe_parallel(
+            self.canonical_audio_path,
+            shards,
+            self.whisper_model_name,
+            options=transcribe_options,
+            workers=workers,
+            threads_per_worker=self.app_config.get('CPU_PARALLEL_THREADS_PER_WORKER'),
+            on_progress=on_progress,
+        )
+
+    def _stage_progress(self, stage, audio_seconds):
+        """建立子階段的進度轉接器"""
+        return StageProgress(
+            self.reporter,
+            stage,
+            audio_seconds,
+            min_interval=self.app_config.get('PROGRESS_REPORT_INTERVAL', 1.0)
+        )
+
+    def _shift_segment(self, segment, offset, sample_offset, segment_id):
+        """將視窗內的片段時間戳記換算回整段錄音的時間軸"""
+        shifted = dict(segment)
+        shifted["id"] = segment_id
+        shifted["start"] = segment["start"] + offset
+        shifted["end"] = segment["end"] + offset
+        if "seek" in segment:
+            # Whisper 的 seek 以梅爾頻譜影格為單位 (每 160 個取樣一個影格)
+            shifted["seek"] = segment["seek"] + sample_offset // 160
+        if segment.get("words"):
+            shifted["words"] = [
+                dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                for word in segment["words"]
+            ]
+        return shifted
+
+    def _diarize_audio(self, waveform, diarization_options, cancel_event=None):
+        """使用 Pyannote 對已解碼的波形進行說話者分割"""
+        try:
             # 執行說話者分割
-            self.reporter.update_step_progress(10, "開始說話者分割")
-            logger.info(f"使用 Pyannote 進行說話者分割: {audio_path}")
+            duration = waveform_duration(waveform)
+            self.reporter.update_stage_progress(STAGE_DIARIZE, 10, "開始說話者分割")
+            logger.info(f"使用 Pyannote 進行說話者分割: {duration:.1f} 秒")
             logger.info(f"分割選項: {diarization_options}")
 
-            # 直接執行分割，不使用 ProgressHook
-            diarization_result = self.diarization_pipeline(
-                audio_path,
-                **diarization_options
-            )
-
-            # 更新進度為100%
-            self.reporter.update_step_progress(100, "說話者分割完成")
-            logger.info("說話者分割完成")
+            # 透過 hook 回報各步驟進度、檢查取消訊號，並收集中間結果供之後重新分群
+            progress = self._stage_progress(STAGE_DIARIZE, duration)
+            with self.metrics.stage(STAGE_DIARIZE, duration), \
+                    get_model_registry(self.app_config).exclusive(self.diarization_pipeline):
+                diarization_result = self.diarization_pipeline(
+                    to_pyannote_input(waveform),
+                    hook=make_pyannote_hook(
+                        cancel_event,
+                        on_progress=progress.pyannote_callback(),
+                        on_artifact=self.diarization_capture
+                    ),
+                    **diarization_options
+                )
+
+            progress.update(1.0, "說話者分割完成", force=True)
+            logger.info(f"說話者分割完成，處理速度 {progress.throughput:.1f} 音訊秒/秒")
 
             return diarization_result
 
+        except StageCancelled:
+            logger.info("說話者分割已因其他階段失敗而取消")
+            raise
         except Exception as e:
             logger.error(f"說話者分割時發生錯誤: {e}")
             raise AudioProcessorException(f"說話者分割時發生錯誤: {e}")
 
-    def _integrate_results(self, transcription, diarization):
+    def _integrate_results(self, transcription, diarization, base_name=None):
         """整合轉錄結果和說話者分割結果，生成最終輸出"""
         try:
             # 進度報告
             self.reporter.update_step_progress(10, "開始整合結果")
 
             # 準備基本檔案名稱
-            base_name = os.path.splitext(os.path.basename(self.audio_file.original_filename))[0]
+            if base_name is None:
+                base_name = os.path.splitext(os.path.basename(self.audio_file.original_filename))[0]
 
             # 收集 Whisper 分段結果
             transcript_segments = []
@@ -468,23 +938,11 @@ class AudioProcessor:
 
             self.reporter.update_step_progress(50, "合併轉錄與說話者資訊")
 
-            # 合併結果
-            final_segments = []
-            for ts in transcript_segments:
-                # 找出與此文字段重疊最多的說話者
-                max_overlap = 0
-                assigned_speaker = "unknown"
-
-                for ss in speaker_segments:
-                    # 計算重疊時間
-                    overlap_start = max(ts["start"], ss["start"])
-                    overlap_end = min(ts["end"], ss["end"])
-                    overlap = max(0, overlap_end - overlap_start)
-
-                    if overlap > max_overlap:
-                        max_overlap = overlap
-                        assigned_speaker = ss["speaker"]
+            # 合併結果: 為每個文字段找出重疊最多的說話者
+            assigned_speakers = assign_speakers(transcript_segments, speaker_segments)
 
+            final_segments = []
+            for ts, assigned_speaker in zip(transcript_segments, assigned_speakers):
                 # 加入最終結果
                 final_segments.append({
                     "start": ts["start"],
@@ -497,78 +955,192 @@ class AudioProcessor:
             df = pd.DataFrame(final_segments)
 
             self.reporter.update_step_progress(70, "生成輸出檔案")
+            csv_path, txt_path = self._write_transcript_files(df, base_name)
 
-            # 儲存 CSV 檔案
-            csv_path = os.path.join(self.transcript_dir, f"{base_name}_transcript.csv")
-            df.to_csv(csv_path, index=False, encoding="utf-8")
-            logger.info(f"已儲存 CSV 轉錄結果到: {csv_path}")
+            # 建立轉錄記錄
+            self.reporter.update_step_progress(90, "更新資料庫記錄")
+            result = self._create_transcript_record(df, csv_path, txt_path, base_name)
+
+            self.reporter.update_step_progress(100, "處理完成")
+            logger.info(f"音訊檔案 {self.audio_file.original_filename} 處理完成！")
+
+            return result
+
+        except Exception as e:
+            logger.error(f"整合結果時發生錯誤: {e}")
+            raise AudioProcessorException(f"整合結果時發生錯誤: {e}")
 
-            # 產生文字格式轉錄稿
-            txt_path = os.path.join(self.transcript_dir, f"{base_name}_transcript.txt")
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(f"檔案: {self.audio_file.original_filename}\n")
-                f.write(f"轉錄日期: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("-" * 60 + "\n\n")
+    def _write_transcript_files(self, df, base_name, csv_source=None):
+        """
+        儲存 CSV 與文字格式的轉錄稿
 
-                current_speaker = None
-                for _, row in df.iterrows():
-                    time_str = f"[{self._format_time(row['start'])} - {self._format_time(row['end'])}]"
+        Args:
+            df: 含 start、end、speaker、text 欄位的 DataFrame
+            base_name: 輸出檔案的基本名稱
+            csv_source: 已存在的 CSV 檔案 (可選)，提供時直接複製而不重新寫入
 
-                    # 只有當說話者變更時才顯示說話者
-                    if row['speaker'] != current_speaker:
-                        current_speaker = row['speaker']
-                        f.write(f"\n{row['speaker']}:\n")
+        Returns:
+            tuple: (CSV 路徑, TXT 路徑)
+        """
+        # 儲存 CSV 檔案
+        csv_path = os.path.join(self.transcript_dir, f"{base_name}_transcript.csv")
+        if csv_source:
+            shutil.copyfile(csv_source, csv_path)
+        else:
+            df.to_csv(csv_path, index=False, encoding="utf-8")
+        logger.info(f"已儲存 CSV 轉錄結果到: {csv_path}")
+
+        # 產生文字格式轉錄稿
+        txt_path = os.path.join(self.transcript_dir, f"{base_name}_transcript.txt")
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write(f"檔案: {self.audio_file.original_filename}\n")
+            f.write(f"轉錄日期: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write("-" * 60 + "\n\n")
+
+            current_speaker = None
+            for _, row in df.iterrows():
+                time_str = f"[{self._format_time(row['start'])} - {self._format_time(row['end'])}]"
+
+                # 只有當說話者變更時才顯示說話者
+                if row['speaker'] != current_speaker:
+                    current_speaker = row['speaker']
+                    f.write(f"\n{row['speaker']}:\n")
+
+                f.write(f"{time_str} {row['text']}\n")
+
+        logger.info(f"已儲存文字轉錄結果到: {txt_path}")
+        return csv_path, txt_path
+
+    def _create_transcript_record(self, df, csv_path, txt_path, base_name):
+        """建立轉錄資料庫記錄，返回結果摘要"""
+        # 可視化圖表於轉錄完成後在背景繪製縮圖，完整解析度圖表在下載時才繪製
+        visualization_path = None
+        if self.app_config.get('DEFAULT_VISUALIZE', True):
+            visualization_path = os.path.join(self.visualization_dir, f"{base_name}_diarization.png")
+
+        transcript = Transcript(
+            audio_file_id=self.audio_file_id,
+            csv_path=csv_path,
+            txt_path=txt_path,
+            visualization_path=visualization_path,
+            whisper_result_path=self.whisper_result_path,
+            diarization_state_path=self.diarization_state_path,
+            total_duration=self.audio_file.duration,
+            speakers_count=len(df['speaker'].unique()),
+            word_count=sum(len(str(text).split()) for text in df['text']),
+            status=TranscriptStatus.ORIGINAL
+        )
+
+        db.session.add(transcript)
+        db.session.commit()
 
-                    f.write(f"{time_str} {row['text']}\n")
+        return {
+            "transcript_id": transcript.id,
+            "csv_path": csv_path,
+            "txt_path": txt_path,
+            "visualization_path": visualization_path,
+            "speakers_count": transcript.speakers_count,
+            "word_count": transcript.word_count
+        }
+
+    def _result_cache_key(self):
+        """依音訊內容與處理設定建立結果快取鍵，音訊內容雜湊未知時返回 None"""
+        if not self.audio_file.content_hash:
+            return None
 
-            logger.info(f"已儲存文字轉錄結果到: {txt_path}")
+        return make_cache_key(
+            self.audio_file.content_hash,
+            self.audio_file.whisper_model or self.app_config.get('DEFAULT_WHISPER_MODEL', 'base'),
+            self.audio_file.language or self.app_config.get('DEFAULT_LANGUAGE'),
+            self.audio_file.speakers_count,
+            self.audio_file.speaker_min or self.app_config.get('DEFAULT_SPEAKER_MIN'),
+            self.audio_file.speaker_max or self.app_config.get('DEFAULT_SPEAKER_MAX'),
+            diarization_model=self.app_config.get('DIARIZATION_MODEL', 'pyannote/speaker-diarization-3.0'),
+        )
+
+    def _materialize_cached_result(self):
+        """
+        若相同錄音與設定的結果已在快取中，直接建立轉錄記錄
 
-            # 生成可視化圖表
-            visualize = self.app_config.get('DEFAULT_VISUALIZE', True)
-            visualization_path = None
+        Returns:
+            bool: 是否命中快取
+        """
+        cache = get_result_cache(self.app_config)
+        key = self._result_cache_key()
+        if cache is None or key is None:
+            return False
 
-            if visualize:
-                self.reporter.update_step_progress(80, "生成可視化圖表")
-                visualization_path = self._visualize_diarization(df, base_name)
+        cached = cache.get(key)
+        if cached is None:
+            return False
 
-            # 建立轉錄記錄
-            self.reporter.update_step_progress(90, "更新資料庫記錄")
+        try:
+            base_name = self._output_base_name()
+            df = pd.read_csv(cached["csv_path"], dtype={"speaker": str, "text": str}, keep_default_na=False)
 
-            transcript = Transcript(
-                audio_file_id=self.audio_file_id,
-                csv_path=csv_path,
-                txt_path=txt_path,
-                visualization_path=visualization_path,
-                total_duration=self.audio_file.duration,
-                speakers_count=len(df['speaker'].unique()),
-                word_count=sum(len(text.split()) for text in df['text']),
-                status=TranscriptStatus.ORIGINAL
-            )
+            if self.audio_file.duration is None:
+                self.audio_file.duration = cached.get("total_duration")
 
-            db.session.add(transcript)
-            db.session.commit()
+            csv_path, txt_path = self._write_transcript_files(df, base_name, csv_source=cached["csv_path"])
 
-            # 複製可視化圖表到靜態目錄，以便網頁訪問
-            if visualization_path:
-                static_viz_path = os.path.join(self.static_visualization_dir, os.path.basename(visualization_path))
-                import shutil
-                shutil.copy2(visualization_path, static_viz_path)
+            # 一併取回 Whisper 原始結果與說話者分割中間結果，之後仍可只重新執行說話者分割
+            cached_whisper = cached["artifacts"].get(_WHISPER_ARTIFACT)
+            if cached_whisper:
+                self.whisper_result_path = os.path.join(self.transcript_dir, f"{base_name}_whisper.json.gz")
+                shutil.copyfile(cached_whisper, self.whisper_result_path)
 
-            self.reporter.update_step_progress(100, "處理完成")
-            logger.info(f"音訊檔案 {self.audio_file.original_filename} 處理完成！")
+            cached_state = cached["artifacts"].get(_DIARIZATION_ARTIFACT)
+            if cached_state:
+                self.diarization_state_path = os.path.join(self.transcript_dir, f"{base_name}_diarization.npz")
+                shutil.copyfile(cached_state, self.diarization_state_path)
 
-            return {
-                "transcript_id": transcript.id,
-                "csv_path": csv_path,
-                "txt_path": txt_path,
-                "visualization_path": visualization_path,
-                "speakers_count": transcript.speakers_count,
-                "word_count": transcript.word_count
-            }
+                cached_candidates = cached["artifacts"].get(_CANDIDATES_ARTIFACT)
+                if cached_candidates:
+                    shutil.copyfile(cached_candidates, candidates_path_for(self.diarization_state_path))
+            result = self._create_transcript_record(df, csv_path, txt_path, base_name)
+
+            self.audio_file.status = ProcessingStatus.COMPLETED
+            self.audio_file.progress = 100
+            self.audio_file.processed_at = datetime.datetime.now(datetime.UTC)
+            db.session.commit()
 
         except Exception as e:
-            logger.error(f"整合結果時發生錯誤: {e}")
-            raise AudioProcessorException(f"整合結果時發生錯誤: {e}")
+            logger.warning(f"從結果快取建立轉錄記錄失敗，改為重新處理: {e}")
+            db.session.rollback()
+            return False
+
+        self._render_thumbnail(result)
+        logger.info(f"音訊檔案 {self.audio_file.original_filename} 命中結果快取，已直接建立轉錄記錄")
+        return True
+
+    def _store_cached_result(self, result, language=None):
+        """將處理完成的結果存入結果快取"""
+        cache = get_result_cache(self.app_config)
+        key = self._result_cache_key()
+        if cache is None or key is None:
+            return
+
+        candidates_path = candidates_path_for(self.diarization_state_path) if self.diarization_state_path else None
+        cache.put(key, result["csv_path"], {
+            "total_duration": self.audio_file.duration,
+            "speakers_count": result["speakers_count"],
+            "word_count": result["word_count"],
+            "language": language,
+        }, artifacts={
+            _WHISPER_ARTIFACT: self.whisper_result_path,
+            _DIARIZATION_ARTIFACT: self.diarization_state_path,
+            _CANDIDATES_ARTIFACT: candidates_path,
+        })
+
+    def _render_thumbnail(self, result):
+        """在背景繪製網頁縮圖"""
+        if result["visualization_path"]:
+            render_in_background(
+                result["csv_path"],
+                thumbnail_path_for(result["visualization_path"],
+                                   self.app_config['STATIC_VISUALIZATION_FOLDER']),
+                THUMBNAIL
+            )
 
     def _format_time(self, seconds):
         """將秒數格式化為時:分:秒.毫秒格式"""
@@ -576,51 +1148,74 @@ class AudioProcessor:
         h, m = divmod(m, 60)
         return f"{int(h):02d}:{int(m):02d}:{int(s):02d}.{int((seconds % 1) * 1000):03d}"
 
-    def _visualize_diarization(self, df, base_name):
-        """生成說話者分割的可視化圖表"""
-        try:
-            logger.info("生成說話者分割可視化圖表...")
 
-            plot_path = os.path.join(self.visualization_dir, f"{base_name}_diarization.png")
+def _run_audio_job(audio_file_id, mode=AUDIO_JOB_FULL, transcript_id=None):
+    """
+    工作排程器呼叫的音訊處理工作
+
+    Args:
+        audio_file_id: 音訊檔案 ID
+        mode: 提交時指定的執行模式；AUDIO_JOB_REDIARIZE (由 rediarize_async 提交) 只重新執行說話者分割，
+            AUDIO_JOB_FULL 執行完整處理
+        transcript_id: 重新執行說話者分割時沿用其 Whisper 原始結果的轉錄 ID，
+            為 None 時 (較早提交的工作) 使用最新一份轉錄
+    """
+    processor = AudioProcessor(audio_file_id)
+
+    if mode == AUDIO_JOB_REDIARIZE:
+        source = _source_transcript(audio_file_id, transcript_id)
+        if source and source.whisper_result_path and os.path.exists(source.whisper_result_path):
+            state_path = source.diarization_state_path
+            processor._rediarize_audio_file(
+                source.whisper_result_path,
+                state_path if state_path and os.path.exists(state_path) else None
+            )
+        else:
+            processor._fail(AudioProcessorException("找不到 Whisper 原始結果，無法重新執行說話者分割"))
+    elif mode == AUDIO_JOB_FULL:
+        processor._process_audio_file()
+    else:
+        processor._fail(AudioProcessorException(f"未知的音訊工作模式: {mode}"))
+
+    # 處理失敗時拋出異常，讓工作記錄標記為失敗
+    if processor.audio_file.status == ProcessingStatus.FAILED:
+        raise AudioProcessorException(processor.audio_file.error_message)
 
-            # 獲取不同的說話者
-            speakers = df['speaker'].unique()
-            colors = plt.cm.tab10(np.linspace(0, 1, len(speakers)))
-            speaker_colors = dict(zip(speakers, colors))
 
-            # 設定圖表
-            plt.figure(figsize=(12, 6))
-            plt.title("Speech Diarization Visualization")
-            plt.xlabel("Time (seconds)")
-            plt.ylabel("Speaker")
+def latest_transcript(audio_file_id):
+    """取得音訊檔案最新的轉錄記錄"""
+    return Transcript.query.filter_by(audio_file_id=audio_file_id).order_by(Transcript.id.desc()).first()
 
-            # 對每個說話者繪製時間軸
-            for speaker in speakers:
-                speaker_df = df[df['speaker'] == speaker]
-                for _, row in speaker_df.iterrows():
-                    plt.hlines(
-                        y=speaker,
-                        xmin=row['start'],
-                        xmax=row['end'],
-                        colors=speaker_colors[speaker],
-                        linewidth=6
-                    )
 
-            # 添加網格和圖例
-            plt.grid(True, linestyle='--', alpha=0.7)
-            plt.tight_layout()
+def _source_transcript(audio_file_id, transcript_id=None):
+    """取得音訊檔案的指定轉錄記錄，未指定時取得最新的轉錄記錄"""
+    if transcript_id is None:
+        return latest_transcript(audio_file_id)
+    return Transcript.query.filter_by(id=transcript_id, audio_file_id=audio_file_id).first()
 
-            # 儲存圖表
-            plt.savefig(plot_path, dpi=300, bbox_inches='tight')
-            plt.close()
 
-            logger.info(f"已儲存可視化圖表到: {plot_path}")
+def _requeue_audio_job(audio_file_id):
+    """被中斷的音訊處理工作重新排入時，重置處理進度"""
+    audio_file = AudioFile.query.get(audio_file_id)
+    if audio_file:
+        audio_file.status = ProcessingStatus.PROCESSING
+        audio_file.progress = 0
+        audio_file.error_message = None
+        db.session.commit()
+    get_progress_bus().discard(JOB_TYPE_AUDIO, audio_file_id)
 
-            return plot_path
 
-        except Exception as e:
-            logger.error(f"生成可視化圖表時發生錯誤: {e}")
-            return None
+def _fail_audio_job(audio_file_id, message):
+    """被中斷的音訊處理工作放棄時，標記音訊檔案為處理失敗"""
+    audio_file = AudioFile.query.get(audio_file_id)
+    if audio_file:
+        audio_file.status = ProcessingStatus.FAILED
+        audio_file.error_message = message
+        db.session.commit()
+    get_progress_bus().discard(JOB_TYPE_AUDIO, audio_file_id)
+
+
+register_job_handler(JOB_TYPE_AUDIO, _run_audio_job, on_requeued=_requeue_audio_job, on_failed=_fail_audio_job)
 
 
 # 工廠函式
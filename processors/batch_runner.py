@@ -0,0 +1,356 @@
+"""
+批次處理器
+不經過網頁上傳表單，直接將目錄中的錄音登記到資料庫並交給工作排程器處理 (可選擇同時生成報告)，
+結果與網頁上傳的錄音相同，會出現在使用者的儀表板中
+
+並行數量由排程器的 AUDIO_WORKER_COUNT / LLM_WORKER_COUNT 決定，所有工作線程共用模型註冊表中的模型；
+已完成的錄音 (以內容雜湊比對) 會略過，中斷後重新執行只會處理尚未完成的錄音。
+處理過程與結果以 JSON Lines 格式逐行寫入記錄檔
+"""
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from werkzeug.utils import secure_filename
+
+from models.db_models import AudioFile, Report, Job, JobState, ProcessingStatus, ReportStatus
+from processors.audio_processor import create_audio_processor, latest_transcript
+from processors.report_generator import create_report_generator
+from processors.job_scheduler import get_job_scheduler, JOB_TYPE_AUDIO, JOB_TYPE_LLM
+from processors.progress_bus import get_progress_bus
+from utils.audio_probe import probe_audio
+from utils.file_utils import allowed_file, file_sha256, link_or_copy
+from app import db
+
+# 設定日誌
+logger = logging.getLogger("batch_runner")
+
+
+def discover_audio_files(inputs, allowed_extensions, recursive=False):
+    """
+    展開輸入的檔案、目錄與萬用字元，返回允許格式的音訊檔案
+
+    Args:
+        inputs: 檔案路徑、目錄或萬用字元 (例如 "archive/2023-*.mp3") 的列表
+        allowed_extensions: 允許的副檔名集合
+        recursive: 是否遞迴搜尋子目錄
+
+    Returns:
+        list: 依路徑排序、不重複的絕對路徑
+    """
+    found = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            if recursive:
+                candidates = (os.path.join(root, name) for root, _, names in os.walk(pattern) for name in names)
+            else:
+                candidates = (os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            candidates = glob.glob(pattern, recursive=recursive)
+
+        for path in candidates:
+            if os.path.isfile(path) and allowed_file(os.path.basename(path), allowed_extensions):
+                found.add(os.path.abspath(path))
+
+    return sorted(found)
+
+
+class BatchLog:
+    """以 JSON Lines 格式記錄批次處理事件，每筆事件寫入後立即 flush"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, event, **fields):
+        record = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "event": event, **fields}
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+        return record
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class BatchRunner:
+    """將一批錄音登記到資料庫、提交處理並等待完成"""
+
+    def __init__(self, app, user, log, options=None, report_options=None, retry_failed=False,
+                 poll_interval=2.0, progress_interval=30.0):
+        """
+        初始化批次處理器
+
+        Args:
+            app: Flask 應用
+            user: 擁有這些錄音的 User
+            log: BatchLog 實例
+            options: 音訊處理設定 (whisper_model、language、speakers_count、speaker_min、speaker_max)，
+                未提供的項目使用應用配置的預設值
+            report_options: 報告設定 (title_prefix、ollama_model、system_prompt)；為 None 時不生成報告
+            retry_failed: 是否重新處理先前失敗的錄音
+            poll_interval: 檢查工作狀態的間隔 (秒)
+            progress_interval: 寫入進度事件的間隔 (秒)
+        """
+        self.app = app
+        self.user_id = user.id
+        self.log = log
+        self.report_options = report_options
+        self.retry_failed = retry_failed
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+
+        config = app.config
+        options = options or {}
+        self.options = {
+            "whisper_model": options.get("whisper_model") or config.get('DEFAULT_WHISPER_MODEL'),
+            "language": options.get("language") or config.get('DEFAULT_LANGUAGE'),
+            "speakers_count": options.get("speakers_count") or config.get('DEFAULT_SPEAKERS_COUNT'),
+            "speaker_min": options.get("speaker_min") or config.get('DEFAULT_SPEAKER_MIN'),
+            "speaker_max": options.get("speaker_max") or config.get('DEFAULT_SPEAKER_MAX'),
+        }
+
+        # 等待中的工作: 音訊檔案 ID / 報告 ID -> 原始路徑
+        self._audio_jobs = {}
+        self._report_jobs = {}
+        # 上次執行時處理中的音訊檔案 ID，登記完成後再恢復
+        self._interrupted = []
+        self._counts = {"completed": 0, "skipped": 0, "failed": 0, "reports": 0}
+
+    def run(self, paths):
+        """
+        處理所有錄音並等待完成
+
+        Args:
+            paths: discover_audio_files 返回的路徑列表
+
+        Returns:
+            dict: 各結果的數量 (completed、skipped、failed、reports)
+        """
+        started = time.monotonic()
+        self.log.write("start", files=len(paths), options=self.options,
+                       report=self.report_options is not None)
+
+        for path in paths:
+            try:
+                self._submit(path)
+            except Exception as e:
+                db.session.rollback()
+                self._counts["failed"] += 1
+                self.log.write("failed", path=path, error=str(e))
+                logger.error(f"登記錄音 {path} 時發生錯誤: {e}")
+
+        if self._interrupted:
+            self._resume_interrupted()
+
+        self._wait()
+
+        summary = dict(self._counts, seconds=round(time.monotonic() - started, 1))
+        self.log.write("summary", **summary)
+        return summary
+
+    def _submit(self, path):
+        """登記一個錄音並提交處理；已完成的錄音直接略過或只生成報告"""
+        content_hash = file_sha256(path)
+        audio_file = AudioFile.query.filter_by(
+            user_id=self.user_id,
+            content_hash=content_hash
+        ).order_by(AudioFile.id.desc()).first()
+
+        if audio_file is None:
+            audio_file = self._register(path, content_hash)
+            self.log.write("registered", path=path, audio_file_id=audio_file.id, duration=audio_file.duration)
+
+        elif audio_file.status == ProcessingStatus.COMPLETED:
+            transcript = latest_transcript(audio_file.id)
+            if self.report_options is None or self._has_report(transcript):
+                self._counts["skipped"] += 1
+                self.log.write("skipped", path=path, audio_file_id=audio_file.id, reason="已處理完成")
+                return
+            self.log.write("skipped", path=path, audio_file_id=audio_file.id, reason="已轉錄，只生成報告")
+            self._submit_report(path, audio_file, transcript)
+            return
+
+        elif audio_file.status == ProcessingStatus.PROCESSING:
+            # 處理中 (或上次中斷)，登記完成後由 _resume_interrupted 恢復被中斷的工作，再等待結果
+            self._audio_jobs[audio_file.id] = path
+            self._interrupted.append(audio_file.id)
+            self.log.write("waiting", path=path, audio_file_id=audio_file.id)
+            return
+
+        elif audio_file.status in (ProcessingStatus.FAILED, ProcessingStatus.CANCELED) and not self.retry_failed:
+            self._counts["skipped"] += 1
+            self.log.write("skipped", path=path, audio_file_id=audio_file.id,
+                           reason=f"先前處理失敗: {audio_file.error_message}")
+            return
+
+        # 相同錄音與設定已處理過時 process_async 會直接使用結果快取
+        create_audio_processor(audio_file.id).process_async()
+        self._audio_jobs[audio_file.id] = path
+        self.log.write("submitted", path=path, audio_file_id=audio_file.id)
+
+    def _resume_interrupted(self):
+        """
+        恢復上次執行被中斷的音訊處理工作
+
+        工作記錄的持有者已結束時以原本的參數重新排入；沒有進行中工作記錄的錄音重新提交完整處理。
+        仍由其他存活行程 (例如網頁服務) 處理中的錄音只等待結果
+        """
+        ids = list(self._interrupted)
+        self._interrupted = []
+
+        recovered = get_job_scheduler().recover_abandoned_jobs(JOB_TYPE_AUDIO, ids)
+        if recovered:
+            self.log.write("recovered", jobs=recovered)
+
+        active = {
+            job.target_id for job in Job.query.filter(
+                Job.job_type == JOB_TYPE_AUDIO,
+                Job.target_id.in_(ids),
+                Job.state.in_([JobState.QUEUED, JobState.RUNNING])
+            )
+        }
+        for audio_file_id in ids:
+            if audio_file_id in active:
+                continue
+            audio_file = db.session.get(AudioFile, audio_file_id)
+            if audio_file is None or audio_file.status != ProcessingStatus.PROCESSING:
+                continue
+
+            create_audio_processor(audio_file_id).process_async()
+            self.log.write("resubmitted", path=self._audio_jobs[audio_file_id], audio_file_id=audio_file_id)
+
+    def _register(self, path, content_hash):
+        """將錄音放入上傳目錄並建立 AudioFile 記錄 (與網頁上傳的目錄結構相同)"""
+        config = self.app.config
+        upload_folder = os.path.join(config['UPLOAD_FOLDER'], str(uuid.uuid4()))
+        os.makedirs(upload_folder, exist_ok=True)
+
+        filename = secure_filename(os.path.basename(path))
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        unique_filename = f"{timestamp}_{filename}"
+        file_path = os.path.join(upload_folder, unique_filename)
+
+        # 以硬連結避免複製大量錄音；刪除網頁上的記錄不會刪除原始檔案
+        link_or_copy(path, file_path)
+
+        audio_info = probe_audio(file_path)
+        audio_file = AudioFile(
+            filename=unique_filename,
+            original_filename=filename,
+            file_path=file_path,
+            file_size=os.path.getsize(file_path),
+            duration=audio_info['duration'] if audio_info else None,
+            content_hash=content_hash,
+            status=ProcessingStatus.PENDING,
+            user_id=self.user_id,
+            **self.options
+        )
+        db.session.add(audio_file)
+        db.session.commit()
+        return audio_file
+
+    def _has_report(self, transcript):
+        """轉錄是否已有完成的報告"""
+        return transcript is not None and Report.query.filter_by(
+            transcript_id=transcript.id,
+            status=ReportStatus.COMPLETED
+        ).first() is not None
+
+    def _submit_report(self, path, audio_file, transcript):
+        """為已完成的轉錄建立報告記錄並提交生成"""
+        config = self.app.config
+        options = self.report_options
+        title = os.path.splitext(audio_file.original_filename)[0]
+        if options.get("title_prefix"):
+            title = f"{options['title_prefix']} - {title}"
+
+        report = Report(
+            title=title,
+            system_prompt=options.get("system_prompt") or config.get('DEFAULT_SYSTEM_PROMPT'),
+            ollama_model=options.get("ollama_model") or config.get('DEFAULT_OLLAMA_MODEL'),
+            status=ReportStatus.GENERATING,
+            user_id=self.user_id,
+            audio_file_id=audio_file.id,
+            transcript_id=transcript.id
+        )
+        db.session.add(report)
+        db.session.commit()
+
+        create_report_generator(report.id).generate_async()
+        self._report_jobs[report.id] = path
+        self.log.write("report_submitted", path=path, audio_file_id=audio_file.id, report_id=report.id)
+
+    def _wait(self):
+        """輪詢資料庫直到所有工作結束，並定期寫入進度事件"""
+        bus = get_progress_bus()
+        last_progress = time.monotonic()
+
+        while self._audio_jobs or self._report_jobs:
+            time.sleep(self.poll_interval)
+
+            # 工作在其他線程中以各自的 session 更新，重新讀取最新狀態
+            db.session.expire_all()
+
+            self._poll_audio()
+            self._poll_reports()
+
+            if time.monotonic() - last_progress >= self.progress_interval:
+                last_progress = time.monotonic()
+                for audio_file_id, path in self._audio_jobs.items():
+                    self.log.write("progress", path=path, audio_file_id=audio_file_id,
+                                   progress=bus.progress(JOB_TYPE_AUDIO, audio_file_id))
+                for report_id, path in self._report_jobs.items():
+                    self.log.write("progress", path=path, report_id=report_id,
+                                   progress=bus.progress(JOB_TYPE_LLM, report_id))
+
+    def _poll_audio(self):
+        if not self._audio_jobs:
+            return
+
+        for audio_file in AudioFile.query.filter(AudioFile.id.in_(list(self._audio_jobs))).all():
+            path = self._audio_jobs[audio_file.id]
+
+            if audio_file.status == ProcessingStatus.COMPLETED:
+                del self._audio_jobs[audio_file.id]
+                transcript = latest_transcript(audio_file.id)
+                self._counts["completed"] += 1
+                self.log.write(
+                    "completed", path=path, audio_file_id=audio_file.id,
+                    transcript_id=transcript.id if transcript else None,
+                    duration=audio_file.duration,
+                    speakers_count=transcript.speakers_count if transcript else None,
+                    csv_path=transcript.csv_path if transcript else None
+                )
+                if self.report_options is not None and transcript is not None:
+                    self._submit_report(path, audio_file, transcript)
+
+            elif audio_file.status in (ProcessingStatus.FAILED, ProcessingStatus.CANCELED):
+                del self._audio_jobs[audio_file.id]
+                self._counts["failed"] += 1
+                self.log.write("failed", path=path, audio_file_id=audio_file.id, error=audio_file.error_message)
+
+    def _poll_reports(self):
+        if not self._report_jobs:
+            return
+
+        for report in Report.query.filter(Report.id.in_(list(self._report_jobs))).all():
+            path = self._report_jobs[report.id]
+
+            if report.status == ReportStatus.COMPLETED:
+                del self._report_jobs[report.id]
+                self._counts["reports"] += 1
+                self.log.write("report_completed", path=path, report_id=report.id,
+                               markdown_path=report.markdown_path)
+
+            elif report.status in (ReportStatus.FAILED, ReportStatus.CANCELED):
+                del self._report_jobs[report.id]
+                self._counts["failed"] += 1
+                self.log.write("report_failed", path=path, report_id=report.id, error=report.error_message)
@@ -0,0 +1,250 @@
+"""
+說話者分割中間結果
+Pyannote 管線中最耗時的是分割 (segmentation) 與說話者嵌入向量 (embedding) 的計算，
+分群 (clustering) 本身只需數秒；此模組透過管線的 hook 取得這些中間結果並保存，
+之後改變說話者數量時只需重新分群
+
+recluster 重現 SpeakerDiarization.apply() (pyannote.audio 3.0) 在取得嵌入向量之後的步驟:
+clustering -> reconstruct -> to_annotation -> 重新命名說話者標籤
+
+候選說話者數量的試算結果在音訊處理工作中計算，以 JSON 檔案保存在中間結果旁，網頁只讀取該檔案
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 需要保存的管線步驟
+_CAPTURED_STEPS = ("segmentation", "speaker_counting", "embeddings")
+
+
+class DiarizationStateException(Exception):
+    """說話者分割中間結果異常"""
+    pass
+
+
+class DiarizationCapture:
+    """
+    收集 Pyannote 管線各步驟的最終產物
+
+    作為 make_pyannote_hook 的 on_artifact 回調使用；
+    批次進度回報 (帶有 completed/total) 不會傳入此回調
+    """
+
+    def __init__(self):
+        self.artifacts = {}
+
+    def __call__(self, step_name, artifact):
+        if step_name in _CAPTURED_STEPS and artifact is not None:
+            self.artifacts[step_name] = artifact
+
+    @property
+    def complete(self):
+        """是否已取得重新分群所需的所有中間結果"""
+        return all(step in self.artifacts for step in _CAPTURED_STEPS)
+
+
+def _window_array(sliding_window):
+    return np.array([sliding_window.start, sliding_window.duration, sliding_window.step], dtype=np.float64)
+
+
+def _compact(data):
+    """分割結果只有 0 與 1 時以 uint8 保存，否則以 float16 保存"""
+    data = np.asarray(data)
+    if np.all((data == 0) | (data == 1)):
+        return data.astype(np.uint8)
+    return data.astype(np.float16)
+
+
+def save_diarization_state(capture, path):
+    """
+    將收集到的中間結果保存為壓縮的 npz 檔案
+
+    Args:
+        capture: DiarizationCapture 實例
+        path: 輸出路徑 (.npz)
+
+    Returns:
+        str: 輸出路徑；中間結果不完整時返回 None
+    """
+    if not capture.complete:
+        logger.info("說話者分割中間結果不完整 (可能沒有偵測到語音)，不保存")
+        return None
+
+    segmentation = capture.artifacts["segmentation"]
+    count = capture.artifacts["speaker_counting"]
+    embeddings = capture.artifacts["embeddings"]
+
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(
+            f,
+            segmentation=_compact(segmentation.data),
+            segmentation_window=_window_array(segmentation.sliding_window),
+            count=np.asarray(count.data).astype(np.int16),
+            count_window=_window_array(count.sliding_window),
+            embeddings=np.asarray(embeddings, dtype=np.float32),
+        )
+    os.replace(tmp_path, path)
+
+    logger.info(f"已保存說話者分割中間結果到: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+    return path
+
+
+def load_diarization_state(path):
+    """
+    讀取 save_diarization_state 保存的中間結果
+
+    Returns:
+        dict: {"segmentation": SlidingWindowFeature, "count": SlidingWindowFeature, "embeddings": ndarray}
+    """
+    from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+    try:
+        with np.load(path) as data:
+            segmentation_window = SlidingWindow(*data["segmentation_window"].tolist())
+            count_window = SlidingWindow(*data["count_window"].tolist())
+            return {
+                "segmentation": SlidingWindowFeature(data["segmentation"].astype(np.float32), segmentation_window),
+                "count": SlidingWindowFeature(data["count"].astype(np.int8), count_window),
+                "embeddings": data["embeddings"],
+            }
+    except (OSError, KeyError, ValueError) as e:
+        raise DiarizationStateException(f"無法讀取說話者分割中間結果 {path}: {e}")
+
+
+def recluster(pipeline, state, num_speakers=None, min_speakers=None, max_speakers=None):
+    """
+    以保存的中間結果重新分群，產生與完整執行管線相同格式的說話者分割結果
+
+    Args:
+        pipeline: 已載入的 Pyannote SpeakerDiarization 管線 (提供分群與重建的參數)
+        state: load_diarization_state 的返回值
+        num_speakers: 說話者數量
+        min_speakers: 最少說話者數量
+        max_speakers: 最多說話者數量
+
+    Returns:
+        pyannote.core.Annotation
+    """
+    from pyannote.core import Annotation
+
+    segmentations = state["segmentation"]
+    count = state["count"]
+    embeddings = state["embeddings"]
+
+    num_speakers, min_speakers, max_speakers = pipeline.set_num_speakers(
+        num_speakers=num_speakers,
+        min_speakers=min_speakers,
+        max_speakers=max_speakers,
+    )
+
+    # 沒有任何說話者時直接返回空結果
+    if np.nanmax(count.data) == 0.0:
+        return Annotation()
+
+    # 與 apply() 相同的二值化方式
+    if pipeline._segmentation.model.specifications.powerset:
+        binarized_segmentations = segmentations
+    else:
+        from pyannote.audio.utils.signal import binarize
+        binarized_segmentations = binarize(
+            segmentations,
+            onset=pipeline.segmentation.threshold,
+            initial_state=False,
+        )
+
+    hard_clusters, _, _ = pipeline.clustering(
+        embeddings=embeddings,
+        segmentations=binarized_segmentations,
+        num_clusters=num_speakers,
+        min_clusters=min_speakers,
+        max_clusters=max_speakers,
+    )
+
+    # 標記沒有說話的區域說話者
+    inactive_speakers = np.sum(binarized_segmentations.data, axis=1) == 0
+    hard_clusters[inactive_speakers] = -2
+
+    discrete_diarization = pipeline.reconstruct(segmentations, hard_clusters, count)
+    diarization = pipeline.to_annotation(
+        discrete_diarization,
+        min_duration_on=0.0,
+        min_duration_off=pipeline.segmentation.min_duration_off,
+    )
+
+    # 將整數標籤重新命名為 SPEAKER_00, SPEAKER_01, ...
+    mapping = {
+        label: expected_label
+        for label, expected_label in zip(diarization.labels(), pipeline.classes())
+    }
+    return diarization.rename_labels(mapping=mapping)
+
+
+def candidate_clusterings(pipeline, state, speaker_counts):
+    """
+    以多個候選說話者數量分別重新分群，摘要各結果
+
+    Args:
+        pipeline: 已載入的 Pyannote 管線
+        state: load_diarization_state 的返回值
+        speaker_counts: 候選說話者數量列表
+
+    Returns:
+        list: 每個候選為 {"num_speakers": 指定數量, "detected": 實際分出的人數,
+              "speakers": [{"label": 標籤, "duration": 說話秒數, "share": 占比}, ...]}
+    """
+    candidates = []
+    for num_speakers in speaker_counts:
+        diarization = recluster(pipeline, state, num_speakers=num_speakers)
+
+        durations = {label: diarization.label_duration(label) for label in diarization.labels()}
+        total = sum(durations.values()) or 1.0
+        speakers = sorted(
+            ({"label": label, "duration": duration, "share": duration / total}
+             for label, duration in durations.items()),
+            key=lambda item: item["duration"],
+            reverse=True
+        )
+
+        candidates.append({
+            "num_speakers": num_speakers,
+            "detected": len(speakers),
+            "speakers": speakers,
+        })
+
+    return candidates
+
+
+def candidates_path_for(state_path):
+    """中間結果對應的候選分群試算結果路徑"""
+    return f"{os.path.splitext(state_path)[0]}_candidates.json"
+
+
+def save_candidates(candidates, path):
+    """保存 candidate_clusterings 的結果"""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(candidates, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_candidates(path):
+    """
+    讀取 save_candidates 保存的試算結果
+
+    Returns:
+        list: 候選分群摘要；檔案不存在時返回 None
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise DiarizationStateException(f"無法讀取候選分群結果 {path}: {e}")
@@ -0,0 +1,110 @@
+"""
+模型引擎掛鉤
+在不修改 Whisper 與 Pyannote 的情況下，從其執行過程中取得回調，
+用於在平行執行的階段之間傳遞取消訊號
+"""
+import threading
+import types
+from contextlib import contextmanager
+
+# Whisper 回調以線程區域變數保存，多個工作同時轉錄時互不干擾
+_whisper_local = threading.local()
+_whisper_patch_lock = threading.Lock()
+_whisper_patched = False
+
+
+class StageCancelled(Exception):
+    """階段被取消 (通常因為另一個平行階段失敗)"""
+    pass
+
+
+class _CallbackProgressBar:
+    """取代 tqdm 進度條，將進度轉交給回調函數"""
+
+    def __init__(self, callback, total=None):
+        self.callback = callback
+        self.total = total
+        self.n = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        self.callback(self.n, self.total)
+
+    def close(self):
+        pass
+
+
+def _install_whisper_patch():
+    """將 whisper.transcribe 模組中的 tqdm 換成可依線程分派回調的版本 (只執行一次)"""
+    global _whisper_patched
+
+    with _whisper_patch_lock:
+        if _whisper_patched:
+            return
+
+        import whisper.transcribe as whisper_transcribe
+
+        original_tqdm = whisper_transcribe.tqdm
+
+        def tqdm_factory(*args, **kwargs):
+            callback = getattr(_whisper_local, 'callback', None)
+            if callback is None:
+                return original_tqdm.tqdm(*args, **kwargs)
+            return _CallbackProgressBar(callback, kwargs.get('total'))
+
+        whisper_transcribe.tqdm = types.SimpleNamespace(tqdm=tqdm_factory)
+        _whisper_patched = True
+
+
+@contextmanager
+def whisper_callback(callback):
+    """
+    在目前線程中為 Whisper 的轉錄迴圈設定回調
+
+    回調簽名為 callback(completed_frames, total_frames)，每處理完一個 30 秒視窗呼叫一次；
+    回調拋出的異常 (例如 StageCancelled) 會中止轉錄
+
+    用法:
+        with whisper_callback(callback):
+            model.transcribe(...)
+    """
+    _install_whisper_patch()
+    previous = getattr(_whisper_local, 'callback', None)
+    _whisper_local.callback = callback
+    try:
+        yield
+    finally:
+        _whisper_local.callback = previous
+
+
+def make_pyannote_hook(cancel_event=None, on_progress=None, on_artifact=None):
+    """
+    建立 Pyannote 管線的 hook 函數
+
+    Args:
+        cancel_event: threading.Event，被設定時中止說話者分割 (可選)
+        on_progress: 進度回調，簽名為 on_progress(step_name, completed, total) (可選)
+        on_artifact: 步驟產物回調，簽名為 on_artifact(step_name, artifact)，
+            只在步驟完成時呼叫，批次進度回報不會呼叫 (可選)
+
+    Returns:
+        符合 pyannote hook(step_name, step_artifact, file=None, total=None, completed=None) 簽名的函數
+    """
+    def hook(step_name, step_artifact, file=None, total=None, completed=None):
+        if cancel_event is not None and cancel_event.is_set():
+            raise StageCancelled("說話者分割已取消")
+
+        if on_progress is not None:
+            on_progress(step_name, completed, total)
+
+        if on_artifact is not None and completed is None:
+            on_artifact(step_name, step_artifact)
+
+    return hook
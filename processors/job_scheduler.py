@@ -0,0 +1,553 @@
+"""
+工作排程器
+以固定數量的工作線程執行音訊處理與報告生成工作，取代每次上傳都啟動一個線程的做法
+各類工作有獨立的並行上限，等待中的工作依先進先出 (FIFO) 順序排隊
+
+每個工作同時記錄在資料庫的 Job 資料表中 (狀態、嘗試次數、租約持有者與心跳時間)，
+行程重啟後會重新排入或標記失敗被中斷的工作
+"""
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+
+from models.db_models import Job, JobState
+from extensions import db
+
+# 設定日誌
+logger = logging.getLogger("job_scheduler")
+
+# 工作類型
+JOB_TYPE_AUDIO = "audio"
+JOB_TYPE_LLM = "llm"
+
+# 各工作類型的處理函數
+_job_handlers = {}
+
+
+class JobSchedulerException(Exception):
+    """工作排程器異常"""
+    pass
+
+
+class _JobHandler:
+    """工作類型對應的處理函數"""
+
+    def __init__(self, run, on_requeued=None, on_failed=None):
+        self.run = run
+        self.on_requeued = on_requeued
+        self.on_failed = on_failed
+
+
+def register_job_handler(job_type, run, on_requeued=None, on_failed=None):
+    """
+    註冊工作類型的處理函數
+
+    Args:
+        job_type: 工作類型
+        run: 執行工作的函數，簽名為 run(target_id, **payload)，執行失敗時應拋出異常
+        on_requeued: 中斷的工作被重新排入時呼叫，簽名為 on_requeued(target_id)
+        on_failed: 中斷的工作因超過重試次數而放棄時呼叫，簽名為 on_failed(target_id, message)
+    """
+    _job_handlers[job_type] = _JobHandler(run, on_requeued, on_failed)
+
+
+def _utcnow():
+    """目前的 UTC 時間 (與資料庫模型一致，不含時區)"""
+    return datetime.datetime.utcnow()
+
+
+def _owner_is_dead(owner):
+    """檢查租約持有者是否為本機上已結束的行程"""
+    if not owner:
+        return True
+
+    try:
+        host, pid, _ = owner.split(":", 2)
+        pid = int(pid)
+    except ValueError:
+        return False
+
+    if host != socket.gethostname():
+        return False
+
+    if pid == os.getpid():
+        return owner != _scheduler.owner_id if _scheduler else True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def _load_payload(record):
+    """讀取工作記錄保存的處理函數參數"""
+    if not record.payload:
+        return None
+    try:
+        return json.loads(record.payload)
+    except ValueError:
+        logger.warning(f"[{record.job_type}] 工作 {record.target_id} 的參數無法解析，以預設參數執行")
+        return None
+
+
+class _Job:
+    """排程中的單一工作"""
+
+    def __init__(self, job_type, target_id, func, record_id=None):
+        self.job_type = job_type
+        self.target_id = target_id
+        self.func = func
+        self.record_id = record_id
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+
+class _WorkerPool:
+    """單一工作類型的 FIFO 隊列與工作線程"""
+
+    def __init__(self, scheduler, job_type, max_workers):
+        self.scheduler = scheduler
+        self.job_type = job_type
+        self.max_workers = max(1, int(max_workers))
+        self.pending = deque()
+        self.running = {}  # target_id -> _Job
+        self.condition = threading.Condition()
+        self.workers = []
+        self.completed_count = 0
+        self.failed_count = 0
+
+    def contains(self, target_id):
+        """檢查工作是否已在排隊或執行中"""
+        with self.condition:
+            return target_id in self.running or any(j.target_id == target_id for j in self.pending)
+
+    def submit(self, job):
+        """加入工作到隊列尾端，若相同工作已在排隊或執行中則忽略"""
+        with self.condition:
+            if job.target_id in self.running or any(j.target_id == job.target_id for j in self.pending):
+                logger.info(f"[{self.job_type}] 工作 {job.target_id} 已在隊列中，略過重複提交")
+                return False
+
+            self.pending.append(job)
+            self._ensure_workers()
+            self.condition.notify()
+
+        logger.info(f"[{self.job_type}] 工作 {job.target_id} 已加入隊列，"
+                    f"排隊中 {len(self.pending)} 個，執行中 {len(self.running)} 個")
+        return True
+
+    def position(self, target_id):
+        """
+        取得工作的隊列位置
+
+        Returns:
+            int: 1 表示下一個執行，0 表示執行中，None 表示不在排程器中
+        """
+        with self.condition:
+            if target_id in self.running:
+                return 0
+            for index, job in enumerate(self.pending):
+                if job.target_id == target_id:
+                    return index + 1
+        return None
+
+    def _ensure_workers(self):
+        """啟動尚未啟動的工作線程 (需持有鎖)"""
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.job_type}-worker-{len(self.workers) + 1}"
+            )
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker_loop(self):
+        """工作線程主迴圈"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.scheduler.stopping:
+                    self.condition.wait()
+
+                # 關閉中不再取出新工作，剩餘工作留在資料庫中等待下次啟動
+                if self.scheduler.stopping:
+                    return
+
+                job = self.pending.popleft()
+                job.started_at = time.monotonic()
+                self.running[job.target_id] = job
+
+            wait_time = job.started_at - job.submitted_at
+            logger.info(f"[{self.job_type}] 開始執行工作 {job.target_id} (排隊 {wait_time:.1f} 秒)")
+
+            try:
+                with self.scheduler.app.app_context():
+                    self.scheduler._mark_running(job)
+                    try:
+                        job.func()
+                    except Exception as e:
+                        self.failed_count += 1
+                        logger.error(f"[{self.job_type}] 工作 {job.target_id} 執行失敗: {e}")
+                        self.scheduler._mark_finished(job, JobState.FAILED, str(e))
+                    else:
+                        self.completed_count += 1
+                        self.scheduler._mark_finished(job, JobState.COMPLETED)
+            except Exception as e:
+                logger.error(f"[{self.job_type}] 更新工作 {job.target_id} 記錄時發生錯誤: {e}")
+            finally:
+                with self.condition:
+                    self.running.pop(job.target_id, None)
+                    self.condition.notify_all()
+
+                logger.info(f"[{self.job_type}] 工作 {job.target_id} 結束，"
+                            f"耗時 {time.monotonic() - job.started_at:.1f} 秒")
+
+
+class JobScheduler:
+    """依工作類型限制並行數量、並將工作持久化到資料庫的工作排程器"""
+
+    def __init__(self, app, limits, lease_timeout=120, heartbeat_interval=15, max_attempts=3):
+        """
+        初始化工作排程器
+
+        Args:
+            app: Flask 應用，工作會在其應用上下文中執行
+            limits: 各工作類型的並行上限，例如 {'audio': 1, 'llm': 2}
+            lease_timeout: 心跳逾時多久 (秒) 後視為持有者已失效
+            heartbeat_interval: 更新心跳的間隔 (秒)
+            max_attempts: 中斷的工作最多嘗試執行的次數
+        """
+        self.app = app
+        self.stopping = False
+        self.lease_timeout = lease_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.max_attempts = max_attempts
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._pools = {
+            job_type: _WorkerPool(self, job_type, max_workers)
+            for job_type, max_workers in limits.items()
+        }
+
+        self._heartbeat_thread = None
+        self._stop_event = threading.Event()
+
+    def submit(self, job_type, target_id, func=None, payload=None):
+        """
+        提交工作
+
+        Args:
+            job_type: 工作類型
+            target_id: 對應的 AudioFile 或 Report ID (同類型內唯一)
+            func: 要執行的函數，會在應用上下文中呼叫；為 None 時使用已註冊的處理函數
+            payload: 傳給已註冊處理函數的關鍵字參數 (可序列化為 JSON)，與工作記錄一起保存，恢復工作時沿用
+
+        Returns:
+            bool: 是否成功加入隊列 (重複提交時為 False)
+        """
+        if self.stopping:
+            raise JobSchedulerException("排程器正在關閉，無法提交新工作")
+
+        pool = self._pools.get(job_type)
+        if pool is None:
+            raise JobSchedulerException(f"未知的工作類型: {job_type}")
+
+        if pool.contains(target_id):
+            logger.info(f"[{job_type}] 工作 {target_id} 已在隊列中，略過重複提交")
+            return False
+
+        func = func or self._handler_func(job_type, target_id, payload)
+        record_id = self._create_record(job_type, target_id, payload)
+
+        self._ensure_heartbeat()
+        return pool.submit(_Job(job_type, target_id, func, record_id))
+
+    def queue_position(self, job_type, target_id):
+        """
+        取得工作在隊列中的位置
+
+        Returns:
+            int: 1 表示下一個執行，0 表示執行中，None 表示不在排程器中
+        """
+        pool = self._pools.get(job_type)
+        return pool.position(target_id) if pool else None
+
+    def stats(self):
+        """取得各工作類型的隊列統計"""
+        result = {}
+        for job_type, pool in self._pools.items():
+            with pool.condition:
+                result[job_type] = {
+                    "max_workers": pool.max_workers,
+                    "pending": len(pool.pending),
+                    "running": len(pool.running),
+                    "completed": pool.completed_count,
+                    "failed": pool.failed_count,
+                }
+        return result
+
+    def recover_abandoned_jobs(self, job_type=None, target_ids=None):
+        """
+        重新排入或標記失敗被已結束行程遺留的工作
+
+        持有者為本機已結束的行程、心跳逾時或未被任何行程持有的 QUEUED/RUNNING 工作視為遺留工作。
+        嘗試次數未達上限者重新排入隊列，否則標記為失敗
+
+        Args:
+            job_type: 只處理此類型的工作；為 None 時處理所有類型
+            target_ids: 只處理這些目標 ID 的工作 (需同時指定 job_type)；為 None 時不限制
+
+        Returns:
+            int: 處理的遺留工作數量
+        """
+        stale_before = _utcnow() - datetime.timedelta(seconds=self.lease_timeout)
+        query = Job.query.filter(Job.state.in_([JobState.QUEUED, JobState.RUNNING]))
+        if job_type is not None:
+            query = query.filter(Job.job_type == job_type)
+            if target_ids is not None:
+                query = query.filter(Job.target_id.in_(list(target_ids)))
+        candidates = query.order_by(Job.created_at).all()
+
+        recovered = 0
+        for job in candidates:
+            if job.lease_owner == self.owner_id:
+                continue
+
+            heartbeat_stale = job.heartbeat_at is None or job.heartbeat_at < stale_before
+            if not (_owner_is_dead(job.lease_owner) or heartbeat_stale):
+                continue
+
+            # 以條件更新搶佔租約，避免多個行程同時恢復同一工作
+            claimed = Job.query.filter(
+                Job.id == job.id,
+                Job.state == job.state,
+                (Job.lease_owner == job.lease_owner) if job.lease_owner else Job.lease_owner.is_(None)
+            ).update({
+                Job.lease_owner: self.owner_id,
+                Job.heartbeat_at: _utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+
+            if not claimed:
+                continue
+
+            db.session.refresh(job)
+            recovered += 1
+            handler = _job_handlers.get(job.job_type)
+
+            if handler is None or job.attempts >= self.max_attempts:
+                message = f"工作在執行 {job.attempts} 次後仍被中斷，已放棄"
+                logger.warning(f"[{job.job_type}] 工作 {job.target_id}: {message}")
+                job.state = JobState.FAILED
+                job.error_message = message
+                job.finished_at = _utcnow()
+                db.session.commit()
+
+                if handler and handler.on_failed:
+                    handler.on_failed(job.target_id, message)
+                continue
+
+            logger.info(f"[{job.job_type}] 重新排入被中斷的工作 {job.target_id} "
+                        f"(已嘗試 {job.attempts} 次)")
+            job.state = JobState.QUEUED
+            db.session.commit()
+
+            if handler.on_requeued:
+                handler.on_requeued(job.target_id)
+
+            pool = self._pools.get(job.job_type)
+            if pool is not None:
+                self._ensure_heartbeat()
+                pool.submit(_Job(job.job_type, job.target_id,
+                                 self._handler_func(job.job_type, job.target_id, _load_payload(job)),
+                                 job.id))
+
+        if recovered:
+            logger.info(f"已處理 {recovered} 個被中斷的工作")
+
+        return recovered
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        停止接受新工作，等待執行中的工作完成，並釋放尚未開始的工作的租約
+
+        尚未開始的工作保持 QUEUED 狀態留在資料庫，下次啟動時由 recover_abandoned_jobs() 重新排入
+
+        Args:
+            wait: 是否等待執行中的工作結束
+            timeout: 每個工作線程的最長等待時間 (秒)
+        """
+        if self.stopping:
+            return
+
+        self.stopping = True
+        logger.info("工作排程器正在關閉，等待執行中的工作完成...")
+
+        for pool in self._pools.values():
+            with pool.condition:
+                pool.condition.notify_all()
+
+        if wait:
+            for pool in self._pools.values():
+                for worker in list(pool.workers):
+                    worker.join(timeout)
+
+        self._stop_event.set()
+
+        # 釋放尚未開始的工作
+        released = []
+        for pool in self._pools.values():
+            with pool.condition:
+                released.extend(job.record_id for job in pool.pending if job.record_id)
+                pool.pending.clear()
+
+        if released:
+            try:
+                with self.app.app_context():
+                    Job.query.filter(
+                        Job.id.in_(released),
+                        Job.lease_owner == self.owner_id
+                    ).update({Job.lease_owner: None}, synchronize_session=False)
+                    db.session.commit()
+                logger.info(f"已釋放 {len(released)} 個尚未開始的工作")
+            except Exception as e:
+                logger.error(f"釋放工作租約時發生錯誤: {e}")
+
+    def _handler_func(self, job_type, target_id, payload=None):
+        """依已註冊的處理函數建立工作函數"""
+        handler = _job_handlers.get(job_type)
+        if handler is None:
+            raise JobSchedulerException(f"工作類型 {job_type} 沒有註冊處理函數")
+        payload = dict(payload or {})
+        return lambda: handler.run(target_id, **payload)
+
+    def _create_record(self, job_type, target_id, payload=None):
+        """建立工作的資料庫記錄"""
+        try:
+            record = Job(
+                job_type=job_type,
+                target_id=target_id,
+                payload=json.dumps(payload, ensure_ascii=False) if payload else None,
+                state=JobState.QUEUED,
+                lease_owner=self.owner_id,
+                heartbeat_at=_utcnow()
+            )
+            db.session.add(record)
+            db.session.commit()
+            return record.id
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"建立工作記錄時發生錯誤: {e}")
+            return None
+
+    def _mark_running(self, job):
+        """將工作標記為執行中並增加嘗試次數"""
+        if job.record_id is None:
+            return
+
+        record = db.session.get(Job, job.record_id)
+        if record:
+            record.state = JobState.RUNNING
+            record.attempts = (record.attempts or 0) + 1
+            record.lease_owner = self.owner_id
+            record.started_at = _utcnow()
+            record.heartbeat_at = _utcnow()
+            db.session.commit()
+
+    def _mark_finished(self, job, state, error_message=None):
+        """將工作標記為完成或失敗"""
+        if job.record_id is None:
+            return
+
+        db.session.rollback()
+        record = db.session.get(Job, job.record_id)
+        if record:
+            record.state = state
+            record.error_message = error_message
+            record.finished_at = _utcnow()
+            db.session.commit()
+
+    def _ensure_heartbeat(self):
+        """啟動心跳線程，定期更新本行程持有工作的心跳並檢查其他行程遺留的工作"""
+        if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
+            return
+
+        def run():
+            last_recovery = time.monotonic()
+            while not self._stop_event.wait(self.heartbeat_interval):
+                try:
+                    with self.app.app_context():
+                        Job.query.filter(
+                            Job.lease_owner == self.owner_id,
+                            Job.state.in_([JobState.QUEUED, JobState.RUNNING])
+                        ).update({Job.heartbeat_at: _utcnow()}, synchronize_session=False)
+                        db.session.commit()
+
+                        if time.monotonic() - last_recovery >= self.lease_timeout:
+                            last_recovery = time.monotonic()
+                            self.recover_abandoned_jobs()
+                except Exception as e:
+                    logger.error(f"更新工作心跳時發生錯誤: {e}")
+
+        self._heartbeat_thread = threading.Thread(target=run, name="job-heartbeat")
+        self._heartbeat_thread.daemon = True
+        self._heartbeat_thread.start()
+
+
+# 行程內共享的排程器實例
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_job_scheduler(app=None):
+    """
+    取得行程內共享的工作排程器
+
+    Args:
+        app: Flask 應用，僅在第一次建立排程器時使用；為 None 時使用 current_app
+
+    Returns:
+        JobScheduler 實例
+    """
+    global _scheduler
+
+    if _scheduler is not None:
+        return _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            if app is None:
+                from flask import current_app
+                app = current_app._get_current_object()
+
+            _scheduler = JobScheduler(
+                app,
+                {
+                    JOB_TYPE_AUDIO: app.config.get('AUDIO_WORKER_COUNT', 1),
+                    JOB_TYPE_LLM: app.config.get('LLM_WORKER_COUNT', 2),
+                },
+                lease_timeout=app.config.get('JOB_LEASE_TIMEOUT', 120),
+                heartbeat_interval=app.config.get('JOB_HEARTBEAT_INTERVAL', 15),
+                max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 3)
+            )
+
+    return _scheduler
+
+
+def format_queue_message(position):
+    """將隊列位置轉換為顯示給使用者的訊息"""
+    if position is None or position == 0:
+        return None
+    if position == 1:
+        return "排隊中，下一個處理"
+    return f"排隊中，前方還有 {position - 1} 個工作"
@@ -0,0 +1,237 @@
+"""
+LLM 回應快取
+以 (模型, 系統提示詞, 使用者提示詞, 生成參數) 的雜湊為鍵保存完整的串流輸出，
+重新生成相同報告時直接重播快取內容，不需再等待 Ollama
+
+只有可重現的請求才會使用快取 (有設定 seed 或 temperature 為 0)，
+否則每次生成本來就應該得到不同的結果
+
+每個快取項目是快取目錄下的一個 JSON 檔案，包含所有輸出片段與最後一個回應；
+總大小超過上限時，依最近使用時間淘汰最舊的項目
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 設定日誌
+logger = logging.getLogger("llm_cache")
+
+# 寫入中斷留下的暫存檔超過此時間 (秒) 未更新才刪除，避免刪除其他行程正在寫入的暫存檔
+_PART_FILE_GRACE_SECONDS = 300
+
+# 行程內共享的 LLM 回應快取
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def is_deterministic(options):
+    """生成參數是否能重現相同的輸出 (有設定 seed 或 temperature 為 0)"""
+    options = options or {}
+    return options.get("seed") is not None or options.get("temperature") == 0
+
+
+def make_llm_cache_key(model, system_prompt, user_prompt, options):
+    """建立快取鍵 (生成參數依名稱排序後納入)"""
+    payload = json.dumps(
+        [model, system_prompt or "", user_prompt, options or {}],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """以請求內容定址的 LLM 回應快取"""
+
+    def __init__(self, cache_dir, max_bytes=None):
+        """
+        初始化 LLM 回應快取
+
+        Args:
+            cache_dir: 快取目錄
+            max_bytes: 快取總大小上限 (位元組)，若為 None 則不限制
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # 快取鍵 -> 項目大小，依最近使用時間排序 (最舊的在前)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        # 統計資訊
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        """掃描快取目錄，依最後使用時間重建索引"""
+        entries = []
+        stale_before = time.time() - _PART_FILE_GRACE_SECONDS
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.endswith(".part"):
+                # 寫入中斷留下的暫存檔 (較新的可能仍在寫入中，保留)
+                if stat.st_mtime < stale_before:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                continue
+            if not entry.name.endswith(".json"):
+                continue
+            entries.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        logger.info(f"LLM 回應快取: {len(self._entries)} 個項目，共 {self._total_bytes / 1024 / 1024:.1f} MB")
+
+    def get(self, key):
+        """
+        查詢快取
+
+        Returns:
+            dict: chunks (輸出片段列表)、final_chunk (最後一個回應) 與 model；未命中時返回 None
+        """
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+
+            path = self._entry_path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                # 更新最後使用時間
+                os.utime(path, None)
+            except (OSError, ValueError) as e:
+                logger.warning(f"讀取 LLM 快取項目失敗，移除該項目: {e}")
+                self._remove(key)
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        return entry
+
+    def put(self, key, model, chunks, final_chunk):
+        """
+        將完整的串流輸出存入快取
+
+        Args:
+            key: 快取鍵 (見 make_llm_cache_key)
+            model: 模型名稱
+            chunks: 依序收到的輸出片段
+            final_chunk: 最後一個回應 (done=true) 的 JSON
+        """
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "chunks": chunks, "final_chunk": final_chunk,
+                           "stored_at": time.time()}, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+                os.replace(tmp_path, path)
+                self._entries[key] = size
+                self._total_bytes += size
+                self._stores += 1
+                self._evict_over_budget()
+
+        except OSError as e:
+            logger.warning(f"寫入 LLM 回應快取失敗: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remove(self, key):
+        """移除快取項目 (需持有鎖)"""
+        size = self._entries.pop(key, 0)
+        self._total_bytes -= size
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _evict_over_budget(self):
+        """淘汰最久未使用的項目直到總大小低於上限 (需持有鎖)"""
+        if self.max_bytes is None:
+            return
+
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._evictions += 1
+            logger.info(f"LLM 回應快取已滿，淘汰項目 {key[:12]}")
+
+    def clear(self):
+        """清除所有快取項目"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """取得快取統計資訊"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+            }
+
+
+def get_llm_cache(config=None):
+    """
+    取得行程內共享的 LLM 回應快取
+
+    Args:
+        config: 應用配置，僅在第一次建立快取時使用；為 None 時使用 current_app.config
+
+    Returns:
+        LLMResponseCache 實例；快取停用時返回 None
+    """
+    global _cache
+
+    if _cache is not None:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None:
+            if config is None:
+                from flask import current_app
+                config = current_app.config
+
+            if not config.get('LLM_CACHE_ENABLED', True):
+                return None
+
+            max_mb = config.get('LLM_CACHE_MAX_MB')
+            _cache = LLMResponseCache(
+                config['LLM_CACHE_FOLDER'],
+                max_bytes=max_mb * 1024 * 1024 if max_mb else None
+            )
+
+    return _cache
@@ -0,0 +1,442 @@
+"""
+模型註冊表
+行程內共享的 Whisper 與 Pyannote 模型快取，同一組 (模型名稱, 設備, 資料型別) 只載入一次，
+並支援閒置逾時卸載與依記憶體預算進行 LRU 淘汰
+"""
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# 設定日誌
+logger = logging.getLogger("model_registry")
+
+
+class ModelRegistryException(Exception):
+    """模型註冊表異常"""
+    pass
+
+
+def _load_whisper_model(name, device, dtype=None, **kwargs):
+    """載入 Whisper 模型"""
+    import whisper
+
+    model = whisper.load_model(name, device=device)
+    if dtype is not None:
+        model = model.to(dtype=_resolve_torch_dtype(dtype))
+    return model
+
+
+def _load_diarization_pipeline(name, device, dtype=None, hf_token=None, **kwargs):
+    """載入 Pyannote 說話者分割管線"""
+    import torch
+    from pyannote.audio import Pipeline
+
+    if hf_token:
+        pipeline = Pipeline.from_pretrained(name, use_auth_token=hf_token)
+    else:
+        logger.warning("未提供 HuggingFace token，將嘗試使用預先下載的模型或公開訪問")
+        pipeline = Pipeline.from_pretrained(name)
+
+    if pipeline is None:
+        raise ModelRegistryException(f"無法載入說話者分割管線: {name}")
+
+    return pipeline.to(torch.device(device))
+
+
+def _resolve_torch_dtype(dtype):
+    """將字串型別名稱轉換為 torch.dtype"""
+    import torch
+
+    if isinstance(dtype, str):
+        return getattr(torch, dtype)
+    return dtype
+
+
+def estimate_model_bytes(model, max_depth=3):
+    """
+    估算模型權重所佔用的記憶體大小
+
+    會尋找物件本身或其屬性 (最多 max_depth 層) 中帶有 parameters() 的 torch 模組，
+    以涵蓋 Pyannote Pipeline 這類將多個模組包在內部的物件
+
+    Args:
+        model: 模型物件
+        max_depth: 搜尋屬性的最大深度
+
+    Returns:
+        int: 估算的位元組數
+    """
+    seen_modules = set()
+    seen_tensors = set()
+    total = 0
+
+    def visit(obj, depth):
+        nonlocal total
+        if obj is None or id(obj) in seen_modules:
+            return
+        seen_modules.add(id(obj))
+
+        if hasattr(obj, 'parameters') and hasattr(obj, 'buffers'):
+            try:
+                for tensor in list(obj.parameters()) + list(obj.buffers()):
+                    if id(tensor) not in seen_tensors:
+                        seen_tensors.add(id(tensor))
+                        total += tensor.numel() * tensor.element_size()
+                return
+            except Exception:
+                pass
+
+        if depth >= max_depth or not hasattr(obj, '__dict__'):
+            return
+
+        for value in vars(obj).values():
+            if isinstance(value, (str, bytes, int, float, bool, list, tuple, dict)):
+                continue
+            visit(value, depth + 1)
+
+    visit(model, 0)
+    return total
+
+
+class _ModelEntry:
+    """註冊表中的單一模型項目"""
+
+    def __init__(self, key, model, size_bytes, load_time):
+        self.key = key
+        self.model = model
+        self.size_bytes = size_bytes
+        self.load_time = load_time
+        self.ref_count = 0
+        self.last_used = time.monotonic()
+        self.hits = 0
+
+        # 同一模型物件被多個工作共用時，推論必須依序執行
+        # (Whisper 的 transcribe 會在共用的 decoder 上安裝 KV cache hooks，同時解碼會互相破壞)
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """行程內共享的模型註冊表"""
+
+    def __init__(self, idle_ttl=None, max_memory_bytes=None):
+        """
+        初始化模型註冊表
+
+        Args:
+            idle_ttl: 閒置多久 (秒) 後卸載未被使用的模型，None 表示不自動卸載
+            max_memory_bytes: 所有模型權重的記憶體預算 (位元組)，None 表示不限制
+        """
+        self.idle_ttl = idle_ttl
+        self.max_memory_bytes = max_memory_bytes
+
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> _ModelEntry，依最近使用排序 (最舊在前)
+        self._loading = {}  # key -> threading.Event，避免同一模型被重複載入
+        self._loaders = {
+            'whisper': _load_whisper_model,
+            'diarization': _load_diarization_pipeline,
+        }
+
+        # 統計資訊
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load_seconds = 0.0
+        self._saved_seconds = 0.0
+
+        self._janitor = None
+        self._stop_event = threading.Event()
+
+    def register_loader(self, kind, loader):
+        """
+        註冊或覆寫某種模型的載入函數
+
+        Args:
+            kind: 模型種類，例如 'whisper' 或 'diarization'
+            loader: 載入函數，簽名為 loader(name, device, dtype=None, **kwargs)
+        """
+        with self._lock:
+            self._loaders[kind] = loader
+
+    def acquire(self, kind, name, device, dtype=None, **load_kwargs):
+        """
+        取得模型參考，必要時載入模型
+
+        取得後須呼叫 release() 歸還參考，歸還前模型不會被卸載；
+        同一模型物件會返回給所有使用者，推論時需以 exclusive() 避免同時執行
+
+        Args:
+            kind: 模型種類
+            name: 模型名稱
+            device: 計算設備
+            dtype: 資料型別 (可選)
+            load_kwargs: 傳遞給載入函數的額外參數 (不列入快取鍵)
+
+        Returns:
+            模型物件
+        """
+        key = (kind, name, str(device), str(dtype) if dtype is not None else None)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.ref_count += 1
+                    entry.hits += 1
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    self._saved_seconds += entry.load_time
+                    logger.info(f"模型快取命中: {key}")
+                    return entry.model
+
+                loading_event = self._loading.get(key)
+                if loading_event is None:
+                    # 由此線程負責載入
+                    loading_event = threading.Event()
+                    self._loading[key] = loading_event
+                    self._misses += 1
+                    loader = self._loaders.get(kind)
+                    break
+
+            # 其他線程正在載入相同模型，等待後重新檢查
+            loading_event.wait()
+
+        try:
+            if loader is None:
+                raise ModelRegistryException(f"未註冊的模型種類: {kind}")
+
+            logger.info(f"正在載入模型: {key}")
+            start_time = time.perf_counter()
+            model = loader(name, device, dtype=dtype, **load_kwargs)
+            load_time = time.perf_counter() - start_time
+            size_bytes = estimate_model_bytes(model)
+
+            logger.info(f"模型載入完成: {key}，耗時 {load_time:.1f} 秒，約 {size_bytes / 1024 ** 2:.0f} MB")
+
+            with self._lock:
+                entry = _ModelEntry(key, model, size_bytes, load_time)
+                entry.ref_count = 1
+                self._entries[key] = entry
+                self._load_seconds += load_time
+                self._enforce_memory_budget()
+
+            self._ensure_janitor()
+            return model
+
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading_event.set()
+
+    def release(self, model):
+        """
+        歸還模型參考
+
+        Args:
+            model: 由 acquire() 取得的模型物件
+        """
+        if model is None:
+            return
+
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.model is model:
+                    entry.ref_count = max(0, entry.ref_count - 1)
+                    entry.last_used = time.monotonic()
+                    break
+
+            self._enforce_memory_budget()
+
+    @contextmanager
+    def exclusive(self, model):
+        """
+        在 with 區塊內獨佔使用模型 (同一模型的其他使用者會等待)
+
+        所有共用模型的推論呼叫 (Whisper transcribe、Pyannote 管線) 都應包在此區塊內
+
+        Args:
+            model: 由 acquire() 取得的模型物件
+        """
+        with self._lock:
+            entry = next((e for e in self._entries.values() if e.model is model), None)
+
+        if entry is None:
+            # 不是由註冊表管理的模型，不需要與其他工作協調
+            yield model
+            return
+
+        with entry.lock:
+            yield model
+
+    @contextmanager
+    def use(self, kind, name, device, dtype=None, **load_kwargs):
+        """以 with 語法取得並自動歸還模型"""
+        model = self.acquire(kind, name, device, dtype=dtype, **load_kwargs)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def evict_idle(self):
+        """卸載閒置超過 idle_ttl 且未被使用的模型"""
+        if self.idle_ttl is None:
+            return 0
+
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, entry in self._entries.items()
+                if entry.ref_count == 0 and now - entry.last_used >= self.idle_ttl
+            ]
+            for key in expired:
+                self._unload(key, reason="閒置逾時")
+
+        return len(expired)
+
+    def clear(self):
+        """卸載所有未被使用的模型"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.ref_count == 0]:
+                self._unload(key, reason="手動清除")
+
+    def stats(self):
+        """
+        取得註冊表統計資訊
+
+        Returns:
+            dict: 命中/未命中次數、載入耗時與節省的時間等資訊
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "load_seconds_total": round(self._load_seconds, 3),
+                "load_seconds_saved": round(self._saved_seconds, 3),
+                "memory_bytes": sum(entry.size_bytes for entry in self._entries.values()),
+                "max_memory_bytes": self.max_memory_bytes,
+                "models": [
+                    {
+                        "kind": entry.key[0],
+                        "name": entry.key[1],
+                        "device": entry.key[2],
+                        "dtype": entry.key[3],
+                        "size_bytes": entry.size_bytes,
+                        "load_seconds": round(entry.load_time, 3),
+                        "ref_count": entry.ref_count,
+                        "hits": entry.hits,
+                        "idle_seconds": round(time.monotonic() - entry.last_used, 1),
+                    }
+                    for entry in self._entries.values()
+                ],
+            }
+
+    def shutdown(self):
+        """停止背景清理線程"""
+        self._stop_event.set()
+
+    def _enforce_memory_budget(self):
+        """超出記憶體預算時，依 LRU 順序卸載未被使用的模型 (需持有鎖)"""
+        if self.max_memory_bytes is None:
+            return
+
+        total = sum(entry.size_bytes for entry in self._entries.values())
+        for key in list(self._entries.keys()):
+            if total <= self.max_memory_bytes:
+                return
+
+            entry = self._entries[key]
+            if entry.ref_count > 0:
+                continue
+
+            total -= entry.size_bytes
+            self._unload(key, reason="超出記憶體預算")
+
+        if total > self.max_memory_bytes:
+            logger.warning(
+                f"模型記憶體用量 {total / 1024 ** 2:.0f} MB 超出預算 "
+                f"{self.max_memory_bytes / 1024 ** 2:.0f} MB，但所有模型都在使用中"
+            )
+
+    def _unload(self, key, reason=""):
+        """從註冊表移除並釋放模型 (需持有鎖)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        self._evictions += 1
+        logger.info(f"卸載模型 {key} ({reason})")
+
+        entry.model = None
+        del entry
+        gc.collect()
+
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _ensure_janitor(self):
+        """啟動背景清理線程，定期卸載閒置模型"""
+        if self.idle_ttl is None:
+            return
+
+        with self._lock:
+            if self._janitor is not None and self._janitor.is_alive():
+                return
+
+            interval = max(1.0, min(60.0, self.idle_ttl / 2))
+
+            def run():
+                while not self._stop_event.wait(interval):
+                    try:
+                        self.evict_idle()
+                    except Exception as e:
+                        logger.error(f"清理閒置模型時發生錯誤: {e}")
+
+            self._janitor = threading.Thread(target=run, name="model-registry-janitor")
+            self._janitor.daemon = True
+            self._janitor.start()
+
+
+# 行程內共享的註冊表實例
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry(config=None):
+    """
+    取得行程內共享的模型註冊表
+
+    Args:
+        config: 應用配置，僅在第一次建立註冊表時使用；為 None 時使用 current_app.config
+
+    Returns:
+        ModelRegistry 實例
+    """
+    global _registry
+
+    if _registry is not None:
+        return _registry
+
+    with _registry_lock:
+        if _registry is None:
+            if config is None:
+                from flask import current_app
+                config = current_app.config
+
+            max_memory_mb = config.get('MODEL_REGISTRY_MAX_MEMORY_MB')
+            _registry = ModelRegistry(
+                idle_ttl=config.get('MODEL_REGISTRY_IDLE_TTL'),
+                max_memory_bytes=max_memory_mb * 1024 * 1024 if max_memory_mb else None
+            )
+
+    return _registry
@@ -0,0 +1,220 @@
+"""
+多行程分段轉錄
+在沒有 GPU 的節點上，單一 Whisper 轉錄只使用一個行程，無法用滿所有 CPU 核心；
+此模組在靜音處將錄音切割為分段，交給行程池平行轉錄，再依時間順序合併結果
+
+每個工作行程常駐一個 Whisper 模型，並以設定的線程數執行；
+分段從解碼後的波形檔案 (memmap) 讀取，不需在行程間傳遞音訊資料
+
+注意: 此模組會在工作行程中重新匯入，不可匯入 Flask 應用程式或資料庫相關模組
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from utils.audio_decode import CANONICAL_SAMPLE_RATE, load_canonical
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 工作行程中常駐的模型
+_worker_model = None
+
+# 主行程中的行程池 (依模型與線程數設定重複使用)
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+# 分段邊界附近判定為重複的時間容許值 (秒)
+_SEAM_TOLERANCE = 0.5
+
+
+def _init_worker(model_name, num_threads):
+    """工作行程初始化: 設定線程數並載入模型"""
+    global _worker_model
+
+    import torch
+    from processors.model_registry import _load_whisper_model
+
+    torch.set_num_threads(num_threads)
+    _worker_model = _load_whisper_model(model_name, "cpu")
+
+
+def _transcribe_shard(audio_path, start, end, options):
+    """
+    在工作行程中轉錄一個分段
+
+    Returns:
+        dict: 分段的 Whisper 轉錄結果，時間戳記已換算為整段錄音的時間軸
+    """
+    waveform = load_canonical(audio_path)
+    chunk = np.array(waveform[start:end], dtype=np.float32)
+    del waveform
+
+    result = _worker_model.transcribe(chunk, verbose=False, fp16=False, **options)
+
+    offset = start / CANONICAL_SAMPLE_RATE
+    segments = []
+    for segment in result.get("segments", []):
+        shifted = dict(segment)
+        shifted["start"] = segment["start"] + offset
+        shifted["end"] = segment["end"] + offset
+        if segment.get("words"):
+            shifted["words"] = [
+                dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                for word in segment["words"]
+            ]
+        segments.append(shifted)
+
+    return {
+        "segments": segments,
+        "language": result.get("language"),
+    }
+
+
+def get_shard_pool(model_name, workers, threads_per_worker):
+    """
+    取得行程池，設定相同時重複使用既有的行程池 (工作行程中的模型保持常駐)
+
+    Args:
+        model_name: Whisper 模型名稱
+        workers: 工作行程數量
+        threads_per_worker: 每個工作行程的 torch 線程數
+    """
+    global _pool, _pool_key
+
+    key = (model_name, workers, threads_per_worker)
+    with _pool_lock:
+        if _pool is not None and _pool_key == key:
+            return _pool
+
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+
+        # 使用 spawn 啟動工作行程，避免 fork 複製 torch 的線程狀態
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads_per_worker),
+        )
+        _pool_key = key
+        logger.info(f"已建立分段轉錄行程池: {workers} 個行程，每個行程 {threads_per_worker} 個線程")
+        return _pool
+
+
+def shutdown_shard_pool():
+    """關閉行程池"""
+    global _pool, _pool_key
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_key = None
+
+
+atexit.register(shutdown_shard_pool)
+
+
+def default_threads_per_worker(workers):
+    """依 CPU 核心數平均分配每個工作行程的線程數"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def transcribe_parallel(audio_path, shards, model_name, options=None, workers=2,
+                        threads_per_worker=None, on_progress=None):
+    """
+    以行程池平行轉錄分段
+
+    Args:
+        audio_path: 解碼後的波形檔案路徑 (16 kHz float32，見 utils.audio_decode)
+        shards: 分段列表，每個元素為 {"start": 起始取樣, "end": 結束取樣}，依時間排序且不重疊
+        model_name: Whisper 模型名稱
+        options: 傳給 transcribe 的選項
+        workers: 工作行程數量
+        threads_per_worker: 每個工作行程的 torch 線程數，若為 None 則平均分配 CPU 核心
+        on_progress: 進度回調，簽名為 on_progress(completed_samples, total_samples)；
+            回調拋出的異常會取消尚未開始的分段並向上拋出
+
+    Returns:
+        dict: 與 whisper_model.transcribe 相同格式的結果
+    """
+    options = dict(options or {})
+    threads_per_worker = threads_per_worker or default_threads_per_worker(workers)
+    pool = get_shard_pool(model_name, workers, threads_per_worker)
+
+    futures = {
+        pool.submit(_transcribe_shard, audio_path, shard["start"], shard["end"], options): index
+        for index, shard in enumerate(shards)
+    }
+    total_samples = sum(shard["end"] - shard["start"] for shard in shards) or 1
+    completed_samples = 0
+    results = [None] * len(shards)
+
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                results[index] = future.result()
+                completed_samples += shards[index]["end"] - shards[index]["start"]
+
+            if on_progress is not None:
+                on_progress(completed_samples, total_samples)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+
+    return merge_shard_results(shards, results, language=options.get("language"))
+
+
+def merge_shard_results(shards, results, language=None):
+    """
+    依時間順序合併分段結果，並移除分段邊界上的重複片段
+
+    Whisper 在分段開頭或結尾有時會重複相鄰分段已轉錄的句子，
+    邊界附近文字相同且時間相接的片段只保留第一個
+    """
+    segments = []
+
+    for shard, result in zip(shards, results):
+        seam = shard["start"] / CANONICAL_SAMPLE_RATE
+        for segment in result["segments"]:
+            text = segment.get("text", "").strip()
+            if not text:
+                continue
+
+            if segments:
+                previous = segments[-1]
+                near_seam = abs(segment["start"] - seam) <= _SEAM_TOLERANCE or segment["start"] < previous["end"]
+                if near_seam and text == previous["text"].strip() \
+                        and segment["start"] <= previous["end"] + _SEAM_TOLERANCE:
+                    continue
+
+                # 避免與前一個片段重疊
+                if segment["start"] < previous["end"]:
+                    segment = dict(segment, start=previous["end"])
+                    if segment["end"] <= segment["start"]:
+                        continue
+
+            segments.append(dict(segment, id=len(segments)))
+
+    if language is None:
+        # 取各分段偵測到最多次的語言
+        detected = [result.get("language") for result in results if result.get("language")]
+        language = max(set(detected), key=detected.count) if detected else None
+
+    separator = "" if language in ("zh", "ja", "ko") else " "
+    return {
+        "text": separator.join(segment["text"].strip() for segment in segments),
+        "segments": segments,
+        "language": language,
+    }
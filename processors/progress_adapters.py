@@ -0,0 +1,125 @@
+"""
+引擎進度轉接器
+將 Whisper 的逐視窗解碼進度與 Pyannote 各步驟的 hook 回調轉換為 ProgressReporter 的子階段進度，
+並附上處理速度 (每秒牆鐘時間處理的音訊秒數)，讓使用者能分辨處理緩慢與卡住的工作
+
+回報頻率有上限 (min_interval)，引擎每個批次都呼叫回調也不會增加可觀的額外負擔
+"""
+import logging
+import threading
+import time
+
+from processors.engine_hooks import StageCancelled
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# Pyannote 各步驟佔說話者分割總耗時的比例 (依 CPU/GPU 上的實測粗估)
+# 只有 segmentation 與 embeddings 會回報批次進度，其餘步驟完成時直接跳到下一段
+PYANNOTE_STEP_WEIGHTS = (
+    ("segmentation", 0.35),
+    ("speaker_counting", 0.05),
+    ("embeddings", 0.55),
+    ("discrete_diarization", 0.05),
+)
+
+
+class StageProgress:
+    """單一處理子階段的進度轉接器"""
+
+    def __init__(self, reporter, stage, audio_seconds, start=10, end=100, min_interval=1.0):
+        """
+        初始化進度轉接器
+
+        Args:
+            reporter: ProgressReporter 實例
+            stage: 子階段名稱 (STAGE_TRANSCRIBE / STAGE_DIARIZE)
+            audio_seconds: 此階段要處理的音訊長度 (秒)，用於計算處理速度
+            start: 子階段進度的起點 (0-100)，此前的進度保留給模型準備等工作
+            end: 子階段進度的終點 (0-100)
+            min_interval: 兩次回報的最短間隔 (秒)
+        """
+        self.reporter = reporter
+        self.stage = stage
+        self.audio_seconds = audio_seconds
+        self.start = start
+        self.end = end
+        self.min_interval = min_interval
+
+        self.started_at = time.monotonic()
+        self.fraction = 0.0
+        self.throughput = 0.0
+        self._last_report = None
+        self._lock = threading.Lock()
+
+    def update(self, fraction, message="", force=False):
+        """
+        回報完成比例
+
+        Args:
+            fraction: 此階段的完成比例 (0-1)
+            message: 進度說明
+            force: 是否忽略回報間隔限制
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.fraction = max(self.fraction, min(1.0, max(0.0, fraction)))
+            if not force and self._last_report is not None and now - self._last_report < self.min_interval:
+                return
+            self._last_report = now
+
+            elapsed = now - self.started_at
+            self.throughput = self.fraction * self.audio_seconds / elapsed if elapsed > 0 else 0.0
+            progress = self.start + (self.end - self.start) * self.fraction
+
+        speed = f"處理速度 {self.throughput:.1f} 音訊秒/秒"
+        self.reporter.update_stage_progress(self.stage, progress, f"{message}，{speed}" if message else speed)
+
+    def whisper_callback(self, cancel_event=None, window_start=0.0, window_seconds=None, message="轉錄中"):
+        """
+        建立 Whisper 回調 (搭配 engine_hooks.whisper_callback 使用)
+
+        Whisper 的進度以梅爾頻譜影格為單位，每解碼完一個 30 秒視窗回報一次；
+        分段轉錄時以 window_start / window_seconds 將視窗內的進度換算為整段錄音的比例
+
+        Args:
+            cancel_event: threading.Event，被設定時中止轉錄 (可選)
+            window_start: 目前轉錄的片段在錄音中的起點 (秒)
+            window_seconds: 目前轉錄的片段長度 (秒)，若為 None 則為整段錄音
+            message: 進度說明
+        """
+        if window_seconds is None:
+            window_seconds = self.audio_seconds - window_start
+
+        def callback(completed, total):
+            if cancel_event is not None and cancel_event.is_set():
+                raise StageCancelled("轉錄已取消")
+            if total and self.audio_seconds > 0:
+                position = window_start + window_seconds * min(completed, total) / total
+                self.update(position / self.audio_seconds, message)
+
+        return callback
+
+    def pyannote_callback(self):
+        """
+        建立 Pyannote 進度回調 (作為 make_pyannote_hook 的 on_progress 使用)
+
+        依 PYANNOTE_STEP_WEIGHTS 將各步驟的批次進度換算為整個說話者分割的完成比例
+        """
+        offsets = {}
+        position = 0.0
+        for step_name, weight in PYANNOTE_STEP_WEIGHTS:
+            offsets[step_name] = (position, weight)
+            position += weight
+
+        def on_progress(step_name, completed, total):
+            if step_name not in offsets:
+                return
+            offset, weight = offsets[step_name]
+            if completed is None or not total:
+                # 步驟完成 (最終產物回調)
+                self.update(offset + weight, f"完成 {step_name}")
+            else:
+                self.update(offset + weight * min(completed, total) / total, f"{step_name} {completed}/{total}")
+
+        return on_progress
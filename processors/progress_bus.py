@@ -0,0 +1,122 @@
+"""
+行程內進度匯流排
+處理中的工作頻繁回報進度時只更新記憶體中的進度，狀態查詢端點直接讀取這裡的最新值；
+寫回資料庫 (AudioFile.progress / Report.progress) 的頻率則由匯流排節流:
+每個工作每隔 persist_interval 秒最多寫入一次，步驟切換等狀態轉換時立即寫入
+
+匯流排只存在於執行工作的行程中；查詢不到項目時 (例如工作在其他行程執行或尚未開始)，
+呼叫端應改用資料庫中的進度
+"""
+import logging
+import threading
+import time
+
+# 設定日誌
+logger = logging.getLogger("progress_bus")
+
+# 行程內共享的進度匯流排
+_bus = None
+_bus_lock = threading.Lock()
+
+
+class ProgressBus:
+    """以 (工作類型, 目標 ID) 為鍵保存最新進度的記憶體儲存區"""
+
+    def __init__(self, persist_interval=2.0):
+        """
+        初始化進度匯流排
+
+        Args:
+            persist_interval: 同一工作兩次寫回資料庫的最短間隔 (秒)，0 表示每次都寫入
+        """
+        self.persist_interval = persist_interval
+        self._lock = threading.Lock()
+
+        # (工作類型, 目標 ID) -> {"progress", "message", "updated_at", "persisted_at"}
+        self._entries = {}
+
+    def publish(self, job_type, target_id, progress, message="", force=False):
+        """
+        發布最新進度
+
+        Args:
+            job_type: 工作類型 (JOB_TYPE_AUDIO / JOB_TYPE_LLM)
+            target_id: 工作目標 ID
+            progress: 整體進度百分比 (0-100)
+            message: 進度說明 (可選)，為空時保留前一次的說明
+            force: 是否為狀態轉換，需要立即寫回資料庫
+
+        Returns:
+            bool: 呼叫端是否應將此進度寫回資料庫
+        """
+        now = time.monotonic()
+        key = (job_type, target_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"message": "", "persisted_at": None}
+
+            entry["progress"] = progress
+            entry["updated_at"] = time.time()
+            if message:
+                entry["message"] = message
+
+            due = entry["persisted_at"] is None or now - entry["persisted_at"] >= self.persist_interval
+            if force or due:
+                entry["persisted_at"] = now
+                return True
+            return False
+
+    def get(self, job_type, target_id):
+        """
+        取得最新進度
+
+        Returns:
+            dict: {"progress", "message", "updated_at"}；沒有此工作的進度時返回 None
+        """
+        with self._lock:
+            entry = self._entries.get((job_type, target_id))
+            if entry is None:
+                return None
+            return {
+                "progress": entry["progress"],
+                "message": entry["message"],
+                "updated_at": entry["updated_at"],
+            }
+
+    def progress(self, job_type, target_id, default=None):
+        """取得最新進度百分比，沒有此工作的進度時返回 default"""
+        entry = self.get(job_type, target_id)
+        return entry["progress"] if entry is not None else default
+
+    def discard(self, job_type, target_id):
+        """移除工作的進度 (工作完成、失敗或重新開始時呼叫)"""
+        with self._lock:
+            self._entries.pop((job_type, target_id), None)
+
+
+def get_progress_bus(config=None):
+    """
+    取得行程內共享的進度匯流排
+
+    Args:
+        config: 應用配置，僅在第一次建立匯流排時使用；為 None 時使用 current_app.config
+
+    Returns:
+        ProgressBus 實例
+    """
+    global _bus
+
+    if _bus is not None:
+        return _bus
+
+    with _bus_lock:
+        if _bus is None:
+            if config is None:
+                from flask import current_app
+                config = current_app.config
+
+            _bus = ProgressBus(persist_interval=config.get('PROGRESS_PERSIST_INTERVAL', 2.0))
+
+    return _bus
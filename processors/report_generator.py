@@ -5,15 +5,23 @@
 """
 import os
 import logging
-import requests
 import json
+import math
 import pandas as pd
 import time
-import threading
 import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from flask import current_app
 from models.db_models import Report, Transcript, ReportStatus
+from processors.job_scheduler import get_job_scheduler, register_job_handler, JOB_TYPE_LLM
+from processors.progress_bus import get_progress_bus
+from processors.stage_metrics import StageMetrics, record_llm_usage
+from processors.llm_cache import get_llm_cache, is_deterministic, make_llm_cache_key
+from processors.report_summarizer import split_turns, pack_chunks, level_progress
+from processors.transcript_compactor import compact_transcript
+from utils.ollama_client import get_ollama_client, OllamaClientException
+from utils.token_estimator import estimate_tokens
 from app import db
 
 # 設定日誌
@@ -24,6 +32,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger("report_generator")
 
+# Ollama 對話模板 (角色標記等) 額外使用的 token 數量
+_PROMPT_TEMPLATE_TOKENS = 32
+
+# 使用者提示詞中逐字稿以外的說明文字所需的 token 數量
+_USER_PROMPT_WRAPPER_TOKENS = 64
+
 
 class ReportGeneratorException(Exception):
     """報告生成器異常"""
@@ -45,26 +59,37 @@ class ProgressReporter:
         self.total_steps = total_steps
         self.current_step = 0
         self.step_progress = 0
+        self.bus = get_progress_bus()
 
     def update_step(self, step_index, message=""):
         """更新當前步驟"""
         self.current_step = step_index
         self.step_progress = 0
-        self._update_db_progress()
+        self._update_db_progress(message, force=True)
         logger.info(f"[報告 {self.report_id}] 步驟 {step_index}/{self.total_steps}: {message}")
 
     def update_step_progress(self, progress, message=""):
         """更新當前步驟的進度百分比 (0-100)"""
         self.step_progress = max(0, min(100, progress))
-        self._update_db_progress()
+        self._update_db_progress(message)
         if message:
             logger.info(f"[報告 {self.report_id}] 步驟 {self.current_step} 進度: {progress:.1f}% - {message}")
 
-    def _update_db_progress(self):
-        """更新資料庫中的進度"""
+    def _update_db_progress(self, message="", force=False):
+        """
+        發布進度到進度匯流排，並依節流間隔寫回資料庫
+
+        Args:
+            message: 進度說明
+            force: 是否為狀態轉換 (立即寫回資料庫)
+        """
         # 計算總體進度百分比
         overall_progress = ((self.current_step - 1) * 100 + self.step_progress) / self.total_steps
 
+        # 生成內容時每 10 個 token 回報一次進度，只更新匯流排，資料庫依間隔寫入
+        if not self.bus.publish(JOB_TYPE_LLM, self.report_id, overall_progress, message, force=force):
+            return
+
         # 更新資料庫
         try:
             report = Report.query.get(self.report_id)
@@ -89,6 +114,7 @@ class ReportGenerator:
         self.report_id = report_id
         self.progress_callback = progress_callback
         self.reporter = ProgressReporter(report_id)
+        self.metrics = StageMetrics(report_id=report_id)
 
         # 從資料庫載入報告資訊
         self.report = Report.query.get(report_id)
@@ -129,33 +155,26 @@ class ReportGenerator:
         self.ollama_host = self.app_config.get('DEFAULT_OLLAMA_HOST', 'localhost')
         self.ollama_port = self.app_config.get('DEFAULT_OLLAMA_PORT', '11434')
         self.ollama_model = self.report.ollama_model or self.app_config.get('DEFAULT_OLLAMA_MODEL', 'phi4:14b')
-        self.ollama_url = f"http://{self.ollama_host}:{self.ollama_port}/api/generate"
+        self.ollama_client = get_ollama_client(self.ollama_host, self.ollama_port, self.app_config)
 
         # 報告相關設定
         self.system_prompt = self.report.system_prompt
         self.max_tokens = self.app_config.get('MAX_REPORT_TOKENS', 4000)
 
+        # 模型可使用的最大 context 長度，第一次需要時才向 Ollama 查詢
+        self._context_limit = None
+        self._context_limit_checked = False
+
     def generate_async(self):
         """非同步生成報告"""
         # 更新報告狀態為生成中
         self.report.status = ReportStatus.GENERATING
         self.report.progress = 0
         db.session.commit()
+        get_progress_bus().discard(JOB_TYPE_LLM, self.report_id)
 
-        # 獲取應用上下文和當前報告ID
-        app = current_app._get_current_object()
-        report_id = self.report_id
-
-        # 啟動生成線程，確保傳遞應用上下文
-        def run_with_app_context():
-            with app.app_context():
-                # 在新的線程中重新獲取報告生成器對象
-                generator = ReportGenerator(report_id)
-                generator._generate_report()
-
-        generate_thread = threading.Thread(target=run_with_app_context)
-        generate_thread.daemon = True
-        generate_thread.start()
+        # 提交到工作排程器，依序在 LLM 工作線程中生成
+        get_job_scheduler().submit(JOB_TYPE_LLM, self.report_id)
 
         return True
 
@@ -210,22 +229,27 @@ class ReportGenerator:
         try:
             # 步驟 1: 讀取和預處理轉錄數據
             self.reporter.update_step(1, "讀取和預處理轉錄資料")
-            transcript_text = self._preprocess_transcript()
+            with self.metrics.stage("預處理轉錄", self.transcript.total_duration):
+                transcript_text = self._preprocess_transcript()
 
             # 步驟 2: 生成報告內容
             self.reporter.update_step(2, "生成報告內容")
-            report_content = self._generate_content(transcript_text)
+            with self.metrics.stage("生成內容", self.transcript.total_duration) as record:
+                report_content = self._generate_content(transcript_text, metrics=record)
 
             # 步驟 3: 儲存和後處理報告
             self.reporter.update_step(3, "儲存和後處理報告")
-            report_paths = self._save_report(report_content)
+            with self.metrics.stage("儲存報告"):
+                report_paths = self._save_report(report_content)
 
             # 更新完成狀態
             self.report.status = ReportStatus.COMPLETED
+            self.report.progress = 100
             self.report.completed_at = datetime.utcnow()
             self.report.markdown_path = report_paths.get('markdown_path')
             self.report.pdf_path = report_paths.get('pdf_path')
             db.session.commit()
+            get_progress_bus().discard(JOB_TYPE_LLM, self.report_id)
 
             # 回報處理完成
             if self.progress_callback:
@@ -240,10 +264,14 @@ class ReportGenerator:
             self.report.status = ReportStatus.FAILED
             self.report.error_message = str(e)
             db.session.commit()
+            get_progress_bus().discard(JOB_TYPE_LLM, self.report_id)
 
             if self.progress_callback:
                 self.progress_callback(-1, f"生成失敗: {e}")
 
+        finally:
+            self.metrics.save()
+
     def _preprocess_transcript(self):
         """讀取和預處理轉錄數據"""
         try:
@@ -266,6 +294,7 @@ class ReportGenerator:
             # 讀取 CSV 檔案以獲取更詳細的信息
             self.reporter.update_step_progress(50, "分析轉錄數據")
 
+            df = None
             try:
                 df = pd.read_csv(csv_path, encoding='utf-8')
 
@@ -293,6 +322,19 @@ class ReportGenerator:
             except Exception as e:
                 logger.warning(f"分析 CSV 數據時發生錯誤: {e}")
 
+            # 由 CSV 片段建立精簡逐字稿，減少提示詞長度
+            raw_tokens = estimate_tokens(transcript_text)
+            if self.app_config.get('REPORT_COMPACT_TRANSCRIPT', True) and df is not None and not df.empty:
+                self.reporter.update_step_progress(80, "壓縮逐字稿")
+                transcript_text = self._compact_transcript(df) or transcript_text
+
+            self.report.prompt_tokens_raw = raw_tokens
+            self.report.prompt_tokens_compacted = estimate_tokens(transcript_text)
+            db.session.commit()
+            logger.info(
+                f"[報告 {self.report_id}] 逐字稿提示詞約 {raw_tokens} -> {self.report.prompt_tokens_compacted} tokens"
+            )
+
             self.reporter.update_step_progress(100, "預處理完成")
 
             return transcript_text
@@ -301,144 +343,92 @@ class ReportGenerator:
             logger.error(f"預處理轉錄數據時發生錯誤: {e}")
             raise ReportGeneratorException(f"預處理轉錄數據時發生錯誤: {e}")
 
-    def _generate_content(self, transcript_text):
-        """使用 Ollama 生成報告內容"""
+    def _compact_transcript(self, df):
+        """依設定將轉錄片段壓縮為精簡逐字稿，失敗時返回 None (改用 TXT 檔案)"""
+        try:
+            filler_words = self.app_config.get('REPORT_FILLER_WORDS') \
+                if self.app_config.get('REPORT_STRIP_FILLERS', False) else None
+            audio_file = self.report.audio_file
+            return compact_transcript(
+                df,
+                title=f"檔案: {audio_file.original_filename}" if audio_file else None,
+                marker_interval=self.app_config.get('REPORT_TIME_MARKER_INTERVAL', 60),
+                filler_words=filler_words
+            )
+        except Exception as e:
+            logger.warning(f"壓縮逐字稿時發生錯誤，改用 TXT 檔案: {e}")
+            return None
+
+    def _generate_content(self, transcript_text, metrics=None):
+        """
+        使用 Ollama 生成報告內容
+
+        逐字稿超過單一提示詞的 token 預算時，先以分層摘要壓縮逐字稿，再以摘要生成報告
+
+        Args:
+            transcript_text: 預處理後的轉錄文字
+            metrics: StageMetrics.stage 返回的 dict (可選)，記錄 token 用量與生成速度
+        """
         try:
             # 準備提示詞
             self.reporter.update_step_progress(10, "準備 LLM 提示詞")
 
+            options = self._generation_options()
             system_prompt = self.system_prompt
             user_prompt = f"這是一個會議的逐字稿，請根據以下內容生成一份結構良好的會議紀錄：\n\n{transcript_text}"
+            progress_start = 30
 
             # 準備 API 請求
             self.reporter.update_step_progress(20, f"連接 Ollama 服務 ({self.ollama_host}:{self.ollama_port})")
 
-            # 從報告或設定檔獲取生成參數
-            temperature = self.report.temperature if hasattr(self.report,
-                                                             'temperature') and self.report.temperature is not None else self.app_config.get(
-                'DEFAULT_TEMPERATURE')
-            top_p = self.report.top_p if hasattr(self.report,
-                                                 'top_p') and self.report.top_p is not None else self.app_config.get(
-                'DEFAULT_TOP_P')
-            top_k = self.report.top_k if hasattr(self.report,
-                                                 'top_k') and self.report.top_k is not None else self.app_config.get(
-                'DEFAULT_TOP_K')
-            frequency_penalty = self.report.frequency_penalty if hasattr(self.report,
-                                                                         'frequency_penalty') and self.report.frequency_penalty is not None else self.app_config.get(
-                'DEFAULT_FREQUENCY_PENALTY')
-            presence_penalty = self.report.presence_penalty if hasattr(self.report,
-                                                                       'presence_penalty') and self.report.presence_penalty is not None else self.app_config.get(
-                'DEFAULT_PRESENCE_PENALTY')
-            repeat_penalty = self.report.repeat_penalty if hasattr(self.report,
-                                                                   'repeat_penalty') and self.report.repeat_penalty is not None else self.app_config.get(
-                'DEFAULT_REPEAT_PENALTY')
-            seed = self.report.seed if hasattr(self.report,
-                                               'seed') and self.report.seed is not None else self.app_config.get(
-                'DEFAULT_SEED')
-
-            headers = {"Content-Type": "application/json"}
-            data = {
-                "model": self.ollama_model,
-                "prompt": user_prompt,
-                "system": system_prompt,
-                "stream": True,
-                "options": {
-                    "temperature": temperature,
-                    "top_p": top_p,
-                    "top_k": top_k,
-                }
-            }
+            # 逐字稿超過單一提示詞可容納的大小時改用分層摘要，無法分層時拒絕生成 (避免 Ollama 靜默截斷)
+            model_budget = self._model_prompt_budget(system_prompt)
+            budgets = [v for v in (self.app_config.get('REPORT_PROMPT_TOKEN_BUDGET'), model_budget) if v]
+            budget = min(budgets) if budgets else None
+            transcript_tokens = estimate_tokens(transcript_text)
+
+            if budget is not None and transcript_tokens > budget:
+                if self.app_config.get('REPORT_MAP_REDUCE_ENABLED', True):
+                    with self.metrics.stage("分層摘要", self.transcript.total_duration) as record:
+                        summaries = self._summarize_hierarchically(transcript_text, options, budget, record)
+                    user_prompt = (
+                        "以下是一場會議逐字稿依時間順序分段整理的摘要，"
+                        f"請根據這些摘要生成一份結構良好的會議紀錄：\n\n{summaries}"
+                    )
+                    progress_start = 70
+                elif model_budget is not None and transcript_tokens > model_budget:
+                    raise ReportGeneratorException(
+                        f"逐字稿約 {transcript_tokens} tokens，超過模型 {self.ollama_model} 可容納的 "
+                        f"{model_budget} tokens，請啟用分層摘要或改用 context 較大的模型"
+                    )
 
-            # 只在有數值時添加這些參數，避免某些模型不支援的問題
-            if frequency_penalty is not None:
-                data["options"]["frequency_penalty"] = frequency_penalty
+            # 發送請求並串流接收生成內容
+            self.reporter.update_step_progress(progress_start, f"正在使用 {self.ollama_model} 生成報告")
 
-            if presence_penalty is not None:
-                data["options"]["presence_penalty"] = presence_penalty
+            progress_step = (90 - progress_start) / (self.max_tokens / 10)  # 每 10 個 token 更新一次進度
+            queue_to_use = getattr(current_app, self.message_queue_name, self.message_queue)
 
-            if repeat_penalty is not None:
-                data["options"]["repeat_penalty"] = repeat_penalty
+            def on_chunk(chunk, tokens_received):
+                # 確保使用正確的全局隊列
+                queue_to_use.put(chunk)
 
-            if seed is not None:
-                data["options"]["seed"] = seed
+                # 調試輸出
+                logger.debug(f"添加到隊列: {chunk}")
 
-            # 儲存 LLM 請求參數用於調試
-            debug_dir = self.app_config.get('REPORT_DEBUG_FOLDER')
-            if debug_dir:
-                debug_file = os.path.join(debug_dir, f"report_{self.report_id}_request.json")
-                with open(debug_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                # 更新 token 計數和進度
+                if tokens_received % 10 == 0:
+                    self.reporter.update_step_progress(
+                        min(90, progress_start + progress_step * tokens_received / 10),
+                        f"已生成 {tokens_received} 個 token"
+                    )
 
-            # 發送請求並串流接收生成內容
-            self.reporter.update_step_progress(30, f"正在使用 {self.ollama_model} 生成報告")
+            result = self._request_completion(system_prompt, user_prompt, options, on_chunk=on_chunk,
+                                              debug_name="report")
+            if metrics is not None and not result.get("cached"):
+                record_llm_usage(metrics, result["final_chunk"], result["tokens"],
+                                 result["request_started"], result["first_token_at"], result["finished_at"])
 
-            try:
-                response = requests.post(self.ollama_url, headers=headers, json=data, stream=True)
-
-                if response.status_code != 200:
-                    error_msg = f"Ollama API 返回錯誤: {response.status_code} - {response.text}"
-                    logger.error(error_msg)
-                    raise ReportGeneratorException(error_msg)
-
-                # 串流處理回應
-                progress = 30
-                progress_step = 50 / (self.max_tokens / 10)  # 每 10 個 token 更新一次進度
-
-                tokens_received = 0
-                content = ""
-                response_chunks = []
-
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            json_line = json.loads(line)
-                            response_chunks.append(json_line)  # 儲存原始回應
-
-                            # 獲取生成的文本並添加到內容中
-                            if "response" in json_line:
-                                chunk = json_line["response"]
-                                content += chunk
-
-                                # 確保使用正確的全局隊列
-                                queue_to_use = getattr(current_app, self.message_queue_name, self.message_queue)
-                                queue_to_use.put(chunk)
-
-                                # 調試輸出
-                                logger.debug(f"添加到隊列: {chunk}")
-
-                                # 更新 token 計數和進度
-                                tokens_received += 1
-                                if tokens_received % 10 == 0:
-                                    progress += progress_step
-                                    self.reporter.update_step_progress(
-                                        min(80, progress),
-                                        f"已生成 {tokens_received} 個 token"
-                                    )
-
-                            # 檢查是否完成生成
-                            if json_line.get("done", False):
-                                break
-
-                        except json.JSONDecodeError:
-                            logger.warning(f"無法解析 JSON: {line}")
-
-                # 儲存 LLM 響應用於調試
-                if debug_dir:
-                    debug_response_file = os.path.join(debug_dir, f"report_{self.report_id}_response.json")
-                    with open(debug_response_file, 'w', encoding='utf-8') as f:
-                        json.dump(response_chunks, f, ensure_ascii=False, indent=2)
-
-                    # 同時保存完整生成的內容
-                    content_file = os.path.join(debug_dir, f"report_{self.report_id}_content.md")
-                    with open(content_file, 'w', encoding='utf-8') as f:
-                        f.write(content)
-
-                self.reporter.update_step_progress(90, "報告生成完成")
-
-            except requests.RequestException as e:
-                error_msg = f"連接 Ollama 服務時發生錯誤: {e}"
-                logger.error(error_msg)
-                raise ReportGeneratorException(error_msg)
+            content = result["content"]
 
             # 儲存生成的內容
             self.result_content = content
@@ -450,6 +440,268 @@ class ReportGenerator:
             logger.error(f"生成報告內容時發生錯誤: {e}")
             raise ReportGeneratorException(f"生成報告內容時發生錯誤: {e}")
 
+    def _max_context(self):
+        """
+        模型可使用的最大 context 長度
+
+        取模型本身的上限與 OLLAMA_MAX_NUM_CTX (記憶體限制) 中較小者，兩者都無法得知時返回 None
+        """
+        if not self._context_limit_checked:
+            limits = [self.ollama_client.context_length(self.ollama_model), self.app_config.get('OLLAMA_MAX_NUM_CTX')]
+            limits = [limit for limit in limits if limit]
+            self._context_limit = min(limits) if limits else None
+            self._context_limit_checked = True
+        return self._context_limit
+
+    def _estimate_prompt_tokens(self, system_prompt, user_prompt):
+        """估算提示詞的 token 數量 (含估算誤差的餘裕與對話模板的額外 token)"""
+        margin = self.app_config.get('REPORT_TOKEN_ESTIMATE_MARGIN', 1.2)
+        tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        return math.ceil(tokens * margin) + _PROMPT_TEMPLATE_TOKENS
+
+    def _model_prompt_budget(self, system_prompt):
+        """
+        在模型最大 context 內，扣除系統提示詞與報告輸出後，逐字稿還可以使用的 token 數量
+
+        Returns:
+            int: 逐字稿的 token 預算；模型上限未知時返回 None
+        """
+        max_context = self._max_context()
+        if not max_context:
+            return None
+
+        margin = self.app_config.get('REPORT_TOKEN_ESTIMATE_MARGIN', 1.2)
+        available = max_context - self.max_tokens - self._estimate_prompt_tokens(system_prompt, "")
+        budget = int(available / margin) - _USER_PROMPT_WRAPPER_TOKENS
+        if budget <= 0:
+            raise ReportGeneratorException(
+                f"模型 {self.ollama_model} 的 context 上限 ({max_context} tokens) 不足以容納系統提示詞與報告輸出"
+            )
+        return budget
+
+    def _context_options(self, system_prompt, user_prompt, options):
+        """
+        依提示詞長度設定 num_ctx 與 num_predict
+
+        num_predict 未指定時使用 MAX_REPORT_TOKENS；num_ctx 為提示詞加上輸出所需的大小，
+        以 REPORT_NUM_CTX_STEP 為單位向上取整，避免短會議也使用很大的 context
+
+        Raises:
+            ReportGeneratorException: 提示詞加上輸出超過模型的最大 context
+        """
+        options = dict(options)
+        num_predict = options.setdefault("num_predict", self.max_tokens)
+        required = self._estimate_prompt_tokens(system_prompt, user_prompt) + num_predict
+
+        max_context = self._max_context()
+        if max_context and required > max_context:
+            raise ReportGeneratorException(
+                f"提示詞與輸出約需 {required} tokens，超過模型 {self.ollama_model} 的 context 上限 {max_context} tokens"
+            )
+
+        step = self.app_config.get('REPORT_NUM_CTX_STEP', 1024)
+        num_ctx = max(self.app_config.get('REPORT_MIN_NUM_CTX', 2048), math.ceil(required / step) * step)
+        options["num_ctx"] = min(num_ctx, max_context) if max_context else num_ctx
+        return options
+
+    def _generation_options(self):
+        """從報告或設定檔獲取生成參數"""
+        def option(name, config_key):
+            value = getattr(self.report, name, None)
+            return value if value is not None else self.app_config.get(config_key)
+
+        options = {
+            "temperature": option('temperature', 'DEFAULT_TEMPERATURE'),
+            "top_p": option('top_p', 'DEFAULT_TOP_P'),
+            "top_k": option('top_k', 'DEFAULT_TOP_K'),
+        }
+
+        # 只在有數值時添加這些參數，避免某些模型不支援的問題
+        for name, config_key in (('frequency_penalty', 'DEFAULT_FREQUENCY_PENALTY'),
+                                 ('presence_penalty', 'DEFAULT_PRESENCE_PENALTY'),
+                                 ('repeat_penalty', 'DEFAULT_REPEAT_PENALTY'),
+                                 ('seed', 'DEFAULT_SEED')):
+            value = option(name, config_key)
+            if value is not None:
+                options[name] = value
+
+        return options
+
+    def _request_completion(self, system_prompt, user_prompt, options, on_chunk=None, debug_name=None):
+        """
+        發送一次串流生成請求並收集完整輸出
+
+        不使用應用上下文 (on_chunk 除外)，可在其他線程中平行呼叫
+
+        Args:
+            system_prompt: 系統提示詞
+            user_prompt: 使用者提示詞
+            options: Ollama 生成參數
+            on_chunk: 每收到一個片段時呼叫，簽名為 on_chunk(chunk, tokens_received) (可選)
+            debug_name: 調試檔案名稱 (可選)，設定時保存請求、原始回應與生成內容
+
+        Returns:
+            dict: content、chunks、final_chunk、tokens、request_started、first_token_at、finished_at，
+                使用快取時 cached 為 True
+        """
+        data = {
+            "model": self.ollama_model,
+            "prompt": user_prompt,
+            "system": system_prompt,
+            "stream": True,
+            "options": self._context_options(system_prompt, user_prompt, options)
+        }
+
+        # 儲存 LLM 請求參數用於調試
+        debug_dir = self.app_config.get('REPORT_DEBUG_FOLDER') if debug_name else None
+        debug_prefix = os.path.join(debug_dir, f"{debug_name}_{self.report_id}") if debug_dir else None
+        if debug_prefix:
+            with open(f"{debug_prefix}_request.json", 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+
+        # 可重現的請求 (有 seed 或 temperature 為 0) 先查詢回應快取
+        cache = get_llm_cache(self.app_config) if is_deterministic(data["options"]) else None
+        cache_key = make_llm_cache_key(self.ollama_model, system_prompt, user_prompt, data["options"]) if cache else None
+        cached = cache.get(cache_key) if cache else None
+
+        if cached is not None:
+            logger.info(f"[報告 {self.report_id}] 使用快取的 LLM 回應 ({len(cached['chunks'])} 個片段)")
+            result = self._replay_cached(cached, on_chunk)
+            if debug_prefix:
+                with open(f"{debug_prefix}_content.md", 'w', encoding='utf-8') as f:
+                    f.write(result["content"])
+            return result
+
+        try:
+            result = self.ollama_client.generate(
+                self.ollama_model, user_prompt, system=system_prompt, options=data["options"],
+                on_chunk=on_chunk, keep_raw=debug_prefix is not None
+            )
+        except OllamaClientException as e:
+            logger.error(str(e))
+            raise ReportGeneratorException(str(e))
+
+        # generate 只返回完整結束的串流
+        if cache is not None:
+            cache.put(cache_key, self.ollama_model, result["chunks"], result["final_chunk"])
+
+        # 儲存 LLM 響應用於調試
+        if debug_prefix:
+            with open(f"{debug_prefix}_response.json", 'w', encoding='utf-8') as f:
+                json.dump(result.pop("raw_chunks"), f, ensure_ascii=False, indent=2)
+
+            # 同時保存完整生成的內容
+            with open(f"{debug_prefix}_content.md", 'w', encoding='utf-8') as f:
+                f.write(result["content"])
+
+        return result
+
+    def _replay_cached(self, entry, on_chunk=None):
+        """
+        重播快取的串流輸出
+
+        LLM_CACHE_REPLAY_TOKENS_PER_SECOND 大於 0 時依該速度逐片段送出 (模擬生成過程)，否則立即送出
+        """
+        chunks = entry["chunks"]
+        tokens_per_second = self.app_config.get('LLM_CACHE_REPLAY_TOKENS_PER_SECOND', 0)
+        delay = 1.0 / tokens_per_second if tokens_per_second and on_chunk is not None else 0
+
+        request_started = time.perf_counter()
+        if on_chunk is not None:
+            for index, chunk in enumerate(chunks, start=1):
+                on_chunk(chunk, index)
+                if delay:
+                    time.sleep(delay)
+        finished_at = time.perf_counter()
+
+        return {
+            "content": "".join(chunks),
+            "chunks": chunks,
+            "final_chunk": entry.get("final_chunk"),
+            "tokens": len(chunks),
+            "request_started": request_started,
+            "first_token_at": request_started if chunks else None,
+            "finished_at": finished_at,
+            "cached": True,
+        }
+
+    def _summarize_hierarchically(self, transcript_text, options, budget, metrics=None):
+        """
+        分層摘要: 在說話者輪替處切割逐字稿並平行摘要各片段，再逐層合併摘要，
+        直到全部摘要不超過 token 預算
+
+        Args:
+            transcript_text: 預處理後的轉錄文字
+            options: Ollama 生成參數
+            budget: 單一提示詞的 token 預算
+            metrics: StageMetrics.stage 返回的 dict (可選)
+
+        Returns:
+            str: 依時間順序排列的摘要 (以空行分隔)
+        """
+        concurrency = max(1, self.app_config.get('REPORT_MAP_CONCURRENCY', 2))
+        max_levels = self.app_config.get('REPORT_MAX_SUMMARY_LEVELS', 4)
+        summary_options = dict(options)
+        summary_options["num_predict"] = self.app_config.get('REPORT_SUMMARY_MAX_TOKENS', 800)
+
+        blocks = split_turns(transcript_text)
+        chunks = pack_chunks(blocks, budget)
+        level = 1
+
+        while True:
+            prompt = self.app_config.get('REPORT_MAP_PROMPT' if level == 1 else 'REPORT_REDUCE_PROMPT')
+            total = len(chunks)
+            logger.info(f"[報告 {self.report_id}] 第 {level} 層摘要: {total} 個片段 (預算 {budget} tokens)")
+            self.reporter.update_step_progress(
+                level_progress(level, 0, 10, 70), f"第 {level} 層摘要: 0/{total} 個片段"
+            )
+
+            summaries = [None] * total
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="report-summary") as executor:
+                futures = {
+                    executor.submit(
+                        self._request_completion, prompt,
+                        f"以下是會議逐字稿的第 {index + 1}/{total} 部分：\n\n{chunk}" if level == 1
+                        else f"以下是同一場會議依時間順序排列的第 {index + 1}/{total} 組摘要：\n\n{chunk}",
+                        summary_options
+                    ): index
+                    for index, chunk in enumerate(chunks)
+                }
+
+                # 進度與指標只在目前線程更新 (需要應用上下文)
+                for done, future in enumerate(as_completed(futures), start=1):
+                    result = future.result()
+                    summaries[futures[future]] = result["content"].strip()
+                    if metrics is not None and not result.get("cached"):
+                        record_llm_usage(metrics, result["final_chunk"], result["tokens"],
+                                         result["request_started"], result["first_token_at"], result["finished_at"])
+                    self.reporter.update_step_progress(
+                        level_progress(level, done / total, 10, 70), f"第 {level} 層摘要: {done}/{total} 個片段"
+                    )
+
+            self._save_debug_summaries(level, summaries)
+
+            combined = "\n\n".join(summaries)
+            if estimate_tokens(combined) <= budget:
+                return combined
+
+            next_chunks = pack_chunks(summaries, budget)
+            if level >= max_levels or len(next_chunks) >= len(chunks):
+                # 摘要無法再縮短，以目前的結果生成報告
+                logger.warning(f"[報告 {self.report_id}] 第 {level} 層摘要仍超過預算，直接以此生成報告")
+                return combined
+
+            chunks = next_chunks
+            level += 1
+
+    def _save_debug_summaries(self, level, summaries):
+        """保存各層摘要用於調試"""
+        debug_dir = self.app_config.get('REPORT_DEBUG_FOLDER')
+        if debug_dir:
+            path = os.path.join(debug_dir, f"report_{self.report_id}_summary_level{level}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summaries, f, ensure_ascii=False, indent=2)
+
 
     def _save_report(self, content):
         """儲存報告為 Markdown 和 PDF 格式"""
@@ -536,6 +788,40 @@ class ReportGenerator:
             raise ReportGeneratorException(f"儲存報告時發生錯誤: {e}")
 
 
+def _run_report_job(report_id):
+    """工作排程器呼叫的報告生成工作"""
+    generator = ReportGenerator(report_id)
+    generator._generate_report()
+
+    # 生成失敗時拋出異常，讓工作記錄標記為失敗
+    if generator.report.status == ReportStatus.FAILED:
+        raise ReportGeneratorException(generator.report.error_message)
+
+
+def _requeue_report_job(report_id):
+    """被中斷的報告生成工作重新排入時，重置生成進度"""
+    report = Report.query.get(report_id)
+    if report:
+        report.status = ReportStatus.GENERATING
+        report.progress = 0
+        report.error_message = None
+        db.session.commit()
+    get_progress_bus().discard(JOB_TYPE_LLM, report_id)
+
+
+def _fail_report_job(report_id, message):
+    """被中斷的報告生成工作放棄時，標記報告為生成失敗"""
+    report = Report.query.get(report_id)
+    if report:
+        report.status = ReportStatus.FAILED
+        report.error_message = message
+        db.session.commit()
+    get_progress_bus().discard(JOB_TYPE_LLM, report_id)
+
+
+register_job_handler(JOB_TYPE_LLM, _run_report_job, on_requeued=_requeue_report_job, on_failed=_fail_report_job)
+
+
 # 工廠函式
 def create_report_generator(report_id, progress_callback=None):
     """
@@ -550,31 +836,3 @@ def create_report_generator(report_id, progress_callback=None):
     """
     return ReportGenerator(report_id, progress_callback)
 
-
-# 字數統計工具
-def count_words(text):
-    """
-    計算文本中的字數
-    中文以單字為單位，英文以空格分隔的單詞為單位
-
-    Args:
-        text: 要計算的文本
-
-    Returns:
-        字數
-    """
-    if not text:
-        return 0
-
-    # 分割英文單詞和中文字符
-    import re
-    # 匹配英文單詞
-    english_words = re.findall(r'[a-zA-Z]+', text)
-    # 移除英文後剩下的文本（主要是中文）
-    chinese_text = re.sub(r'[a-zA-Z]+', '', text)
-    # 移除標點符號和空格
-    chinese_text = re.sub(r'[\s\p{P}]', '', chinese_text)
-
-    # 計算總字數
-    total_words = len(english_words) + len(chinese_text)
-    return total_words
\ No newline at end of file
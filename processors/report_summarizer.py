@@ -0,0 +1,99 @@
+"""
+分層摘要 (map-reduce) 工具
+逐字稿超過單一提示詞的 token 預算時，在說話者輪替處將逐字稿切成多個片段分別摘要，
+再將摘要逐層合併，直到全部摘要可以放入一個提示詞，最後才生成完整報告
+
+本模組只負責切割與打包文字；實際呼叫 LLM 的流程在 ReportGenerator 中
+"""
+import re
+
+from utils.token_estimator import estimate_tokens
+
+# 說話者輪替之間以空行分隔 (轉錄 TXT 檔案的格式)
+_TURN_SEPARATOR = re.compile(r'\n\s*\n')
+
+
+def split_turns(text):
+    """
+    將逐字稿切割為說話者輪替段落
+
+    轉錄 TXT 檔案中每次換人發言都以空行開始，空行之間的內容即為一個輪替
+    (第一段為檔案標頭)
+
+    Returns:
+        list: 去除前後空白後的段落
+    """
+    return [turn.strip() for turn in _TURN_SEPARATOR.split(text) if turn.strip()]
+
+
+def _split_long_turn(turn, budget):
+    """將超過預算的單一輪替依行切割，每個部分都保留說話者標題行"""
+    lines = turn.split("\n")
+    header, body = (lines[0], lines[1:]) if len(lines) > 1 else ("", lines)
+    header_tokens = estimate_tokens(header)
+
+    parts = []
+    current = []
+    current_tokens = header_tokens
+    for line in body:
+        line_tokens = estimate_tokens(line) + 1
+        if current and current_tokens + line_tokens > budget:
+            parts.append("\n".join([header] + current if header else current))
+            current, current_tokens = [], header_tokens
+        current.append(line)
+        current_tokens += line_tokens
+
+    if current:
+        parts.append("\n".join([header] + current if header else current))
+    return parts
+
+
+def pack_chunks(blocks, budget):
+    """
+    依序將段落打包為不超過 token 預算的片段，只在段落之間切割
+
+    單一段落超過預算時才在段落內依行切割
+
+    Args:
+        blocks: 段落列表 (說話者輪替或摘要)
+        budget: 每個片段的 token 預算
+
+    Returns:
+        list: 片段文字 (段落之間以空行分隔)
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for block in blocks:
+        block_tokens = estimate_tokens(block) + 2
+        pieces = _split_long_turn(block, budget) if block_tokens > budget else [block]
+
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece) + 2
+            if current and current_tokens + piece_tokens > budget:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def level_progress(level, fraction, start, end):
+    """
+    將某一層摘要的完成比例換算為整體進度
+
+    層數事先未知，第 1 層佔可用範圍的一半，之後每一層佔剩餘範圍的一半
+
+    Args:
+        level: 層數 (從 1 開始)
+        fraction: 該層的完成比例 (0-1)
+        start: 分層摘要的進度起點
+        end: 分層摘要的進度終點
+    """
+    span = end - start
+    level_start = start + span * (1 - 0.5 ** (level - 1))
+    return level_start + span * 0.5 ** level * fraction
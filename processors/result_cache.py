@@ -0,0 +1,246 @@
+"""
+轉錄結果快取
+以 (音訊內容雜湊, Whisper 模型, 說話者分割模型, 語言, 說話者數量設定) 為鍵保存轉錄結果，
+重複上傳相同的錄音時直接從快取建立轉錄記錄，不需重新執行模型
+
+每個快取項目是快取目錄下的一個子目錄，包含轉錄 CSV 與 meta.json；
+總大小超過上限時，依最近使用時間淘汰最舊的項目
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+# 設定日誌
+logger = logging.getLogger("result_cache")
+
+# 快取項目中的檔案名稱
+_CSV_NAME = "transcript.csv"
+_META_NAME = "meta.json"
+
+# 寫入中的暫存目錄超過此秒數未更新才視為中斷後遺留 (其他行程可能共用快取目錄並正在寫入)
+_PART_DIR_GRACE_SECONDS = 300
+
+# 行程內共享的結果快取
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def make_cache_key(content_hash, whisper_model, language, speakers_count, speaker_min, speaker_max,
+                   diarization_model=None):
+    """
+    建立快取鍵
+
+    說話者數量有指定時，Pyannote 不使用最少/最多人數，因此不納入鍵中；
+    更換說話者分割模型 (DIARIZATION_MODEL) 時不會使用舊模型的結果
+    """
+    if speakers_count is not None:
+        speaker_min = speaker_max = None
+
+    payload = json.dumps(
+        [content_hash, whisper_model, diarization_model, language, speakers_count, speaker_min, speaker_max],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """以內容定址的轉錄結果快取"""
+
+    def __init__(self, cache_dir, max_bytes=None):
+        """
+        初始化結果快取
+
+        Args:
+            cache_dir: 快取目錄
+            max_bytes: 快取總大小上限 (位元組)，若為 None 則不限制
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # 快取鍵 -> 項目大小，依最近使用時間排序 (最舊的在前)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        # 統計資訊
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _load_index(self):
+        """掃描快取目錄，依最後使用時間重建索引"""
+        entries = []
+        stale_before = time.time() - _PART_DIR_GRACE_SECONDS
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            if entry.name.endswith(".part"):
+                # 寫入中斷留下的暫存目錄 (較新的可能仍在寫入中，保留)
+                if entry.stat().st_mtime < stale_before:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            meta_path = os.path.join(entry.path, _META_NAME)
+            if not os.path.isfile(meta_path):
+                continue
+            size = sum(item.stat().st_size for item in os.scandir(entry.path) if item.is_file())
+            entries.append((os.path.getmtime(meta_path), entry.name, size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        logger.info(f"結果快取: {len(self._entries)} 個項目，共 {self._total_bytes / 1024 / 1024:.1f} MB")
+
+    def get(self, key):
+        """
+        查詢快取
+
+        Returns:
+            dict: 快取的中繼資料，並包含 "csv_path" (快取中的 CSV 路徑)；未命中時返回 None
+        """
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return None
+
+            meta_path = os.path.join(self._entry_dir(key), _META_NAME)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                # 更新最後使用時間
+                os.utime(meta_path, None)
+            except (OSError, ValueError) as e:
+                logger.warning(f"讀取快取項目失敗，移除該項目: {e}")
+                self._remove(key)
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        meta["csv_path"] = os.path.join(self._entry_dir(key), _CSV_NAME)
+        meta["artifacts"] = {
+            name: os.path.join(self._entry_dir(key), name) for name in meta.get("artifacts", [])
+        }
+        return meta
+
+    def put(self, key, csv_path, meta, artifacts=None):
+        """
+        將轉錄結果存入快取
+
+        Args:
+            key: 快取鍵 (見 make_cache_key)
+            csv_path: 轉錄 CSV 路徑
+            meta: 可序列化為 JSON 的中繼資料
+            artifacts: 一併保存的其他檔案 {名稱: 路徑} (可選)，命中時以 meta["artifacts"] 返回其快取路徑
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.{threading.get_ident()}.part"
+        artifacts = {name: path for name, path in (artifacts or {}).items() if path and os.path.exists(path)}
+
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            shutil.copyfile(csv_path, os.path.join(tmp_dir, _CSV_NAME))
+            for name, path in artifacts.items():
+                shutil.copyfile(path, os.path.join(tmp_dir, name))
+            with open(os.path.join(tmp_dir, _META_NAME), "w", encoding="utf-8") as f:
+                json.dump(dict(meta, artifacts=sorted(artifacts), stored_at=time.time()), f, ensure_ascii=False)
+
+            size = sum(entry.stat().st_size for entry in os.scandir(tmp_dir) if entry.is_file())
+
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+                os.replace(tmp_dir, entry_dir)
+                self._entries[key] = size
+                self._total_bytes += size
+                self._stores += 1
+                self._evict_over_budget()
+
+        except OSError as e:
+            logger.warning(f"寫入結果快取失敗: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _remove(self, key):
+        """移除快取項目 (需持有鎖)"""
+        size = self._entries.pop(key, 0)
+        self._total_bytes -= size
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict_over_budget(self):
+        """淘汰最久未使用的項目直到總大小低於上限 (需持有鎖)"""
+        if self.max_bytes is None:
+            return
+
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._evictions += 1
+            logger.info(f"結果快取已滿，淘汰項目 {key[:12]}")
+
+    def clear(self):
+        """清除所有快取項目"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self):
+        """取得快取統計資訊"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stores": self._stores,
+                "evictions": self._evictions,
+            }
+
+
+def get_result_cache(config=None):
+    """
+    取得行程內共享的結果快取
+
+    Args:
+        config: 應用配置，僅在第一次建立快取時使用；為 None 時使用 current_app.config
+
+    Returns:
+        ResultCache 實例；快取停用時返回 None
+    """
+    global _cache
+
+    if _cache is not None:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None:
+            if config is None:
+                from flask import current_app
+                config = current_app.config
+
+            if not config.get('RESULT_CACHE_ENABLED', True):
+                return None
+
+            max_mb = config.get('RESULT_CACHE_MAX_MB')
+            _cache = ResultCache(
+                config['RESULT_CACHE_FOLDER'],
+                max_bytes=max_mb * 1024 * 1024 if max_mb else None
+            )
+
+    return _cache
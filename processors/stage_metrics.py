@@ -0,0 +1,235 @@
+"""
+階段效能指標
+記錄音訊處理與報告生成中每個階段的牆鐘時間、CPU 時間、記憶體峰值與處理量，
+保存於 StageMetric 資料表，作為評估硬體容量的依據
+
+CPU 時間與記憶體為整個行程的數值；同時有多個工作執行 (或平行子階段) 時會互相包含，
+平行轉錄使用的子行程也不計入
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from models.db_models import StageMetric
+from extensions import db
+from processors.job_scheduler import JOB_TYPE_AUDIO, JOB_TYPE_LLM
+from utils.metrics import STAGE_DURATION
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 設定日誌
+logger = logging.getLogger("stage_metrics")
+
+# 記憶體取樣間隔 (秒)
+_RSS_SAMPLE_INTERVAL = 0.5
+
+# 可選的 LLM 指標欄位
+_LLM_FIELDS = ("prompt_tokens", "output_tokens", "ttft_seconds", "tokens_per_second")
+
+
+def current_rss_mb():
+    """
+    取得目前行程的常駐記憶體 (MB)
+
+    Linux 上讀取 /proc/self/statm；其他平台以 ru_maxrss (行程生命週期的峰值) 代替，
+    無法取得時返回 None
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以位元組為單位，Linux 以 KB 為單位
+        return max_rss / 1024 / 1024 if os.uname().sysname == "Darwin" else max_rss / 1024
+
+    return None
+
+
+class _RssSampler:
+    """在背景線程中定期取樣記憶體用量，記錄階段期間的峰值"""
+
+    def __init__(self, interval=_RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        """停止取樣並返回峰值 (MB)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return self.peak
+
+
+class StageMetrics:
+    """收集一次處理工作中各階段的效能指標"""
+
+    def __init__(self, audio_file_id=None, report_id=None):
+        """
+        初始化指標收集器
+
+        Args:
+            audio_file_id: 音訊檔案 ID (音訊處理工作)
+            report_id: 報告 ID (報告生成工作)
+        """
+        self.audio_file_id = audio_file_id
+        self.report_id = report_id
+        self.run_id = uuid.uuid4().hex
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, audio_seconds=None):
+        """
+        量測一個階段
+
+        返回的 dict 可在階段內補上 audio_seconds 或 LLM 指標 (prompt_tokens、output_tokens、
+        ttft_seconds、tokens_per_second)；階段拋出異常時仍會記錄，並標記為失敗
+
+        用法:
+            with metrics.stage("轉錄", audio_seconds=duration) as record:
+                ...
+        """
+        record = {"stage": name, "audio_seconds": audio_seconds, "succeeded": True}
+        sampler = _RssSampler().start()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield record
+        except BaseException:
+            record["succeeded"] = False
+            raise
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall_start
+            record["cpu_seconds"] = time.process_time() - cpu_start
+            record["peak_rss_mb"] = sampler.stop()
+
+            audio_seconds = record.get("audio_seconds")
+            if audio_seconds:
+                # 即時率 (real-time factor): 處理時間 / 音訊長度，小於 1 表示比即時快
+                record["real_time_factor"] = record["wall_seconds"] / audio_seconds
+
+            with self._lock:
+                self.records.append(record)
+
+            STAGE_DURATION.observe(
+                record["wall_seconds"],
+                job_type=JOB_TYPE_LLM if self.report_id is not None else JOB_TYPE_AUDIO,
+                stage=name,
+                outcome="success" if record["succeeded"] else "failure"
+            )
+
+            logger.info(
+                f"階段 {name}: {record['wall_seconds']:.2f} 秒 (CPU {record['cpu_seconds']:.2f} 秒)"
+                + (f"，即時率 {record['real_time_factor']:.3f}" if audio_seconds else "")
+            )
+
+    def save(self):
+        """將收集到的指標寫入資料庫，寫入失敗不影響處理流程"""
+        with self._lock:
+            records, self.records = self.records, []
+
+        if not records:
+            return
+
+        try:
+            for record in records:
+                db.session.add(StageMetric(
+                    audio_file_id=self.audio_file_id,
+                    report_id=self.report_id,
+                    run_id=self.run_id,
+                    stage=record["stage"],
+                    succeeded=record["succeeded"],
+                    wall_seconds=record["wall_seconds"],
+                    cpu_seconds=record["cpu_seconds"],
+                    peak_rss_mb=record["peak_rss_mb"],
+                    audio_seconds=record.get("audio_seconds"),
+                    real_time_factor=record.get("real_time_factor"),
+                    **{field: record.get(field) for field in _LLM_FIELDS}
+                ))
+            db.session.commit()
+        except Exception as e:
+            logger.warning(f"保存階段效能指標失敗: {e}")
+            db.session.rollback()
+
+
+def record_llm_usage(record, final_chunk, output_tokens, request_started, first_token_at, finished_at):
+    """
+    將一次 LLM 串流請求的用量累加到階段指標
+
+    Ollama 最後一個回應 (done=true) 含有 prompt_eval_count、eval_count 與 eval_duration (奈秒)，
+    有提供時優先使用，否則以串流收到的片段數與時間估算
+
+    Args:
+        record: StageMetrics.stage 返回的 dict
+        final_chunk: 最後一個回應的 JSON (可為 None)
+        output_tokens: 串流收到的片段數
+        request_started: 送出請求的時間 (time.perf_counter)
+        first_token_at: 收到第一個片段的時間 (time.perf_counter)，沒有輸出時為 None
+        finished_at: 串流結束的時間 (time.perf_counter)
+    """
+    final_chunk = final_chunk or {}
+    prompt_tokens = final_chunk.get("prompt_eval_count")
+    output_tokens = final_chunk.get("eval_count") or output_tokens
+    eval_seconds = (final_chunk.get("eval_duration") or 0) / 1e9
+    if not eval_seconds and first_token_at is not None:
+        eval_seconds = finished_at - first_token_at
+
+    record["prompt_tokens"] = (record.get("prompt_tokens") or 0) + (prompt_tokens or 0)
+    record["output_tokens"] = (record.get("output_tokens") or 0) + output_tokens
+
+    # 多次請求時記錄第一次請求的首個 token 延遲
+    if first_token_at is not None and record.get("ttft_seconds") is None:
+        record["ttft_seconds"] = first_token_at - request_started
+
+    record["_eval_seconds"] = record.get("_eval_seconds", 0.0) + eval_seconds
+    if record["_eval_seconds"] > 0:
+        record["tokens_per_second"] = record["output_tokens"] / record["_eval_seconds"]
+
+
+def latest_run_metrics(audio_file_id=None, report_id=None):
+    """
+    取得音訊檔案或報告最近一次執行的各階段指標
+
+    Returns:
+        list: StageMetric 記錄 (依記錄順序排列)
+    """
+    query = StageMetric.query
+    if report_id is not None:
+        query = query.filter_by(report_id=report_id)
+    else:
+        query = query.filter_by(audio_file_id=audio_file_id, report_id=None)
+
+    latest = query.order_by(StageMetric.id.desc()).first()
+    if latest is None:
+        return []
+
+    return query.filter_by(run_id=latest.run_id).order_by(StageMetric.id).all()
@@ -0,0 +1,119 @@
+"""
+逐字稿壓縮
+從轉錄 CSV 的片段直接建立送給 LLM 的精簡逐字稿，取代原本的 TXT 檔案:
+
+- 合併同一說話者連續的片段，每次換人發言只寫一次說話者
+- 不再每行標示起訖時間，改為每隔一段時間 (預設每分鐘) 標示一次時間點
+- 正規化空白，可選擇移除語助詞 (嗯、呃、um、uh 等)
+
+輸出格式與 TXT 檔案相同，說話者輪替之間以空行分隔 (分層摘要依此切割)
+"""
+import re
+
+import pandas as pd
+
+# 連續空白 (含全形空白)
+_WHITESPACE = re.compile(r'[\s　]+')
+
+# 移除語助詞後殘留在句首或重複的標點
+_LEADING_PUNCTUATION = re.compile(r'^[\s,，、.。…]+')
+_REPEATED_PUNCTUATION = re.compile(r'([,，、])(\s*[,，、])+')
+
+
+def format_marker(seconds):
+    """將秒數格式化為時間標記，例如 [05:03] 或 [1:05:03]"""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"[{hours}:{minutes:02d}:{seconds:02d}]"
+    return f"[{minutes:02d}:{seconds:02d}]"
+
+
+def build_filler_pattern(filler_words):
+    """
+    建立移除語助詞的正規表示式
+
+    英文語助詞只比對完整單字，中文語助詞可連續出現 (例如 "嗯嗯")；兩者都一併移除其後的逗號與空白
+
+    Returns:
+        re.Pattern；沒有語助詞時返回 None
+    """
+    alternatives = []
+    for word in sorted(filler_words or (), key=len, reverse=True):
+        escaped = re.escape(word)
+        if word.isascii():
+            alternatives.append(rf'\b{escaped}\b')
+        else:
+            alternatives.append(f'(?:{escaped})+')
+
+    if not alternatives:
+        return None
+    return re.compile(rf'(?:{"|".join(alternatives)})[,，、]?\s*', re.IGNORECASE)
+
+
+def normalize_text(text, filler_pattern=None):
+    """正規化一個片段的文字: 合併空白並 (可選) 移除語助詞"""
+    if not isinstance(text, str):
+        return ""
+
+    text = _WHITESPACE.sub(" ", text).strip()
+    if filler_pattern is not None and text:
+        text = filler_pattern.sub("", text)
+        text = _REPEATED_PUNCTUATION.sub(r'\1', text)
+        text = _LEADING_PUNCTUATION.sub("", text).strip()
+    return text
+
+
+def compact_transcript(df, title=None, marker_interval=60, filler_words=None):
+    """
+    由轉錄片段建立精簡逐字稿
+
+    Args:
+        df: 含 start、end、speaker、text 欄位的 DataFrame
+        title: 放在開頭的標題行 (可選)，例如原始檔案名稱
+        marker_interval: 時間標記的間隔 (秒)；為 0 或 None 時不標示時間
+        filler_words: 要移除的語助詞 (可選)
+
+    Returns:
+        str: 精簡逐字稿
+    """
+    filler_pattern = build_filler_pattern(filler_words)
+    blocks = [title] if title else []
+
+    current_speaker = None
+    lines = []
+    line_parts = []
+    next_marker_at = 0
+
+    def flush_line():
+        if line_parts:
+            lines.append(" ".join(line_parts))
+            line_parts.clear()
+
+    def flush_turn():
+        flush_line()
+        if current_speaker is not None and lines:
+            blocks.append("\n".join([f"{current_speaker}:"] + lines))
+        lines.clear()
+
+    for start, speaker, text in zip(df['start'], df['speaker'], df['text']):
+        text = normalize_text(text, filler_pattern)
+        if not text:
+            continue
+
+        speaker = str(speaker) if not pd.isna(speaker) else "未知說話者"
+        if speaker != current_speaker:
+            flush_turn()
+            current_speaker = speaker
+
+        # 每隔 marker_interval 秒在新的一行開頭標示一次時間
+        if marker_interval and start >= next_marker_at:
+            flush_line()
+            line_parts.append(format_marker(start))
+            next_marker_at = (start // marker_interval + 1) * marker_interval
+
+        line_parts.append(text)
+
+    flush_turn()
+    return "\n\n".join(blocks)
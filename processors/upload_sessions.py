@@ -0,0 +1,270 @@
+"""
+分段上傳工作階段
+大型錄音以固定大小的分段依序上傳: 建立工作階段 -> 逐一 PUT 分段 -> 完成上傳
+
+分段直接寫入上傳目錄中的檔案，不在記憶體中暫存整個請求內容；內容雜湊隨分段寫入逐步計算，
+第一個分段到達時即檢查檔案標頭，非音訊檔案不需上傳完畢就會被拒絕。
+已接收的分段記錄在 UploadSession 資料表，連線中斷後可從最後一個完整接收的分段續傳
+"""
+import datetime
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+from werkzeug.utils import secure_filename
+
+from models.db_models import UploadSession
+from utils.audio_probe import sniff_audio_format
+from extensions import db
+
+# 設定日誌
+logger = logging.getLogger("upload_sessions")
+
+# 從請求串流讀取的區塊大小
+_READ_SIZE = 1024 * 1024
+
+# 各工作階段的雜湊計算狀態: 上傳 ID -> (hashlib 物件, 已計算的位元組數)
+# 只存在於處理請求的行程中，其他行程接收過分段或行程重啟後會從檔案補算
+_hashers = {}
+
+# 各工作階段的寫入鎖，避免同一分段同時被寫入
+_session_locks = {}
+_registry_lock = threading.Lock()
+
+
+class UploadSessionException(Exception):
+    """分段上傳異常"""
+    pass
+
+
+class ChunkOutOfOrder(UploadSessionException):
+    """分段不是下一個要接收的分段"""
+
+    def __init__(self, expected):
+        super().__init__(f"預期接收第 {expected} 個分段")
+        self.expected = expected
+
+
+def _session_lock(upload_id):
+    with _registry_lock:
+        return _session_locks.setdefault(upload_id, threading.Lock())
+
+
+def _forget(upload_id):
+    with _registry_lock:
+        _hashers.pop(upload_id, None)
+        _session_locks.pop(upload_id, None)
+
+
+def total_chunks(session):
+    """工作階段的分段總數"""
+    return max(1, -(-session.total_size // session.chunk_size))
+
+
+def session_state(session):
+    """工作階段的狀態摘要 (返回給前端以決定從哪個分段續傳)"""
+    return {
+        "upload_id": session.id,
+        "filename": session.original_filename,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "total_chunks": total_chunks(session),
+        "received_chunks": session.received_chunks,
+        "received_bytes": session.received_bytes,
+        "complete": session.received_bytes >= session.total_size,
+    }
+
+
+def create_upload_session(user_id, original_filename, total_size, upload_root, chunk_size, max_file_size=None):
+    """
+    建立分段上傳工作階段，並建立空的目標檔案
+
+    Args:
+        user_id: 上傳者 ID
+        original_filename: 原始檔案名稱
+        total_size: 檔案總大小 (bytes)
+        upload_root: 上傳根目錄 (UPLOAD_FOLDER)
+        chunk_size: 每個分段的大小 (bytes)
+        max_file_size: 檔案大小上限 (bytes，可選)
+
+    Returns:
+        UploadSession 實例
+    """
+    if total_size <= 0:
+        raise UploadSessionException("檔案大小無效")
+    if max_file_size and total_size > max_file_size:
+        raise UploadSessionException(f"檔案超過大小上限 {max_file_size // 1024 // 1024} MB")
+
+    upload_id = str(uuid.uuid4())
+    upload_folder = os.path.join(upload_root, upload_id)
+    os.makedirs(upload_folder, exist_ok=True)
+
+    filename = secure_filename(original_filename)
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    unique_filename = f"{timestamp}_{filename}"
+    file_path = os.path.join(upload_folder, unique_filename)
+    open(file_path, 'wb').close()
+
+    session = UploadSession(
+        id=upload_id,
+        filename=unique_filename,
+        original_filename=filename,
+        file_path=file_path,
+        total_size=total_size,
+        chunk_size=chunk_size,
+        user_id=user_id
+    )
+    db.session.add(session)
+    db.session.commit()
+
+    logger.info(f"建立分段上傳 {upload_id}: {filename} ({total_size} bytes，共 {total_chunks(session)} 個分段)")
+    return session
+
+
+def _current_hasher(session):
+    """取得與已接收內容一致的雜湊狀態，落後時從檔案補算"""
+    hasher, position = _hashers.get(session.id, (None, 0))
+    if hasher is None or position > session.received_bytes:
+        hasher, position = hashlib.sha256(), 0
+
+    if position < session.received_bytes:
+        with open(session.file_path, 'rb') as f:
+            f.seek(position)
+            remaining = session.received_bytes - position
+            while remaining > 0:
+                data = f.read(min(_READ_SIZE, remaining))
+                if not data:
+                    raise UploadSessionException("已接收的檔案內容不完整，請重新上傳")
+                hasher.update(data)
+                remaining -= len(data)
+
+    return hasher
+
+
+def write_chunk(session, index, stream):
+    """
+    接收一個分段並直接寫入目標檔案
+
+    分段必須依序上傳；重送已接收的分段會直接視為成功。
+    分段未完整接收 (例如連線中斷) 時不更新工作階段，下次從同一個分段重新寫入
+
+    Args:
+        session: UploadSession 實例
+        index: 分段編號 (從 0 開始)
+        stream: 分段內容的串流 (例如 request.stream)
+
+    Returns:
+        dict: session_state 的結果
+    """
+    with _session_lock(session.id):
+        db.session.refresh(session)
+
+        if index < session.received_chunks:
+            return session_state(session)
+        if index != session.received_chunks or index >= total_chunks(session):
+            raise ChunkOutOfOrder(session.received_chunks)
+
+        offset = session.received_bytes
+        expected = min(session.chunk_size, session.total_size - offset)
+
+        # 在副本上計算雜湊，分段不完整時保留原本的狀態
+        hasher = _current_hasher(session).copy()
+        written = 0
+        header = b''
+
+        with open(session.file_path, 'r+b') as f:
+            f.seek(offset)
+            while written < expected:
+                data = stream.read(min(_READ_SIZE, expected - written))
+                if not data:
+                    break
+                if offset == 0 and len(header) < 12:
+                    header += data[:12 - len(header)]
+                hasher.update(data)
+                f.write(data)
+                written += len(data)
+
+            # 捨棄上次中斷時殘留在已接收內容之後的資料
+            f.truncate(offset + written)
+
+            if written == expected and stream.read(1):
+                f.truncate(offset)
+                raise UploadSessionException(f"分段 {index} 超過預期大小 {expected} bytes")
+
+            if offset == 0 and written == expected and sniff_audio_format(header) is None:
+                f.truncate(0)
+                raise UploadSessionException("檔案不是支援的音訊格式")
+
+        if written < expected:
+            raise UploadSessionException(f"分段 {index} 不完整: 收到 {written} / {expected} bytes")
+
+        session.received_chunks += 1
+        session.received_bytes = offset + written
+        db.session.commit()
+
+        _hashers[session.id] = (hasher, session.received_bytes)
+        return session_state(session)
+
+
+def finish_upload_session(session):
+    """
+    完成上傳並移除工作階段記錄
+
+    Returns:
+        tuple: (檔案路徑, 檔案大小, SHA-256 十六進位字串)
+    """
+    with _session_lock(session.id):
+        db.session.refresh(session)
+
+        if session.received_bytes < session.total_size:
+            raise UploadSessionException(
+                f"尚未接收完整檔案: {session.received_chunks} / {total_chunks(session)} 個分段"
+            )
+
+        content_hash = _current_hasher(session).hexdigest()
+        upload_id = session.id
+        result = (session.file_path, session.received_bytes, content_hash)
+
+        db.session.delete(session)
+        db.session.commit()
+
+    _forget(upload_id)
+    logger.info(f"分段上傳 {upload_id} 完成: {result[0]}")
+    return result
+
+
+def discard_upload_session(session):
+    """取消上傳，刪除工作階段記錄與已接收的內容"""
+    upload_folder = os.path.dirname(session.file_path)
+    upload_id = session.id
+
+    db.session.delete(session)
+    db.session.commit()
+    _forget(upload_id)
+
+    shutil.rmtree(upload_folder, ignore_errors=True)
+
+
+def cleanup_expired_sessions(ttl_seconds):
+    """
+    刪除超過 ttl_seconds 沒有收到分段的工作階段與其已接收的內容
+
+    Returns:
+        int: 刪除的工作階段數量
+    """
+    expired_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+    expired = UploadSession.query.filter(UploadSession.updated_at < expired_before).all()
+
+    for session in expired:
+        try:
+            discard_upload_session(session)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"刪除過期的分段上傳 {session.id} 失敗: {e}")
+
+    if expired:
+        logger.info(f"已刪除 {len(expired)} 個過期的分段上傳")
+    return len(expired)
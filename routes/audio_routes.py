@@ -6,8 +6,19 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
     send_from_directory
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from models.db_models import AudioFile, Transcript, ProcessingStatus, TranscriptStatus
-from processors.audio_processor import create_audio_processor
+from models.db_models import AudioFile, Transcript, UploadSession, ProcessingStatus, TranscriptStatus
+from processors.audio_processor import create_audio_processor, latest_transcript
+from processors.diarization_state import load_candidates, candidates_path_for, DiarizationStateException
+from processors.job_scheduler import get_job_scheduler, format_queue_message, JOB_TYPE_AUDIO
+from processors.progress_bus import get_progress_bus
+from processors.stage_metrics import latest_run_metrics
+from processors.upload_sessions import (
+    create_upload_session, write_chunk, finish_upload_session, discard_upload_session,
+    cleanup_expired_sessions, session_state, UploadSessionException, ChunkOutOfOrder
+)
+from utils.audio_probe import probe_audio
+from utils.file_utils import save_stream_with_hash
+from utils.visualization import ensure_rendered, thumbnail_path_for, THUMBNAIL, FULL
 from app import db
 import os
 import datetime
@@ -25,6 +36,55 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 
+def _create_output_folders(upload_id):
+    """為上傳建立對應的輸出資料夾結構"""
+    for folder in ('TRANSCRIPT_FOLDER', 'VISUALIZATION_FOLDER', 'REPORT_FOLDER'):
+        os.makedirs(os.path.join(current_app.config[folder], upload_id), exist_ok=True)
+
+
+def _processing_options(form):
+    """從上傳表單讀取音訊處理設定，未填寫或格式錯誤的項目使用預設值"""
+    def read_int(name, default=None):
+        try:
+            return int(form.get(name)) if form.get(name) else default
+        except ValueError:
+            return default
+
+    return {
+        "whisper_model": form.get('whisper_model') or current_app.config.get('DEFAULT_WHISPER_MODEL'),
+        "language": form.get('language') or current_app.config.get('DEFAULT_LANGUAGE'),
+        "speakers_count": read_int('speakers_count'),
+        "speaker_min": read_int('speaker_min', current_app.config.get('DEFAULT_SPEAKER_MIN')),
+        "speaker_max": read_int('speaker_max', current_app.config.get('DEFAULT_SPEAKER_MAX')),
+    }
+
+
+def _create_audio_file(upload_id, unique_filename, original_filename, file_path, file_size, content_hash, form):
+    """為已保存的上傳檔案建立資料庫記錄 (表單上傳與分段上傳共用)"""
+    _create_output_folders(upload_id)
+
+    # 讀取音訊標頭以取得時長
+    audio_info = probe_audio(file_path)
+    duration = audio_info['duration'] if audio_info else None
+
+    # 創建資料庫記錄
+    audio_file = AudioFile(
+        filename=unique_filename,
+        original_filename=original_filename,
+        file_path=file_path,
+        file_size=file_size,
+        duration=duration,
+        content_hash=content_hash,
+        status=ProcessingStatus.PENDING,
+        user_id=current_user.id,
+        **_processing_options(form)
+    )
+
+    db.session.add(audio_file)
+    db.session.commit()
+    return audio_file
+
+
 @audio.route('/upload', methods=['GET'])
 @login_required
 def upload_form():
@@ -79,67 +139,107 @@ def upload_audio():
     upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], upload_id)
     os.makedirs(upload_folder, exist_ok=True)
 
-    # 同時為輸出創建對應的資料夾結構
-    transcript_folder = os.path.join(current_app.config['TRANSCRIPT_FOLDER'], upload_id)
-    visualization_folder = os.path.join(current_app.config['VISUALIZATION_FOLDER'], upload_id)
-    report_folder = os.path.join(current_app.config['REPORT_FOLDER'], upload_id)
-
-    os.makedirs(transcript_folder, exist_ok=True)
-    os.makedirs(visualization_folder, exist_ok=True)
-    os.makedirs(report_folder, exist_ok=True)
-
     # 保存檔案
     filename = secure_filename(file.filename)
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
     unique_filename = f"{timestamp}_{filename}"
     file_path = os.path.join(upload_folder, unique_filename)
 
-    file.save(file_path)
+    # 寫入檔案時同時計算內容雜湊，用於辨識重複上傳的錄音
+    file_size, content_hash = save_stream_with_hash(file.stream, file_path)
+
+    audio_file = _create_audio_file(upload_id, unique_filename, filename, file_path, file_size, content_hash,
+                                    request.form)
+
+    # 開始處理
+    return redirect(url_for('audio.process', audio_id=audio_file.id))
+
+
+def _get_upload_session(upload_id):
+    """取得屬於當前用戶的分段上傳工作階段"""
+    return UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first_or_404()
+
 
-    # 獲取參數
-    whisper_model = request.form.get('whisper_model') or current_app.config.get('DEFAULT_WHISPER_MODEL')
-    language = request.form.get('language') or current_app.config.get('DEFAULT_LANGUAGE')
+@audio.route('/upload/sessions', methods=['POST'])
+@login_required
+def create_upload():
+    """建立分段上傳工作階段 (JSON: filename、size)"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+
+    if not allowed_file(filename):
+        return jsonify({
+            'error': f'不支援的檔案類型。允許的類型: {", ".join(current_app.config["ALLOWED_EXTENSIONS"])}'
+        }), 400
+
+    # 順便清理過期未完成的上傳
+    cleanup_expired_sessions(current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600))
 
     try:
-        speakers_count = int(request.form.get('speakers_count')) if request.form.get('speakers_count') else None
-    except ValueError:
-        speakers_count = None
+        session = create_upload_session(
+            current_user.id,
+            filename,
+            int(data.get('size') or 0),
+            current_app.config['UPLOAD_FOLDER'],
+            current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024),
+            current_app.config.get('UPLOAD_MAX_FILE_SIZE')
+        )
+    except (UploadSessionException, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(session_state(session)), 201
+
+
+@audio.route('/upload/sessions/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """查詢分段上傳的進度 (用於續傳)"""
+    return jsonify(session_state(_get_upload_session(upload_id)))
+
+
+@audio.route('/upload/sessions/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """接收一個分段，內容直接寫入上傳檔案"""
+    session = _get_upload_session(upload_id)
 
     try:
-        speaker_min = int(request.form.get('speaker_min')) if request.form.get(
-            'speaker_min') else current_app.config.get('DEFAULT_SPEAKER_MIN')
-    except ValueError:
-        speaker_min = current_app.config.get('DEFAULT_SPEAKER_MIN')
+        state = write_chunk(session, index, request.stream)
+    except ChunkOutOfOrder as e:
+        return jsonify({'error': str(e), 'expected_chunk': e.expected}), 409
+    except UploadSessionException as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(state)
+
+
+@audio.route('/upload/sessions/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """完成分段上傳，依表單中的處理選項建立音訊檔案記錄"""
+    session = _get_upload_session(upload_id)
+    unique_filename, original_filename = session.filename, session.original_filename
 
     try:
-        speaker_max = int(request.form.get('speaker_max')) if request.form.get(
-            'speaker_max') else current_app.config.get('DEFAULT_SPEAKER_MAX')
-    except ValueError:
-        speaker_max = current_app.config.get('DEFAULT_SPEAKER_MAX')
+        file_path, file_size, content_hash = finish_upload_session(session)
+    except UploadSessionException as e:
+        return jsonify({'error': str(e)}), 400
 
-    # 獲取檔案大小
-    file_size = os.path.getsize(file_path)
+    audio_file = _create_audio_file(upload_id, unique_filename, original_filename, file_path, file_size,
+                                    content_hash, request.form)
 
-    # 創建資料庫記錄
-    audio_file = AudioFile(
-        filename=unique_filename,
-        original_filename=filename,
-        file_path=file_path,
-        file_size=file_size,
-        whisper_model=whisper_model,
-        language=language,
-        speakers_count=speakers_count,
-        speaker_min=speaker_min,
-        speaker_max=speaker_max,
-        status=ProcessingStatus.PENDING,
-        user_id=current_user.id
-    )
+    return jsonify({
+        'audio_id': audio_file.id,
+        'redirect_url': url_for('audio.process', audio_id=audio_file.id)
+    })
 
-    db.session.add(audio_file)
-    db.session.commit()
 
-    # 開始處理
-    return redirect(url_for('audio.process', audio_id=audio_file.id))
+@audio.route('/upload/sessions/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    """取消分段上傳並刪除已接收的內容"""
+    discard_upload_session(_get_upload_session(upload_id))
+    return jsonify({'success': True})
 
 
 @audio.route('/process/<int:audio_id>')
@@ -172,7 +272,7 @@ def process(audio_id):
     # 如果處理已完成，重定向到轉錄頁面
     elif audio_file.status == ProcessingStatus.COMPLETED:
         # 找到對應的轉錄記錄
-        transcript = Transcript.query.filter_by(audio_file_id=audio_id).first()
+        transcript = latest_transcript(audio_id)
 
         if transcript:
             return redirect(url_for('audio.view_transcript', transcript_id=transcript.id))
@@ -202,7 +302,7 @@ def check_processing_status(audio_id):
     # 檢查處理是否完成
     if audio_file.status == ProcessingStatus.COMPLETED:
         # 找到對應的轉錄記錄
-        transcript = Transcript.query.filter_by(audio_file_id=audio_id).first()
+        transcript = latest_transcript(audio_id)
 
         if transcript:
             redirect_url = url_for('audio.view_transcript', transcript_id=transcript.id)
@@ -226,10 +326,20 @@ def check_processing_status(audio_id):
 
     # 處理中
     elif audio_file.status == ProcessingStatus.PROCESSING:
+        # 檢查是否仍在排隊等待
+        queue_position = get_job_scheduler().queue_position(JOB_TYPE_AUDIO, audio_id)
+        queue_message = format_queue_message(queue_position)
+
+        # 優先讀取進度匯流排中的最新進度 (資料庫中的進度為節流寫入)
+        latest = get_progress_bus().get(JOB_TYPE_AUDIO, audio_id)
+        progress = latest['progress'] if latest else audio_file.progress
+
         return jsonify({
             'status': 'processing',
-            'progress': audio_file.progress,
-            'message': f'處理中... {audio_file.progress:.1f}%'
+            'progress': progress,
+            'queue_position': queue_position,
+            'message': queue_message or f'處理中... {progress:.1f}%',
+            'detail': latest['message'] if latest else None
         })
 
     # 其他狀態
@@ -263,23 +373,103 @@ def view_transcript(transcript_id):
         with open(transcript.txt_path, 'r', encoding='utf-8') as f:
             txt_content = f.read()
 
-    # 獲取視覺化路徑 (靜態路徑，用於網頁顯示)
+    # 獲取視覺化縮圖路徑 (靜態路徑，用於網頁顯示)，縮圖尚未繪製或已過期時立即繪製
     visualization_url = None
     if transcript.visualization_path:
-        viz_filename = os.path.basename(transcript.visualization_path)
-        # 提取上傳 ID 從路徑中
-        upload_id = os.path.basename(os.path.dirname(transcript.visualization_path))
-        visualization_url = url_for('static', filename=f'outputs/visualizations/{upload_id}/{viz_filename}')
+        thumb_path = ensure_rendered(
+            transcript.csv_path,
+            thumbnail_path_for(transcript.visualization_path, current_app.config['STATIC_VISUALIZATION_FOLDER']),
+            THUMBNAIL
+        )
+        if thumb_path:
+            viz_filename = os.path.basename(thumb_path)
+            # 提取上傳 ID 從路徑中
+            upload_id = os.path.basename(os.path.dirname(thumb_path))
+            visualization_url = url_for('static', filename=f'outputs/visualizations/{upload_id}/{viz_filename}')
 
     return render_template(
         'transcript.html',
         transcript=transcript,
         audio_file=transcript.audio_file,
         txt_content=txt_content,
-        visualization_url=visualization_url
+        visualization_url=visualization_url,
+        stage_metrics=latest_run_metrics(audio_file_id=transcript.audio_file_id)
     )
 
 
+@audio.route('/transcript/<int:transcript_id>/rediarize', methods=['POST'])
+@login_required
+def rediarize_transcript(transcript_id):
+    """以新的說話者數量設定重新執行說話者分割 (沿用已保存的 Whisper 原始結果)"""
+    transcript = Transcript.query.join(AudioFile).filter(
+        Transcript.id == transcript_id,
+        AudioFile.user_id == current_user.id
+    ).first_or_404()
+    audio_file = transcript.audio_file
+
+    if audio_file.status == ProcessingStatus.PROCESSING:
+        flash('此音訊檔案正在處理中', 'warning')
+        return redirect(url_for('audio.processing_status', audio_id=audio_file.id))
+
+    if not transcript.whisper_result_path or not os.path.exists(transcript.whisper_result_path):
+        flash('此轉錄沒有保存 Whisper 原始結果，無法只重新執行說話者分割', 'error')
+        return redirect(url_for('audio.view_transcript', transcript_id=transcript.id))
+
+    # 有保存說話者分割中間結果時只重新分群，不需要原始音訊
+    state_path = transcript.diarization_state_path
+    if not (state_path and os.path.exists(state_path)) and not os.path.exists(audio_file.file_path):
+        flash('找不到原始音訊檔案', 'error')
+        return redirect(url_for('audio.view_transcript', transcript_id=transcript.id))
+
+    try:
+        speakers_count = int(request.form.get('speakers_count')) if request.form.get('speakers_count') else None
+        speaker_min = int(request.form.get('speaker_min')) if request.form.get('speaker_min') else None
+        speaker_max = int(request.form.get('speaker_max')) if request.form.get('speaker_max') else None
+    except ValueError:
+        flash('說話者數量必須為整數', 'error')
+        return redirect(url_for('audio.view_transcript', transcript_id=transcript.id))
+
+    if speaker_min is not None and speaker_max is not None and speaker_min > speaker_max:
+        flash('最少說話者數量不可大於最多說話者數量', 'error')
+        return redirect(url_for('audio.view_transcript', transcript_id=transcript.id))
+
+    # 更新說話者設定後重新執行 (沿用此轉錄的 Whisper 原始結果)
+    audio_file.speakers_count = speakers_count
+    audio_file.speaker_min = speaker_min
+    audio_file.speaker_max = speaker_max
+    db.session.commit()
+
+    processor = create_audio_processor(audio_file.id)
+    processor.rediarize_async(transcript.id)
+
+    return redirect(url_for('audio.processing_status', audio_id=audio_file.id))
+
+
+@audio.route('/transcript/<int:transcript_id>/speaker_candidates', methods=['GET'])
+@login_required
+def speaker_candidates(transcript_id):
+    """讀取音訊處理工作試算的多個候選說話者數量的分群結果"""
+    transcript = Transcript.query.join(AudioFile).filter(
+        Transcript.id == transcript_id,
+        AudioFile.user_id == current_user.id
+    ).first_or_404()
+
+    state_path = transcript.diarization_state_path
+    if not state_path or not os.path.exists(state_path):
+        return jsonify({'status': 'error', 'message': '此轉錄沒有保存說話者分割中間結果'}), 404
+
+    try:
+        candidates = load_candidates(candidates_path_for(state_path))
+    except DiarizationStateException as e:
+        current_app.logger.error(f"讀取說話者分群試算結果時發生錯誤: {e}")
+        return jsonify({'status': 'error', 'message': f'讀取失敗: {str(e)}'}), 500
+
+    if candidates is None:
+        return jsonify({'status': 'error', 'message': '此轉錄沒有說話者數量試算結果，請重新執行說話者分割'}), 404
+
+    return jsonify({'status': 'success', 'candidates': candidates})
+
+
 @audio.route('/transcript/<int:transcript_id>/edit', methods=['GET'])
 @login_required
 def edit_transcript(transcript_id):
@@ -415,8 +605,9 @@ def download_transcript(transcript_id, format):
         )
 
     elif format == 'viz':
-        # 下載可視化圖表
-        if not transcript.visualization_path or not os.path.exists(transcript.visualization_path):
+        # 下載可視化圖表 (完整解析度圖表在第一次下載時才繪製)
+        if not transcript.visualization_path or \
+                not ensure_rendered(transcript.csv_path, transcript.visualization_path, FULL):
             flash('可視化圖表不存在', 'error')
             return redirect(url_for('audio.view_transcript', transcript_id=transcript.id))
 
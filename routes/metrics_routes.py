@@ -0,0 +1,128 @@
+"""
+指標相關路由
+以 Prometheus 文字格式輸出應用程式指標，供監控系統抓取
+"""
+import hmac
+import time
+
+from flask import Blueprint, Response, current_app, g, request, abort
+
+from processors.job_scheduler import get_job_scheduler
+from processors.model_registry import get_model_registry
+from processors.result_cache import get_result_cache
+from processors.llm_cache import get_llm_cache
+from utils.metrics import REGISTRY, HTTP_REQUEST_DURATION
+
+# 創建藍圖
+metrics = Blueprint('metrics', __name__)
+
+# Prometheus 文字格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics.route('/metrics')
+def expose_metrics():
+    """輸出所有指標 (設定 METRICS_TOKEN 時需以 Bearer token 存取)"""
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        provided = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(provided, f"Bearer {token}"):
+            abort(401)
+
+    return Response(REGISTRY.expose(), content_type=CONTENT_TYPE)
+
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    start = g.pop('_metrics_start', None)
+    if start is not None:
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            # 以端點名稱 (藍圖.函數) 作為標籤，避免路徑參數造成標籤數量無限增加
+            endpoint=request.endpoint or "unmatched",
+            status=response.status_code
+        )
+    return response
+
+
+def _scheduler_stat(app, field):
+    def collect():
+        return {(job_type,): stats[field] for job_type, stats in get_job_scheduler(app).stats().items()}
+    return collect
+
+
+def _registry_stat(config, field):
+    def collect():
+        return get_model_registry(config).stats()[field]
+    return collect
+
+
+def _cache_stat(config, field, get_cache=get_result_cache):
+    def collect():
+        cache = get_cache(config)
+        return cache.stats()[field] if cache is not None else None
+    return collect
+
+
+def init_metrics(app):
+    """
+    為應用程式註冊 /metrics 端點、HTTP 請求計時與執行期狀態指標
+
+    Args:
+        app: Flask 應用
+    """
+    app.register_blueprint(metrics)
+
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    # 所有藍圖 (auth / audio / report) 的請求都經過這兩個掛鉤
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+
+    config = app.config
+
+    # 工作排程器
+    REGISTRY.gauge("job_queue_depth", "排隊等待中的工作數量", ("job_type",),
+                   function=_scheduler_stat(app, "pending"))
+    REGISTRY.gauge("jobs_active", "執行中的工作數量", ("job_type",),
+                   function=_scheduler_stat(app, "running"))
+    REGISTRY.gauge("job_workers", "各工作類型的並行上限", ("job_type",),
+                   function=_scheduler_stat(app, "max_workers"))
+    REGISTRY.counter_function("jobs_completed_total", "已完成的工作數量",
+                              _scheduler_stat(app, "completed"), ("job_type",))
+    REGISTRY.counter_function("jobs_failed_total", "失敗的工作數量",
+                              _scheduler_stat(app, "failed"), ("job_type",))
+
+    # 模型註冊表
+    REGISTRY.gauge("model_registry_memory_bytes", "已載入模型的估算記憶體 (位元組)",
+                   function=_registry_stat(config, "memory_bytes"))
+    REGISTRY.gauge("model_registry_models", "已載入的模型數量",
+                   function=lambda: len(get_model_registry(config).stats()["models"]))
+    REGISTRY.counter_function("model_registry_hits_total", "模型註冊表命中次數",
+                              _registry_stat(config, "hits"))
+    REGISTRY.counter_function("model_registry_misses_total", "模型註冊表未命中 (需載入模型) 次數",
+                              _registry_stat(config, "misses"))
+    REGISTRY.counter_function("model_registry_load_seconds_total", "載入模型累計耗時 (秒)",
+                              _registry_stat(config, "load_seconds_total"))
+
+    # 結果快取
+    REGISTRY.gauge("result_cache_bytes", "結果快取總大小 (位元組)",
+                   function=_cache_stat(config, "total_bytes"))
+    REGISTRY.counter_function("result_cache_hits_total", "結果快取命中次數", _cache_stat(config, "hits"))
+    REGISTRY.counter_function("result_cache_misses_total", "結果快取未命中次數", _cache_stat(config, "misses"))
+
+    # LLM 回應快取
+    REGISTRY.gauge("llm_cache_bytes", "LLM 回應快取總大小 (位元組)",
+                   function=_cache_stat(config, "total_bytes", get_llm_cache))
+    REGISTRY.counter_function("llm_cache_hits_total", "LLM 回應快取命中次數",
+                              _cache_stat(config, "hits", get_llm_cache))
+    REGISTRY.counter_function("llm_cache_misses_total", "LLM 回應快取未命中次數",
+                              _cache_stat(config, "misses", get_llm_cache))
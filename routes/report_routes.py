@@ -11,10 +11,14 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from models.db_models import Report, Transcript, AudioFile, ReportStatus
 from processors.report_generator import create_report_generator
+from processors.job_scheduler import get_job_scheduler, format_queue_message, JOB_TYPE_LLM
+from processors.progress_bus import get_progress_bus
+from processors.stage_metrics import latest_run_metrics
+from utils.metrics import SSE_CONNECTIONS
+from utils.ollama_client import get_ollama_client
 from app import db
 import os
 import datetime
-import requests
 import logging
 from xhtml2pdf import pisa
 import markdown
@@ -36,25 +40,9 @@ def get_available_ollama_models():
     default_models = ['無法獲得模型表格']  # 預設模型列表
 
     try:
-        # 獲取 Ollama 伺服器設定
-        ollama_host = current_app.config.get('DEFAULT_OLLAMA_HOST', 'localhost')
-        ollama_port = current_app.config.get('DEFAULT_OLLAMA_PORT', '11434')
-
-        # 構建請求 URL
-        url = f"http://{ollama_host}:{ollama_port}/api/tags"
-
-        # 發送請求
-        response = requests.get(url, timeout=3)
-
-        # 檢查回應狀態
-        if response.status_code == 200:
-            # 解析回應
-            data = response.json()
-            if 'models' in data:
-                # 提取模型名稱
-                models = [model['name'] for model in data['models']]
-                if models:
-                    return models
+        models = get_ollama_client().list_models(timeout=current_app.config.get('OLLAMA_TAGS_TIMEOUT', 3))
+        if models:
+            return models
 
         logger.warning(f"無法從 Ollama 伺服器獲取模型列表，使用預設值")
         return default_models
@@ -187,7 +175,8 @@ def generate(report_id):
     report_entry = Report.query.filter_by(id=report_id, user_id=current_user.id).first_or_404()
 
     # 如果狀態為生成中，重定向到生成進度頁面
-    if report_entry.status == ReportStatus.GENERATING and report_entry.progress > 0:
+    progress = get_progress_bus().progress(JOB_TYPE_LLM, report_id, default=report_entry.progress)
+    if report_entry.status == ReportStatus.GENERATING and progress > 0:
         return redirect(url_for('report.generating_status', report_id=report_id))
 
     # 創建報告生成器
@@ -233,10 +222,18 @@ def check_generating_status(report_id):
 
     # 生成中
     elif report_entry.status == ReportStatus.GENERATING:
+        # 檢查是否仍在排隊等待
+        queue_position = get_job_scheduler().queue_position(JOB_TYPE_LLM, report_id)
+        queue_message = format_queue_message(queue_position)
+
+        # 優先讀取進度匯流排中的最新進度 (資料庫中的進度為節流寫入)
+        progress = get_progress_bus().progress(JOB_TYPE_LLM, report_id, default=report_entry.progress)
+
         return jsonify({
             'status': 'generating',
-            'progress': report_entry.progress,
-            'message': f'生成中... {report_entry.progress:.1f}%'
+            'progress': progress,
+            'queue_position': queue_position,
+            'message': queue_message or f'生成中... {progress:.1f}%'
         })
 
     # 其他狀態
@@ -264,7 +261,7 @@ def stream_report(report_id):
     def generate_events():
         """生成 SSE 事件，優化版本一次取出所有剩餘訊息"""
         # 使用應用上下文
-        with app.app_context():
+        with app.app_context(), SSE_CONNECTIONS.track_inprogress(stream="report"):
             while True:
                 try:
                     # 檢查報告狀態，若已完成或失敗則退出
@@ -345,7 +342,8 @@ def view_report(report_id):
         audio_file=report_entry.audio_file,
         transcript=report_entry.transcript,
         markdown_content=markdown_content,
-        has_pdf=report_entry.pdf_path and os.path.exists(report_entry.pdf_path)
+        has_pdf=report_entry.pdf_path and os.path.exists(report_entry.pdf_path),
+        stage_metrics=latest_run_metrics(report_id=report_entry.id)
     )
 
 
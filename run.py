@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+網頁伺服器入口
+只有伺服器行程在啟動時恢復被中斷的工作；測試、批次處理與其他工具以 create_app() 建立的應用不會接手這些工作
+
+用法:
+    python run.py
+    gunicorn -w 1 run:app
+"""
+
+from app import create_app
+
+app = create_app({'JOB_RECOVERY_ON_STARTUP': True})
+
+
+if __name__ == '__main__':
+    # 不使用重新載入器: 監看行程也會建立應用並恢復工作，其進度與隊列位置對處理請求的子行程不可見
+    app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
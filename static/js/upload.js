@@ -134,8 +134,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 獲取最大文件大小
     function getMaxFileSize() {
-        // 從頁面獲取或使用預設值（100MB）
-        return 100 * 1024 * 1024;
+        // 從頁面獲取或使用預設值（4GB）
+        const maxSize = parseInt(document.getElementById('uploadForm').dataset.maxSize, 10);
+        return maxSize || 4 * 1024 * 1024 * 1024;
     }
 
     // 格式化檔案大小
@@ -147,39 +148,142 @@ document.addEventListener('DOMContentLoaded', function() {
         return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
     }
 
-    // 表單提交前檢查
+    // 分段上傳: 建立工作階段 -> 依序上傳分段 -> 完成上傳
+    // 上傳 ID 保存在 localStorage，連線中斷或重新整理頁面後選擇同一個檔案即可從最後收到的分段續傳
+    const MAX_CHUNK_RETRIES = 5;
+
+    function uploadStorageKey(file) {
+        return `upload:${file.name}:${file.size}:${file.lastModified}`;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    function readJson(response) {
+        return response.json().catch(() => ({})).then(data => {
+            if (!response.ok && response.status !== 409) {
+                throw new Error(data.error || `HTTP error: ${response.status}`);
+            }
+            return { status: response.status, data: data };
+        });
+    }
+
+    // 取得可續傳的工作階段，沒有時建立新的工作階段
+    function openSession(file, sessionUrl) {
+        const savedId = localStorage.getItem(uploadStorageKey(file));
+        const resume = savedId
+            ? fetch(`${sessionUrl}/${savedId}`).then(response => response.ok ? response.json() : null)
+            : Promise.resolve(null);
+
+        return resume.then(state => {
+            if (state && state.total_size === file.size) {
+                return state;
+            }
+            return ajaxRequest(sessionUrl, {
+                method: 'POST',
+                body: JSON.stringify({ filename: file.name, size: file.size })
+            }).then(state => {
+                localStorage.setItem(uploadStorageKey(file), state.upload_id);
+                return state;
+            });
+        });
+    }
+
+    // 上傳一個分段，失敗時以遞增的間隔重試；返回伺服器預期的下一個分段編號
+    async function putChunk(file, state, sessionUrl, index) {
+        const start = index * state.chunk_size;
+        const blob = file.slice(start, Math.min(start + state.chunk_size, file.size));
+
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await fetch(`${sessionUrl}/${state.upload_id}/chunks/${index}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: blob
+                });
+                const result = await readJson(response);
+                return result.status === 409 ? result.data.expected_chunk : result.data.received_chunks;
+            } catch (error) {
+                if (attempt >= MAX_CHUNK_RETRIES) {
+                    throw error;
+                }
+                setUploadStatus(`連線中斷，${attempt * 2} 秒後重試 (${attempt}/${MAX_CHUNK_RETRIES - 1})...`);
+                await sleep(attempt * 2000);
+            }
+        }
+    }
+
+    async function uploadFile(file, form) {
+        const sessionUrl = form.dataset.sessionUrl;
+        const state = await openSession(file, sessionUrl);
+
+        if (state.received_chunks > 0) {
+            setUploadStatus(`從第 ${state.received_chunks + 1} 個分段繼續上傳`);
+        }
+
+        let index = state.received_chunks;
+        while (index < state.total_chunks) {
+            index = await putChunk(file, state, sessionUrl, index);
+            setUploadProgress(Math.min(index * state.chunk_size, file.size) / file.size * 100);
+        }
+
+        // 上傳完成，將處理選項一併送出
+        const formData = new FormData(form);
+        formData.delete('audio_file');
+        const response = await fetch(`${sessionUrl}/${state.upload_id}/complete`, {
+            method: 'POST',
+            body: formData
+        });
+        const result = await readJson(response);
+
+        localStorage.removeItem(uploadStorageKey(file));
+        return result.data;
+    }
+
+    function setUploadProgress(percent) {
+        const progressBarInner = selectedFile.querySelector('.progress-bar');
+        progressBarInner.style.width = percent.toFixed(1) + '%';
+        progressBarInner.setAttribute('aria-valuenow', Math.round(percent));
+        setUploadStatus(`已上傳 ${percent.toFixed(1)}%`);
+    }
+
+    function setUploadStatus(message) {
+        const status = selectedFile.querySelector('.upload-status');
+        if (status) {
+            status.textContent = message;
+        }
+    }
+
+    // 表單提交時改用分段上傳
     const uploadForm = document.getElementById('uploadForm');
     if (uploadForm) {
         uploadForm.addEventListener('submit', function(e) {
+            e.preventDefault();
+
             if (!fileInput.files.length) {
-                e.preventDefault();
                 alert('請選擇一個音訊檔案！');
                 return false;
             }
 
             // 顯示上傳進度條
-            if (selectedFile) {
-                const progressBar = selectedFile.querySelector('.progress');
-                const progressBarInner = progressBar.querySelector('.progress-bar');
-
-                progressBar.style.display = 'block';
-
-                // 模擬上傳進度
-                let progress = 0;
-                const interval = setInterval(function() {
-                    progress += 5;
-                    progressBarInner.style.width = progress + '%';
-                    progressBarInner.setAttribute('aria-valuenow', progress);
-
-                    if (progress >= 100) {
-                        clearInterval(interval);
-                    }
-                }, 100);
-            }
+            selectedFile.querySelector('.progress').style.display = 'block';
+            setUploadProgress(0);
 
             // 禁用提交按鈕，防止重複提交
+            const originalLabel = submitBtn.innerHTML;
             submitBtn.disabled = true;
             submitBtn.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> 上傳中...';
+
+            uploadFile(fileInput.files[0], uploadForm)
+                .then(result => {
+                    window.location.href = result.redirect_url;
+                })
+                .catch(error => {
+                    setUploadStatus(`上傳失敗: ${error.message}，再次點擊「開始處理」可從中斷處繼續`);
+                    submitBtn.disabled = false;
+                    submitBtn.innerHTML = originalLabel;
+                });
         });
     }
 });
\ No newline at end of file
@@ -0,0 +1,4 @@
+"""
+單元測試
+以 pytest 執行: python -m pytest -q
+"""
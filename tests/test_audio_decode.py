@@ -0,0 +1,125 @@
+"""音訊解碼測試"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from utils import audio_decode
+from utils.audio_decode import decode_canonical, load_canonical
+
+WAVEFORM = np.linspace(-1, 1, 1600, dtype=np.float32)
+
+
+def _touch(path, mtime):
+    path.write_bytes(b"RIFF")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """在 PATH 中放入以 Python 實作的 ffmpeg，輸出固定的 float32 波形；exit_code 不為 0 時模擬解碼失敗"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    data_path = tmp_path / "waveform.f32"
+    WAVEFORM.astype("<f4").tofile(data_path)
+
+    def install(exit_code=0):
+        script = bin_dir / "ffmpeg"
+        script.write_text(
+            f"#!{sys.executable}\n"
+            "import sys\n"
+            f"if {exit_code}:\n"
+            "    sys.stderr.write('invalid data\\n')\n"
+            f"    sys.exit({exit_code})\n"
+            f"sys.stdout.buffer.write(open({str(data_path)!r}, 'rb').read())\n"
+        )
+        script.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    return install
+
+
+def test_ffmpeg_decode_streams_to_cache(tmp_path, fake_ffmpeg):
+    """ffmpeg 解碼結果寫入暫存檔並以 memmap 返回，不留下 .part 檔案"""
+    fake_ffmpeg()
+    source = _touch(tmp_path / "a.wav", 1000)
+    cache_path = str(tmp_path / "a.f32")
+
+    waveform = decode_canonical(source, cache_path)
+
+    assert isinstance(waveform, np.memmap)
+    np.testing.assert_array_equal(waveform, WAVEFORM)
+    assert not os.path.exists(f"{cache_path}.part")
+
+
+def test_ffmpeg_decode_without_cache(tmp_path, fake_ffmpeg):
+    """未提供暫存檔路徑時返回記憶體中的波形"""
+    fake_ffmpeg()
+    waveform = decode_canonical(_touch(tmp_path / "a.wav", 1000))
+    np.testing.assert_array_equal(waveform, WAVEFORM)
+
+
+def test_reuses_cache_newer_than_source(tmp_path, monkeypatch):
+    """暫存檔比音訊檔案新時直接載入，不重新解碼"""
+    source = _touch(tmp_path / "a.wav", 1000)
+    cache_path = tmp_path / "a.f32"
+    WAVEFORM.astype("<f4").tofile(cache_path)
+    os.utime(cache_path, (2000, 2000))
+
+    def fail(*args):
+        raise AssertionError("不應重新解碼")
+
+    monkeypatch.setattr(audio_decode, "_decode_with_ffmpeg", fail)
+
+    np.testing.assert_array_equal(decode_canonical(source, str(cache_path)), WAVEFORM)
+
+
+def test_stale_cache_is_decoded_again(tmp_path, monkeypatch):
+    """音訊檔案比暫存檔新時重新解碼"""
+    source = _touch(tmp_path / "a.wav", 2000)
+    cache_path = tmp_path / "a.f32"
+    np.zeros(10, dtype="<f4").tofile(cache_path)
+    os.utime(cache_path, (1000, 1000))
+
+    calls = []
+    monkeypatch.setattr(audio_decode, "_decode_with_ffmpeg",
+                        lambda path, cache, sample_rate: calls.append((path, cache)) or WAVEFORM)
+
+    assert decode_canonical(source, str(cache_path)) is WAVEFORM
+    assert calls == [(source, str(cache_path))]
+
+
+@pytest.mark.parametrize("error", [
+    FileNotFoundError("ffmpeg"),
+    subprocess.CalledProcessError(1, ["ffmpeg"], stderr=b"invalid data"),
+])
+def test_falls_back_to_librosa(tmp_path, monkeypatch, error):
+    """找不到 ffmpeg 或 ffmpeg 解碼失敗時改用 librosa"""
+    def ffmpeg(*args):
+        raise error
+
+    calls = []
+    monkeypatch.setattr(audio_decode, "_decode_with_ffmpeg", ffmpeg)
+    monkeypatch.setattr(audio_decode, "_decode_with_librosa",
+                        lambda path, cache, sample_rate: calls.append(sample_rate) or WAVEFORM)
+
+    assert decode_canonical(_touch(tmp_path / "a.wav", 1000)) is WAVEFORM
+    assert calls == [audio_decode.CANONICAL_SAMPLE_RATE]
+
+
+def test_ffmpeg_failure_falls_back(tmp_path, fake_ffmpeg, monkeypatch):
+    """ffmpeg 返回錯誤碼時改用 librosa 解碼"""
+    fake_ffmpeg(exit_code=1)
+    monkeypatch.setattr(audio_decode, "_decode_with_librosa", lambda path, cache, sample_rate: WAVEFORM)
+
+    assert decode_canonical(_touch(tmp_path / "a.wav", 1000), str(tmp_path / "a.f32")) is WAVEFORM
+
+
+def test_load_empty_cache(tmp_path):
+    """空的暫存檔載入為空波形"""
+    path = tmp_path / "empty.f32"
+    path.write_bytes(b"")
+    assert len(load_canonical(str(path))) == 0
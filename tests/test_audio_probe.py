@@ -0,0 +1,126 @@
+"""音訊探測測試 (以標頭解析取得時長，不解碼音訊)"""
+import struct
+import wave
+
+import pytest
+
+from utils.audio_probe import clear_probe_cache, probe_audio, sniff_audio_format
+
+# MPEG-1 Layer III、128 kbps、44.1 kHz、立體聲的影格標頭 (每個影格 417 bytes、1152 個取樣)
+_MP3_HEADER = b'\xff\xfb\x90\x00'
+_MP3_FRAME_LENGTH = 417
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    clear_probe_cache()
+    yield
+    clear_probe_cache()
+
+
+def _write_wav(path, seconds, sample_rate=16000, channels=1):
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b'\x00\x00' * channels * int(seconds * sample_rate))
+    return str(path)
+
+
+def _mp3_frame(payload=b''):
+    return _MP3_HEADER + payload + b'\x00' * (_MP3_FRAME_LENGTH - 4 - len(payload))
+
+
+def test_wav_header(tmp_path):
+    """WAV 由 fmt 與 data 區塊計算時長"""
+    info = probe_audio(_write_wav(tmp_path / "a.wav", 2.5, sample_rate=8000, channels=2))
+
+    assert info["format"] == "wav"
+    assert info["source"] == "header"
+    assert info["sample_rate"] == 8000
+    assert info["n_channels"] == 2
+    assert info["sample_width"] == 2
+    assert info["n_frames"] == 20000
+    assert info["duration"] == pytest.approx(2.5)
+
+
+def test_wav_with_unset_data_size(tmp_path):
+    """串流寫入、資料長度為 0 的 WAV 以檔案大小計算時長"""
+    path = _write_wav(tmp_path / "stream.wav", 1.0)
+    with open(path, 'r+b') as f:
+        data = f.read()
+        f.seek(data.index(b'data') + 4)
+        f.write(struct.pack('<I', 0))
+
+    assert probe_audio(path)["duration"] == pytest.approx(1.0)
+
+
+def test_flac_streaminfo(tmp_path):
+    """FLAC 由 STREAMINFO 的總取樣數計算時長"""
+    sample_rate, channels, bits, total = 44100, 2, 16, 44100 * 3
+    streaminfo = bytearray(34)
+    streaminfo[10] = (sample_rate >> 12) & 0xFF
+    streaminfo[11] = (sample_rate >> 4) & 0xFF
+    streaminfo[12] = ((sample_rate & 0x0F) << 4) | ((channels - 1) << 1) | ((bits - 1) >> 4)
+    streaminfo[13] = (((bits - 1) & 0x0F) << 4) | ((total >> 32) & 0x0F)
+    streaminfo[14:18] = struct.pack('>I', total & 0xFFFFFFFF)
+
+    path = tmp_path / "a.flac"
+    path.write_bytes(b'fLaC' + bytes([0x80, 0, 0, 34]) + bytes(streaminfo))
+
+    info = probe_audio(str(path))
+    assert info["format"] == "flac"
+    assert info["sample_rate"] == sample_rate
+    assert info["n_channels"] == channels
+    assert info["duration"] == pytest.approx(3.0)
+
+
+def test_cbr_mp3_with_id3(tmp_path):
+    """沒有 Xing 標頭的 MP3 以位元率與資料大小估算時長，並略過 ID3v2 標籤"""
+    id3 = b'ID3\x03\x00\x00\x00\x00\x00\x0a' + b'\x00' * 10
+    frames = _mp3_frame() * 100
+    path = tmp_path / "a.mp3"
+    path.write_bytes(id3 + frames)
+
+    info = probe_audio(str(path))
+    assert info["format"] == "mp3"
+    assert info["sample_rate"] == 44100
+    assert info["duration"] == pytest.approx(len(frames) * 8 / 128000)
+
+
+def test_vbr_mp3_xing_frame_count(tmp_path):
+    """有 Xing 標頭時以影格數計算時長"""
+    xing = b'\x00' * 32 + b'Xing' + struct.pack('>I', 1) + struct.pack('>I', 500)
+    path = tmp_path / "vbr.mp3"
+    path.write_bytes(_mp3_frame(xing) + _mp3_frame() * 10)
+
+    assert probe_audio(str(path))["duration"] == pytest.approx(500 * 1152 / 44100)
+
+
+def test_cache_invalidated_when_file_changes(tmp_path):
+    """檔案內容改變 (大小不同) 時重新探測"""
+    path = tmp_path / "a.wav"
+    _write_wav(path, 1.0)
+    assert probe_audio(str(path))["duration"] == pytest.approx(1.0)
+
+    _write_wav(path, 2.0)
+    assert probe_audio(str(path))["duration"] == pytest.approx(2.0)
+
+
+def test_missing_file(tmp_path):
+    """檔案不存在時返回 None"""
+    assert probe_audio(str(tmp_path / "missing.wav")) is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    (b'RIFF\x00\x00\x00\x00WAVE', 'wav'),
+    (b'OggS\x00\x02' + b'\x00' * 6, 'ogg'),
+    (b'\x00\x00\x00\x20ftypM4A ', 'mp4'),
+    (b'fLaC\x00\x00\x00\x22' + b'\x00' * 4, 'flac'),
+    (b'ID3\x03\x00\x00\x00\x00\x00\x0a\x00\x00', 'mp3'),
+    (_MP3_HEADER + b'\x00' * 8, 'mp3'),
+    (b'<html><body>', None),
+])
+def test_sniff_audio_format(header, expected):
+    """依檔案開頭的位元組判斷容器格式"""
+    assert sniff_audio_format(header) == expected
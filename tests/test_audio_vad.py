@@ -0,0 +1,69 @@
+"""語音活動偵測測試"""
+import numpy as np
+import pytest
+
+from utils.audio_vad import frame_energies, split_on_silence
+
+SAMPLE_RATE = 16000
+
+
+def _tone(seconds, amplitude, frequency=220.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def _recording():
+    """大聲說話 10 秒、小聲說話 10 秒 (約 -50 dB)、只有背景噪音 10 秒 (約 -60 dB)"""
+    rng = np.random.default_rng(0)
+    speech = np.concatenate([_tone(10, 0.5), _tone(10, 0.0045), np.zeros(10 * SAMPLE_RATE, dtype=np.float32)])
+    noise = rng.normal(0, 0.001, len(speech)).astype(np.float32)
+    return speech + noise
+
+
+def _windows_within(windows, start_seconds, end_seconds):
+    return [w for w in windows
+            if w["start"] >= start_seconds * SAMPLE_RATE and w["end"] <= end_seconds * SAMPLE_RATE]
+
+
+def test_windows_cover_waveform():
+    """視窗依序相連並涵蓋整段波形，長度不超過上限"""
+    waveform = _recording()
+    windows = split_on_silence(waveform, SAMPLE_RATE, max_window_seconds=10)
+
+    assert windows[0]["start"] == 0
+    assert windows[-1]["end"] == len(waveform)
+    for previous, current in zip(windows, windows[1:]):
+        assert previous["end"] == current["start"]
+    assert all(w["end"] - w["start"] <= 10 * SAMPLE_RATE + 480 for w in windows)
+
+
+def test_low_level_speech_is_not_silent():
+    """低於語音門檻的小聲說話不標記為靜音，只有背景噪音的視窗才標記為靜音"""
+    windows = split_on_silence(_recording(), SAMPLE_RATE, max_window_seconds=4, min_window_seconds=2)
+
+    quiet = _windows_within(windows, 10.5, 19.5)
+    noise = _windows_within(windows, 20.5, 30)
+    assert quiet and noise
+
+    # 小聲說話全部低於門檻 (語音比例為 0)，但仍應保留給 Whisper 轉錄
+    assert all(w["speech_ratio"] == 0 for w in quiet)
+    assert not any(w["silent"] for w in quiet)
+    assert all(w["silent"] for w in noise)
+    assert not any(w["silent"] for w in _windows_within(windows, 0, 9.5))
+
+
+def test_digital_silence():
+    """完全靜音不會產生 -inf，整段標記為靜音"""
+    waveform = np.zeros(5 * SAMPLE_RATE, dtype=np.float32)
+
+    assert np.isfinite(frame_energies(waveform, 480)).all()
+    windows = split_on_silence(waveform, SAMPLE_RATE, max_window_seconds=10)
+    assert len(windows) == 1
+    assert windows[0]["silent"]
+
+
+@pytest.mark.parametrize("length", [0, 100])
+def test_short_waveforms(length):
+    """空波形不產生視窗，不足一個影格的波形產生一個視窗"""
+    windows = split_on_silence(np.zeros(length, dtype=np.float32), SAMPLE_RATE)
+    assert len(windows) == (1 if length else 0)
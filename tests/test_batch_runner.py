@@ -0,0 +1,237 @@
+"""批次處理器測試"""
+import datetime
+import json
+import socket
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_migrate")
+pytest.importorskip("flask_login")
+
+from flask import Flask  # noqa: E402
+
+from extensions import db  # noqa: E402
+from models.db_models import AudioFile, Job, JobState, ProcessingStatus, Report, ReportStatus, Transcript  # noqa: E402
+from models.user import User  # noqa: E402
+from processors import batch_runner, job_scheduler  # noqa: E402
+from processors.batch_runner import BatchLog, BatchRunner, discover_audio_files  # noqa: E402
+from processors.job_scheduler import JOB_TYPE_AUDIO, JOB_TYPE_LLM, JobScheduler, register_job_handler  # noqa: E402
+
+ALLOWED = {"wav", "mp3"}
+
+# 本機上不存在的行程
+_DEAD_OWNER = f"{socket.gethostname()}:2147483646:dead"
+
+
+def _touch(path, content=b"audio"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_discover_directories_and_extensions(tmp_path):
+    """目錄只列出允許格式的檔案，指定遞迴時才搜尋子目錄"""
+    top = _touch(tmp_path / "a.wav")
+    _touch(tmp_path / "notes.txt")
+    nested = _touch(tmp_path / "sub" / "b.MP3")
+
+    assert discover_audio_files([str(tmp_path)], ALLOWED) == [top]
+    assert discover_audio_files([str(tmp_path)], ALLOWED, recursive=True) == sorted([top, nested])
+
+
+def test_discover_globs_deduplicates(tmp_path):
+    """萬用字元展開後去除重複並排序，** 只在遞迴時比對子目錄"""
+    first = _touch(tmp_path / "2023-01.wav")
+    second = _touch(tmp_path / "2023-02.mp3")
+    _touch(tmp_path / "2024-01.wav")
+    nested = _touch(tmp_path / "old" / "2023-03.wav")
+
+    found = discover_audio_files([str(tmp_path / "2023-*"), first], ALLOWED)
+    assert found == [first, second]
+    assert nested in discover_audio_files([str(tmp_path / "**" / "2023-*")], ALLOWED, recursive=True)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'batch.db'}",
+        UPLOAD_FOLDER=str(tmp_path / "uploads"),
+        DEFAULT_WHISPER_MODEL="base",
+        DEFAULT_SYSTEM_PROMPT="摘要",
+        DEFAULT_OLLAMA_MODEL="llama3",
+    )
+    db.init_app(app)
+
+    scheduler = JobScheduler(app, {JOB_TYPE_AUDIO: 1, JOB_TYPE_LLM: 1},
+                             lease_timeout=120, heartbeat_interval=60, max_attempts=3)
+    monkeypatch.setattr(job_scheduler, "_scheduler", scheduler)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email="me@example.com", name="me", password="x"))
+        db.session.commit()
+        yield app
+
+    scheduler.shutdown(timeout=5)
+
+
+@pytest.fixture
+def audio_handler():
+    """以立即完成處理的函數取代音訊工作，記錄執行的參數"""
+    calls = []
+    original = job_scheduler._job_handlers.get(JOB_TYPE_AUDIO)
+
+    def run(audio_file_id, **payload):
+        calls.append((audio_file_id, payload))
+        audio_file = db.session.get(AudioFile, audio_file_id)
+        audio_file.status = ProcessingStatus.COMPLETED
+        db.session.add(Transcript(audio_file_id=audio_file_id, speakers_count=2))
+        db.session.commit()
+
+    register_job_handler(JOB_TYPE_AUDIO, run)
+    yield calls
+    job_scheduler._job_handlers[JOB_TYPE_AUDIO] = original
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """記錄提交的音訊處理與報告生成，提交後直接交給排程器的已註冊處理函數"""
+    calls = {"audio": [], "report": []}
+
+    class _Processor:
+        def __init__(self, audio_file_id):
+            self.audio_file_id = audio_file_id
+
+        def process_async(self):
+            calls["audio"].append(self.audio_file_id)
+            job_scheduler._scheduler.submit(JOB_TYPE_AUDIO, self.audio_file_id, payload={"mode": "full"})
+
+    class _Generator:
+        def __init__(self, report_id):
+            self.report_id = report_id
+
+        def generate_async(self):
+            calls["report"].append(self.report_id)
+            db.session.get(Report, self.report_id).status = ReportStatus.COMPLETED
+            db.session.commit()
+
+    monkeypatch.setattr(batch_runner, "create_audio_processor", _Processor)
+    monkeypatch.setattr(batch_runner, "create_report_generator", _Generator)
+    return calls
+
+
+def _runner(app, tmp_path, **kwargs):
+    user = User.query.first()
+    log = BatchLog(str(tmp_path / "batch.jsonl"))
+    return BatchRunner(app, user, log, poll_interval=0.05, **kwargs), log
+
+
+def _events(tmp_path):
+    with open(tmp_path / "batch.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _add_audio(path, status, error_message=None):
+    from utils.file_utils import file_sha256
+
+    audio_file = AudioFile(filename="a.wav", original_filename="a.wav", file_path=path, file_size=5,
+                           content_hash=file_sha256(path), whisper_model="base", status=status,
+                           error_message=error_message, user_id=User.query.first().id)
+    db.session.add(audio_file)
+    db.session.commit()
+    return audio_file.id
+
+
+def test_new_recording_is_registered_and_processed(app, tmp_path, audio_handler, submitted):
+    """新的錄音登記到上傳目錄並提交處理"""
+    path = _touch(tmp_path / "in" / "a.wav")
+    runner, log = _runner(app, tmp_path)
+
+    summary = runner.run([path])
+    log.close()
+
+    assert summary["completed"] == 1
+    audio_file = AudioFile.query.one()
+    assert audio_file.file_path.startswith(app.config["UPLOAD_FOLDER"])
+    assert submitted["audio"] == [audio_file.id]
+    assert [e["event"] for e in _events(tmp_path)][:3] == ["start", "registered", "submitted"]
+
+
+def test_completed_recording_is_skipped(app, tmp_path, submitted):
+    """已處理完成的錄音略過，不重新提交"""
+    path = _touch(tmp_path / "in" / "a.wav")
+    _add_audio(path, ProcessingStatus.COMPLETED)
+    runner, log = _runner(app, tmp_path)
+
+    summary = runner.run([path])
+    log.close()
+
+    assert summary["skipped"] == 1
+    assert submitted["audio"] == []
+
+
+def test_completed_recording_only_generates_report(app, tmp_path, submitted):
+    """已轉錄但沒有報告的錄音只生成報告"""
+    path = _touch(tmp_path / "in" / "a.wav")
+    audio_file_id = _add_audio(path, ProcessingStatus.COMPLETED)
+    db.session.add(Transcript(audio_file_id=audio_file_id))
+    db.session.commit()
+    runner, log = _runner(app, tmp_path, report_options={"title_prefix": "會議"})
+
+    summary = runner.run([path])
+    log.close()
+
+    assert summary["reports"] == 1
+    assert submitted["audio"] == []
+    assert Report.query.one().title == "會議 - a"
+
+
+@pytest.mark.parametrize("retry_failed", [False, True])
+def test_failed_recording_retried_only_when_requested(app, tmp_path, audio_handler, submitted, retry_failed):
+    """先前失敗的錄音預設略過，指定重試時重新提交處理"""
+    path = _touch(tmp_path / "in" / "a.wav")
+    audio_file_id = _add_audio(path, ProcessingStatus.FAILED, error_message="解碼失敗")
+    runner, log = _runner(app, tmp_path, retry_failed=retry_failed)
+
+    summary = runner.run([path])
+    log.close()
+
+    if retry_failed:
+        assert submitted["audio"] == [audio_file_id]
+        assert summary["completed"] == 1
+    else:
+        assert submitted["audio"] == []
+        assert summary["skipped"] == 1
+
+
+def test_rerun_resumes_interrupted_recordings(app, tmp_path, audio_handler, submitted):
+    """
+    中斷後重新執行時，已結束行程遺留的工作以原本的參數重新排入，
+    沒有進行中工作記錄的錄音重新提交，兩者都會完成而不是無限等待
+    """
+    abandoned_path = _touch(tmp_path / "in" / "a.wav", b"first")
+    released_path = _touch(tmp_path / "in" / "b.wav", b"second")
+
+    # 上次執行被中斷後遺留的狀態: 一個錄音的工作持有者已結束，另一個錄音沒有進行中的工作記錄
+    abandoned_id = _add_audio(abandoned_path, ProcessingStatus.PROCESSING)
+    released_id = _add_audio(released_path, ProcessingStatus.PROCESSING)
+    db.session.add(Job(job_type=JOB_TYPE_AUDIO, target_id=abandoned_id, state=JobState.RUNNING, attempts=1,
+                       lease_owner=_DEAD_OWNER, payload=json.dumps({"mode": "full"}),
+                       heartbeat_at=datetime.datetime.utcnow()))
+    db.session.add(Job(job_type=JOB_TYPE_AUDIO, target_id=released_id, state=JobState.FAILED, attempts=1))
+    db.session.commit()
+
+    runner, log = _runner(app, tmp_path)
+    summary = runner.run([abandoned_path, released_path])
+    log.close()
+
+    assert summary["completed"] == 2
+    assert sorted(audio_handler) == [(abandoned_id, {"mode": "full"}), (released_id, {"mode": "full"})]
+    assert submitted["audio"] == [released_id]
+
+    events = [e["event"] for e in _events(tmp_path)]
+    assert "recovered" in events
+    assert "resubmitted" in events
@@ -0,0 +1,32 @@
+"""說話者分群試算結果保存測試"""
+import pytest
+
+pytest.importorskip("numpy")
+
+from processors.diarization_state import (  # noqa: E402
+    DiarizationStateException, candidates_path_for, load_candidates, save_candidates
+)
+
+
+def test_candidates_round_trip(tmp_path):
+    """試算結果保存在中間結果旁，讀取後內容不變"""
+    state_path = str(tmp_path / "meeting_diarization.npz")
+    path = candidates_path_for(state_path)
+    assert path == str(tmp_path / "meeting_diarization_candidates.json")
+
+    candidates = [{"num_speakers": 2, "detected": 2,
+                   "speakers": [{"label": "SPEAKER_00", "duration": 12.5, "share": 0.625},
+                                {"label": "SPEAKER_01", "duration": 7.5, "share": 0.375}]}]
+    save_candidates(candidates, path)
+
+    assert load_candidates(path) == candidates
+
+
+def test_missing_and_corrupt_candidates(tmp_path):
+    """尚未試算時返回 None，檔案損壞時拋出異常"""
+    path = tmp_path / "meeting_diarization_candidates.json"
+    assert load_candidates(str(path)) is None
+
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(DiarizationStateException):
+        load_candidates(str(path))
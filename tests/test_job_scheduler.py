@@ -0,0 +1,110 @@
+"""工作排程器恢復中斷工作的測試"""
+import datetime
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_migrate")
+
+from flask import Flask  # noqa: E402
+
+from extensions import db  # noqa: E402
+from models.db_models import Job, JobState  # noqa: E402
+from processors import job_scheduler  # noqa: E402
+from processors.job_scheduler import JobScheduler, register_job_handler  # noqa: E402
+
+JOB_TYPE = "test"
+
+# 本機上不存在的行程
+_DEAD_OWNER = f"{socket.gethostname()}:2147483646:dead"
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[Job.__table__])
+    yield app
+
+
+@pytest.fixture
+def handler_calls():
+    """註冊測試用的工作類型，記錄每次執行的參數"""
+    calls = []
+    done = threading.Event()
+    failed = []
+
+    def run(target_id, **payload):
+        calls.append((target_id, payload))
+        done.set()
+
+    register_job_handler(JOB_TYPE, run, on_failed=lambda target_id, message: failed.append(target_id))
+    yield calls, done, failed
+    job_scheduler._job_handlers.pop(JOB_TYPE, None)
+
+
+def _add_job(target_id, owner, attempts=1, heartbeat_age=0, payload=None):
+    job = Job(job_type=JOB_TYPE, target_id=target_id, state=JobState.RUNNING, attempts=attempts,
+              lease_owner=owner, payload=json.dumps(payload) if payload else None,
+              heartbeat_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=heartbeat_age))
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_recovers_abandoned_jobs(app, handler_calls):
+    """已結束行程遺留的工作以原本的參數重新執行，超過重試次數者標記失敗，存活行程的工作不受影響"""
+    calls, done, failed = handler_calls
+    scheduler = JobScheduler(app, {JOB_TYPE: 1}, lease_timeout=120, heartbeat_interval=60, max_attempts=3)
+
+    with app.app_context():
+        requeued_id = _add_job(1, _DEAD_OWNER, payload={"mode": "rediarize"})
+        exhausted_id = _add_job(2, _DEAD_OWNER, attempts=3)
+        alive_id = _add_job(3, "other-host:1:alive")
+
+        assert scheduler.recover_abandoned_jobs() == 2
+
+    try:
+        assert done.wait(10)
+        assert calls == [(1, {"mode": "rediarize"})]
+        assert failed == [2]
+
+        with app.app_context():
+            for _ in range(100):
+                if db.session.get(Job, requeued_id).state == JobState.COMPLETED:
+                    break
+                db.session.expire_all()
+                time.sleep(0.05)
+
+            requeued = db.session.get(Job, requeued_id)
+            assert requeued.state == JobState.COMPLETED
+            assert requeued.attempts == 2
+            assert db.session.get(Job, exhausted_id).state == JobState.FAILED
+
+            alive = db.session.get(Job, alive_id)
+            assert alive.state == JobState.RUNNING
+            assert alive.lease_owner == "other-host:1:alive"
+    finally:
+        scheduler.shutdown(timeout=5)
+
+
+def test_stale_heartbeat_is_recovered(app, handler_calls):
+    """其他主機上的工作心跳逾時後視為遺留工作"""
+    calls, done, _ = handler_calls
+    scheduler = JobScheduler(app, {JOB_TYPE: 1}, lease_timeout=120, heartbeat_interval=60, max_attempts=3)
+
+    with app.app_context():
+        _add_job(4, "other-host:1:stale", heartbeat_age=600)
+        assert scheduler.recover_abandoned_jobs() == 1
+
+    try:
+        assert done.wait(10)
+        assert calls == [(4, {})]
+    finally:
+        scheduler.shutdown(timeout=5)
@@ -0,0 +1,59 @@
+"""LLM 回應快取測試"""
+import os
+import time
+
+from processors.llm_cache import LLMResponseCache, is_deterministic, make_llm_cache_key
+
+
+def test_is_deterministic():
+    """只有設定 seed 或 temperature 為 0 的請求可以使用快取"""
+    assert is_deterministic({"seed": 42, "temperature": 0.7})
+    assert is_deterministic({"temperature": 0})
+    assert not is_deterministic({"temperature": 0.7})
+    assert not is_deterministic(None)
+
+
+def test_key_ignores_option_order():
+    """生成參數的順序不影響快取鍵，內容不同時快取鍵不同"""
+    key = make_llm_cache_key("llama3", "系統", "逐字稿", {"seed": 1, "num_ctx": 4096})
+    assert key == make_llm_cache_key("llama3", "系統", "逐字稿", {"num_ctx": 4096, "seed": 1})
+    assert key != make_llm_cache_key("llama3", "系統", "逐字稿", {"seed": 2, "num_ctx": 4096})
+    assert key != make_llm_cache_key("qwen2", "系統", "逐字稿", {"seed": 1, "num_ctx": 4096})
+
+
+def test_put_get_and_evict(tmp_path):
+    """存入的項目可以查詢，超過大小上限時淘汰最久未使用的項目"""
+    cache = LLMResponseCache(str(tmp_path), max_bytes=600)
+    chunks = ["x" * 150]
+    cache.put("k1", "llama3", chunks, {"done": True})
+    cache.put("k2", "llama3", chunks, {"done": True})
+
+    entry = cache.get("k1")
+    assert entry["chunks"] == chunks
+    assert entry["final_chunk"] == {"done": True}
+
+    cache.put("k3", "llama3", chunks, {"done": True})
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_reload_keeps_recent_part_files(tmp_path):
+    """重新建立快取時只刪除過期的暫存檔，其他行程正在寫入的暫存檔與無關檔案保留"""
+    LLMResponseCache(str(tmp_path)).put("k1", "llama3", ["a"], {"done": True})
+
+    stale = tmp_path / "k2.json.1.part"
+    fresh = tmp_path / "k3.json.2.part"
+    other = tmp_path / "README"
+    for path in (stale, fresh, other):
+        path.write_text("{", encoding="utf-8")
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+
+    cache = LLMResponseCache(str(tmp_path))
+
+    assert cache.stats()["entries"] == 1
+    assert not stale.exists()
+    assert fresh.exists()
+    assert other.exists()
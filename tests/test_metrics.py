@@ -0,0 +1,122 @@
+"""應用程式指標與 /metrics 端點測試"""
+import pytest
+
+from utils.metrics import MetricsRegistry
+
+
+def _lines(registry):
+    return registry.expose().splitlines()
+
+
+def test_counter_with_escaped_labels():
+    """計數器輸出 HELP/TYPE 行，標籤值中的反斜線、雙引號與換行被跳脫"""
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "請求次數", ("path",))
+    counter.inc(path='a"b\\c\nd')
+    counter.labels(path="/x").inc(2)
+
+    lines = _lines(registry)
+    assert lines[:2] == ["# HELP requests_total 請求次數", "# TYPE requests_total counter"]
+    assert 'requests_total{path="a\\"b\\\\c\\nd"} 1' in lines
+    assert 'requests_total{path="/x"} 2' in lines
+    assert counter.value(path="/x") == 2
+
+
+def test_labels_must_match():
+    """標籤名稱不符時拋出 ValueError，同名指標不可註冊為不同類型"""
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "工作數", ("job_type",))
+    with pytest.raises(ValueError):
+        counter.inc(stage="x")
+    with pytest.raises(ValueError):
+        registry.gauge("jobs_total", "工作數")
+    assert registry.counter("jobs_total", "工作數", ("job_type",)) is counter
+
+
+def test_histogram_buckets_sum_and_count():
+    """直方圖輸出累積的 _bucket (含 +Inf)、_sum 與 _count"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "延遲", ("api",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, api="chat")
+
+    lines = _lines(registry)
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{api="chat",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{api="chat",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{api="chat",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{api="chat"} 3.65' in lines
+    assert 'latency_seconds_count{api="chat"} 4' in lines
+
+
+def test_function_metrics():
+    """量測值與計數器函數在輸出時才取值，返回 None 的量測值不輸出，取值失敗時只略過該指標"""
+    registry = MetricsRegistry()
+    registry.gauge("queue_depth", "隊列長度", ("job_type",), function=lambda: {("audio",): 3, ("llm",): 0})
+    registry.gauge("cache_bytes", "快取大小", function=lambda: None)
+    registry.counter_function("loads_total", "載入次數", lambda: 7)
+    registry.counter_function("broken_total", "取值失敗", lambda: 1 / 0)
+
+    lines = _lines(registry)
+    assert 'queue_depth{job_type="audio"} 3' in lines
+    assert 'queue_depth{job_type="llm"} 0' in lines
+    assert not any(line.startswith("cache_bytes ") for line in lines)
+    assert "# TYPE loads_total counter" in lines
+    assert "loads_total 7" in lines
+    assert any(line.startswith("# 指標 broken_total 輸出失敗") for line in lines)
+
+
+def test_gauge_tracks_inprogress():
+    """track_inprogress 在區塊執行期間將量測值加一"""
+    registry = MetricsRegistry()
+    gauge = registry.gauge("sse_connections", "連線數", ("stream",))
+    with gauge.track_inprogress(stream="report"):
+        assert 'sse_connections{stream="report"} 1' in _lines(registry)
+    assert 'sse_connections{stream="report"} 0' in _lines(registry)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    pytest.importorskip("flask_sqlalchemy")
+    pytest.importorskip("flask_migrate")
+    from flask import Flask
+
+    from processors import job_scheduler, model_registry
+    from routes.metrics_routes import init_metrics
+
+    # 不影響其他測試使用的共享實例
+    monkeypatch.setattr(job_scheduler, "_scheduler", None)
+    monkeypatch.setattr(model_registry, "_registry", None)
+
+    app = Flask(__name__)
+    app.config.update(RESULT_CACHE_ENABLED=False, LLM_CACHE_ENABLED=False, METRICS_TOKEN=None)
+
+    @app.route('/ping')
+    def ping():
+        return "ok"
+
+    init_metrics(app)
+    return app.test_client()
+
+
+def test_metrics_endpoint(client):
+    """/metrics 返回 200 與 Prometheus 文字格式，並記錄其他請求的處理時間"""
+    assert client.get('/ping').status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+
+    body = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="ping",status="200"}' in body
+    assert 'job_workers{job_type="audio"}' in body
+
+
+def test_metrics_endpoint_requires_token(client):
+    """設定 METRICS_TOKEN 時需要正確的 Bearer token"""
+    client.application.config["METRICS_TOKEN"] = "secret"
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get('/metrics', headers={"Authorization": "Bearer secret"}).status_code == 200
@@ -0,0 +1,94 @@
+"""模型註冊表測試"""
+import threading
+import time
+
+from processors.model_registry import ModelRegistry
+
+
+class _FakeWhisper:
+    """記錄同時執行 transcribe 的線程數量"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    def transcribe(self, audio, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls += 1
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return {"text": audio}
+
+
+def _registry(factory):
+    registry = ModelRegistry()
+    registry.register_loader('whisper', lambda name, device, dtype=None, **kwargs: factory(name))
+    return registry
+
+
+def _run_threads(target, count=2):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads)
+
+
+def test_same_entry_is_shared_and_serialized():
+    """兩個線程取得同一模型時共用同一物件，且 transcribe 不會同時執行"""
+    registry = _registry(lambda name: _FakeWhisper())
+    models = []
+    start = threading.Barrier(2)
+
+    def job():
+        model = registry.acquire('whisper', 'base', 'cpu')
+        models.append(model)
+        start.wait(timeout=5)
+        try:
+            for _ in range(3):
+                with registry.exclusive(model):
+                    model.transcribe("audio")
+        finally:
+            registry.release(model)
+
+    _run_threads(job)
+
+    assert models[0] is models[1]
+    assert models[0].calls == 6
+    assert models[0].max_active == 1
+    assert registry.stats()["misses"] == 1
+
+
+def test_different_entries_run_concurrently():
+    """不同模型項目各自有鎖，可以同時推論"""
+    registry = _registry(lambda name: _FakeWhisper())
+    both_inside = threading.Barrier(2)
+    reached = []
+
+    def job(name):
+        with registry.use('whisper', name, 'cpu') as model, registry.exclusive(model):
+            # 兩個線程都必須同時位於 exclusive 區塊內才能通過
+            both_inside.wait(timeout=5)
+            reached.append(name)
+
+    threads = [threading.Thread(target=job, args=(name,)) for name in ("base", "small")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert sorted(reached) == ["base", "small"]
+
+
+def test_exclusive_on_unmanaged_model():
+    """不是由註冊表管理的模型直接使用"""
+    registry = ModelRegistry()
+    model = _FakeWhisper()
+    with registry.exclusive(model) as used:
+        assert used is model
@@ -0,0 +1,76 @@
+"""Ollama 客戶端測試 (以本機 HTTP 伺服器模擬 Ollama 串流回應)"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from utils.ollama_client import OllamaClient, OllamaClientException  # noqa: E402
+
+
+def _ndjson(*chunks):
+    return b"".join(json.dumps(chunk).encode("utf-8") + b"\n" for chunk in chunks)
+
+
+@pytest.fixture
+def ollama_server():
+    """啟動回傳指定內容的 /api/generate 伺服器，返回 (客戶端, 設定回應內容的函數)"""
+    state = {"body": b""}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(state["body"])))
+            self.end_headers()
+            self.wfile.write(state["body"])
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    client = OllamaClient("127.0.0.1", server.server_address[1], read_timeout=5.0, max_retries=0)
+    yield client, lambda body: state.update(body=body)
+
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_complete_stream(ollama_server):
+    """收到 done 回應時返回完整輸出"""
+    client, respond = ollama_server
+    respond(_ndjson({"response": "你好", "done": False},
+                    {"response": "，世界", "done": False},
+                    {"response": "", "done": True, "eval_count": 2}))
+
+    chunks = []
+    result = client.generate("llama3", "hi", on_chunk=lambda chunk, count: chunks.append(chunk))
+
+    assert result["content"] == "你好，世界"
+    assert chunks == ["你好", "，世界"]
+    assert result["final_chunk"]["eval_count"] == 2
+
+
+def test_truncated_stream_raises(ollama_server):
+    """串流在 done 回應之前結束時拋出異常，而不是返回不完整的輸出"""
+    client, respond = ollama_server
+    respond(_ndjson({"response": "你好", "done": False}) + b'{"response": "partial')
+
+    with pytest.raises(OllamaClientException, match="完成前結束"):
+        client.generate("llama3", "hi")
+
+
+def test_error_chunk_raises(ollama_server):
+    """Ollama 在串流中回報錯誤時拋出異常"""
+    client, respond = ollama_server
+    respond(_ndjson({"error": "model not found"}))
+
+    with pytest.raises(OllamaClientException, match="model not found"):
+        client.generate("missing", "hi")
@@ -0,0 +1,76 @@
+"""多行程分段轉錄結果合併測試"""
+from processors.parallel_transcriber import merge_shard_results
+from utils.audio_decode import CANONICAL_SAMPLE_RATE
+
+
+def _shard(start_seconds, end_seconds):
+    return {"start": int(start_seconds * CANONICAL_SAMPLE_RATE), "end": int(end_seconds * CANONICAL_SAMPLE_RATE)}
+
+
+def _segment(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def test_duplicate_sentence_at_seam_is_dropped():
+    """下一個分段開頭重複前一個分段結尾的句子時只保留第一個"""
+    shards = [_shard(0, 60), _shard(60, 120)]
+    results = [
+        {"segments": [_segment(0.0, 30.0, "大家好"), _segment(55.0, 60.0, "我們開始開會")], "language": "zh"},
+        {"segments": [_segment(60.2, 64.0, "我們開始開會"), _segment(64.0, 70.0, "第一個議題")], "language": "zh"},
+    ]
+
+    merged = merge_shard_results(shards, results)
+
+    assert [s["text"] for s in merged["segments"]] == ["大家好", "我們開始開會", "第一個議題"]
+    assert [s["id"] for s in merged["segments"]] == [0, 1, 2]
+    assert merged["text"] == "大家好我們開始開會第一個議題"
+
+
+def test_same_text_away_from_seam_is_kept():
+    """與前一個片段文字相同但不在分段邊界上的片段 (例如重複說一次) 保留"""
+    shards = [_shard(0, 60)]
+    results = [{"segments": [_segment(0.0, 2.0, "好"), _segment(10.0, 12.0, "好")], "language": "zh"}]
+
+    merged = merge_shard_results(shards, results)
+
+    assert [s["start"] for s in merged["segments"]] == [0.0, 10.0]
+
+
+def test_overlap_is_clipped():
+    """與前一個片段重疊的片段從前一個片段結束處開始，完全被覆蓋的片段移除"""
+    shards = [_shard(0, 60), _shard(60, 120)]
+    results = [
+        {"segments": [_segment(50.0, 61.0, "第一段結尾")], "language": "zh"},
+        {"segments": [_segment(60.0, 60.8, "嗯"), _segment(60.5, 65.0, "第二段開頭")], "language": "zh"},
+    ]
+
+    merged = merge_shard_results(shards, results)
+
+    assert [(s["text"], s["start"], s["end"]) for s in merged["segments"]] == [
+        ("第一段結尾", 50.0, 61.0),
+        ("第二段開頭", 61.0, 65.0),
+    ]
+
+
+def test_empty_segments_are_skipped():
+    """沒有文字的片段不保留"""
+    merged = merge_shard_results([_shard(0, 30)], [{"segments": [_segment(0.0, 5.0, "  ")], "language": "en"}])
+    assert merged["segments"] == []
+    assert merged["text"] == ""
+
+
+def test_language_majority_vote():
+    """未指定語言時取各分段偵測最多次的語言，並依語言決定文字的連接方式"""
+    shards = [_shard(0, 30), _shard(30, 60), _shard(60, 90)]
+    results = [
+        {"segments": [_segment(0.0, 5.0, "hello")], "language": "en"},
+        {"segments": [_segment(30.0, 35.0, "there")], "language": "en"},
+        {"segments": [_segment(60.0, 65.0, "你好")], "language": "zh"},
+    ]
+
+    merged = merge_shard_results(shards, results)
+    assert merged["language"] == "en"
+    assert merged["text"] == "hello there 你好"
+
+    assert merge_shard_results(shards, results, language="zh")["language"] == "zh"
+    assert merge_shard_results(shards, [dict(r, language=None) for r in results])["language"] is None
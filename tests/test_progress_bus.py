@@ -0,0 +1,68 @@
+"""進度匯流排測試"""
+import time
+import types
+
+import pytest
+
+from processors import progress_bus
+from processors.progress_bus import ProgressBus
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """以可控制的時鐘取代匯流排使用的 time.monotonic"""
+    now = [100.0]
+    monkeypatch.setattr(progress_bus, "time", types.SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+def test_publish_throttles_database_writes(clock):
+    """第一次發布立即寫入，之後同一工作每隔 persist_interval 秒最多寫入一次"""
+    bus = ProgressBus(persist_interval=2.0)
+
+    assert bus.publish("audio", 1, 10) is True
+    clock[0] += 1.0
+    assert bus.publish("audio", 1, 20) is False
+    clock[0] += 1.0
+    assert bus.publish("audio", 1, 30) is True
+
+    # 各工作分別節流
+    assert bus.publish("audio", 2, 5) is True
+    assert bus.publish("llm", 1, 5) is True
+
+
+def test_forced_publish_always_writes(clock):
+    """狀態轉換 (force=True) 不受節流限制，並重新計算下一次寫入的時間"""
+    bus = ProgressBus(persist_interval=2.0)
+
+    assert bus.publish("audio", 1, 10) is True
+    clock[0] += 0.5
+    assert bus.publish("audio", 1, 25, "步驟 2", force=True) is True
+    clock[0] += 1.8
+    assert bus.publish("audio", 1, 30) is False
+
+
+def test_zero_interval_writes_every_time(clock):
+    """persist_interval 為 0 時每次都寫入"""
+    bus = ProgressBus(persist_interval=0)
+    assert all(bus.publish("audio", 1, value) for value in (10, 20, 30))
+
+
+def test_latest_progress_and_message():
+    """查詢返回最新進度，空白說明保留前一次的說明，未發布或已移除的工作使用預設值"""
+    bus = ProgressBus()
+    assert bus.get("audio", 1) is None
+    assert bus.progress("audio", 1) is None
+    assert bus.progress("audio", 1, default=0) == 0
+
+    bus.publish("audio", 1, 10, "轉錄中")
+    bus.publish("audio", 1, 40)
+
+    entry = bus.get("audio", 1)
+    assert entry["progress"] == 40
+    assert entry["message"] == "轉錄中"
+    assert bus.progress("audio", 1, default=0) == 40
+
+    bus.discard("audio", 1)
+    assert bus.progress("audio", 1, default=-1) == -1
+    assert bus.publish("audio", 1, 50) is True
@@ -0,0 +1,50 @@
+"""分層摘要切割測試"""
+import pytest
+
+from processors.report_summarizer import level_progress, pack_chunks, split_turns
+from utils.token_estimator import estimate_tokens
+
+
+def _turn(speaker, lines):
+    return "\n".join([f"{speaker}:"] + lines)
+
+
+def test_split_turns():
+    """以空行切割說話者輪替，忽略多餘的空白行"""
+    text = "會議.mp3\n\nSPEAKER_00:\n大家好\n\n \n\nSPEAKER_01:\n你好\n第二句\n"
+
+    assert split_turns(text) == ["會議.mp3", "SPEAKER_00:\n大家好", "SPEAKER_01:\n你好\n第二句"]
+
+
+def test_pack_chunks_respects_budget_and_order():
+    """片段不超過預算、只在輪替之間切割，且保留原本的順序與內容"""
+    turns = [_turn(f"SPEAKER_{i % 3:02d}", [f"第 {i} 段發言內容"] * 3) for i in range(30)]
+    budget = 120
+
+    chunks = pack_chunks(turns, budget)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= budget for chunk in chunks)
+    assert [turn for chunk in chunks for turn in chunk.split("\n\n")] == turns
+
+
+def test_long_turn_is_split_by_lines_with_header():
+    """單一輪替超過預算時依行切割，每個部分都保留說話者標題行"""
+    lines = [f"這是第 {i} 句比較長的發言內容" for i in range(40)]
+    turn = _turn("SPEAKER_00", lines)
+    budget = 80
+
+    chunks = pack_chunks([turn], budget)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("SPEAKER_00:\n") for chunk in chunks)
+    assert all(estimate_tokens(chunk) <= budget for chunk in chunks)
+    assert [line for chunk in chunks for line in chunk.split("\n")[1:]] == lines
+
+
+def test_level_progress():
+    """第 1 層佔一半範圍，之後每層佔剩餘範圍的一半，進度不會超過終點"""
+    assert level_progress(1, 0.0, 40, 80) == pytest.approx(40)
+    assert level_progress(1, 1.0, 40, 80) == pytest.approx(60)
+    assert level_progress(2, 1.0, 40, 80) == pytest.approx(70)
+    assert level_progress(10, 1.0, 40, 80) < 80
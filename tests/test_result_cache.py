@@ -0,0 +1,83 @@
+"""轉錄結果快取測試"""
+import os
+import time
+
+from processors.result_cache import ResultCache, make_cache_key
+
+
+def _key(**overrides):
+    args = dict(content_hash="abc", whisper_model="base", language="zh", speakers_count=None,
+                speaker_min=1, speaker_max=5, diarization_model="pyannote/speaker-diarization-3.0")
+    args.update(overrides)
+    return make_cache_key(**args)
+
+
+def _write_csv(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_text("start,end,speaker,text\n" + "x" * size, encoding="utf-8")
+    return str(path)
+
+
+def test_key_depends_on_models():
+    """更換 Whisper 或說話者分割模型時使用不同的快取鍵"""
+    assert _key() == _key()
+    assert _key() != _key(whisper_model="small")
+    assert _key() != _key(diarization_model="pyannote/speaker-diarization-3.1")
+
+
+def test_key_ignores_speaker_range_when_count_given():
+    """指定說話者數量時，最少/最多人數不影響快取鍵"""
+    assert _key(speakers_count=2, speaker_min=1) == _key(speakers_count=2, speaker_min=3)
+    assert _key(speaker_min=1) != _key(speaker_min=3)
+
+
+def test_put_get_and_reload(tmp_path):
+    """存入的項目可以查詢，重新建立快取時從目錄還原索引"""
+    cache_dir = tmp_path / "cache"
+    cache = ResultCache(str(cache_dir))
+    cache.put("k1", _write_csv(tmp_path, "a.csv", 10), {"language": "zh"})
+
+    hit = cache.get("k1")
+    assert hit["language"] == "zh"
+    assert os.path.isfile(hit["csv_path"])
+    assert cache.get("missing") is None
+
+    reloaded = ResultCache(str(cache_dir))
+    assert reloaded.stats()["entries"] == 1
+    assert reloaded.get("k1")["language"] == "zh"
+
+
+def test_reload_keeps_recent_part_dirs(tmp_path):
+    """重新建立快取時只刪除過期的暫存目錄，其他行程正在寫入的暫存目錄與無關目錄保留"""
+    cache_dir = tmp_path / "cache"
+    ResultCache(str(cache_dir)).put("k1", _write_csv(tmp_path, "a.csv", 10), {})
+
+    stale = cache_dir / "k2.123.part"
+    fresh = cache_dir / "k3.456.part"
+    other = cache_dir / "notes"
+    for path in (stale, fresh, other):
+        os.makedirs(path)
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+
+    cache = ResultCache(str(cache_dir))
+
+    assert cache.stats()["entries"] == 1
+    assert not stale.exists()
+    assert fresh.exists()
+    assert other.exists()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    """超過大小上限時淘汰最久未使用的項目"""
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=2500)
+    csv_path = _write_csv(tmp_path, "a.csv", 1000)
+    cache.put("k1", csv_path, {})
+    cache.put("k2", csv_path, {})
+    assert cache.get("k1") is not None
+
+    cache.put("k3", csv_path, {})
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,45 @@
+"""資料庫結構升級測試"""
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, inspect, text  # noqa: E402
+
+from models.schema_upgrades import upgrade_schema  # noqa: E402
+
+
+def _metadata(with_hash):
+    metadata = MetaData()
+    columns = [Column("id", Integer, primary_key=True), Column("filename", String(255), nullable=False)]
+    if with_hash:
+        columns.append(Column("content_hash", String(64), nullable=True, index=True))
+    Table("audio_file", metadata, *columns)
+    return metadata
+
+
+def test_adds_missing_column_and_index(tmp_path):
+    """既有的資料表缺少欄位時補上欄位與索引，保留原有資料"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    _metadata(with_hash=False).create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO audio_file (id, filename) VALUES (1, 'a.mp3')"))
+
+    added = upgrade_schema(engine, _metadata(with_hash=True), [("audio_file", "content_hash")])
+
+    assert added == [("audio_file", "content_hash")]
+    inspector = inspect(engine)
+    assert "content_hash" in {column["name"] for column in inspector.get_columns("audio_file")}
+    assert any(index["column_names"] == ["content_hash"] for index in inspector.get_indexes("audio_file"))
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT filename, content_hash FROM audio_file")).fetchall() == [("a.mp3", None)]
+
+
+def test_is_idempotent_and_skips_missing_tables(tmp_path):
+    """欄位已存在或資料表尚未建立時不做任何事"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    metadata = _metadata(with_hash=True)
+
+    assert upgrade_schema(engine, metadata, [("audio_file", "content_hash")]) == []
+
+    metadata.create_all(engine)
+    assert upgrade_schema(engine, metadata, [("audio_file", "content_hash")]) == []
@@ -0,0 +1,61 @@
+"""說話者指派測試 (掃描線版本與逐一比對的結果必須完全相同)"""
+import random
+
+import pytest
+
+from utils.speaker_assignment import UNKNOWN_SPEAKER, assign_speakers
+
+
+def _naive_assign(transcript_segments, speaker_segments):
+    """原本逐一比對所有 (轉錄片段, 說話者片段) 組合的寫法"""
+    labels = []
+    for ts in transcript_segments:
+        max_overlap = 0
+        assigned_speaker = UNKNOWN_SPEAKER
+        for ss in speaker_segments:
+            overlap = max(0, min(ts["end"], ss["end"]) - max(ts["start"], ss["start"]))
+            if overlap > max_overlap:
+                max_overlap = overlap
+                assigned_speaker = ss["speaker"]
+        labels.append(assigned_speaker)
+    return labels
+
+
+def _random_segments(rng, count, total, max_length, integer):
+    segments = []
+    for _ in range(count):
+        start = rng.randint(0, total) if integer else rng.uniform(0, total)
+        length = rng.randint(0, max_length) if integer else rng.uniform(0, max_length)
+        segments.append({"start": start, "end": start + length})
+    return segments
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_naive_loop(seed):
+    """隨機片段 (含重疊的說話者片段、長度為 0 的片段與重疊時間相同的情況) 與逐一比對的結果相同"""
+    rng = random.Random(seed)
+    integer = seed % 2 == 0  # 整數時間容易產生重疊時間相同的情況
+    transcripts = _random_segments(rng, rng.randint(1, 60), 100, 12, integer)
+    speakers = _random_segments(rng, rng.randint(0, 40), 100, 20, integer)
+    for index, segment in enumerate(speakers):
+        segment["speaker"] = f"SPEAKER_{index % 4:02d}"
+
+    assert assign_speakers(transcripts, speakers) == _naive_assign(transcripts, speakers)
+
+
+def test_tie_prefers_earlier_segment():
+    """重疊時間相同時取原始順序中較前面的說話者片段"""
+    transcripts = [{"start": 5, "end": 15}]
+    speakers = [{"start": 10, "end": 20, "speaker": "B"}, {"start": 0, "end": 10, "speaker": "A"}]
+
+    assert assign_speakers(transcripts, speakers) == ["B"]
+
+
+def test_no_overlap_is_unknown():
+    """沒有正的重疊時間 (包括只在端點相接) 時為 unknown"""
+    transcripts = [{"start": 0, "end": 5}, {"start": 5, "end": 6}]
+    speakers = [{"start": 6, "end": 9, "speaker": "A"}]
+
+    assert assign_speakers(transcripts, speakers) == [UNKNOWN_SPEAKER, UNKNOWN_SPEAKER]
+    assert assign_speakers(transcripts, []) == [UNKNOWN_SPEAKER, UNKNOWN_SPEAKER]
+    assert assign_speakers([], speakers) == []
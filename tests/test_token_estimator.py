@@ -0,0 +1,34 @@
+"""Token 數量估算測試"""
+import pytest
+
+from utils.token_estimator import count_words, estimate_tokens
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", 0),
+    (None, 0),
+    ("會議記錄", 4),  # 每個中文字一個 token
+    ("。，", 2),  # 全形標點
+    ("hello", 1),  # 6 個字母以內一個 token
+    ("internationalization", 4),
+    ("2024", 2),  # 每 3 位數字一個 token
+    ("a, b!", 4),  # 其他標點各自一個 token，空白不計
+    ("今天 review 了 3 個 PR", 7),
+])
+def test_estimate_tokens(text, expected):
+    assert estimate_tokens(text) == expected
+
+
+def test_cjk_text_is_not_underestimated():
+    """以空白分詞會把整句中文算成一個單字，估算值應接近字數"""
+    text = "我們今天討論下一季的產品規劃與預算分配"
+    assert len(text.split()) == 1
+    assert estimate_tokens(text) == len(text)
+
+
+def test_count_words():
+    """中文以單字、英文以單詞計算，標點與空白不計"""
+    assert count_words("") == 0
+    assert count_words("大家好，我們開始。") == 7
+    assert count_words("Let's start the meeting") == 4
+    assert count_words("預算 3.5 million") == 4
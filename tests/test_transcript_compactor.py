@@ -0,0 +1,57 @@
+"""逐字稿壓縮測試"""
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from processors.transcript_compactor import (  # noqa: E402
+    build_filler_pattern, compact_transcript, format_marker, normalize_text
+)
+
+
+def _df(rows):
+    return pd.DataFrame(rows, columns=["start", "end", "speaker", "text"])
+
+
+def test_format_marker():
+    assert format_marker(0) == "[00:00]"
+    assert format_marker(303.7) == "[05:03]"
+    assert format_marker(3903) == "[1:05:03]"
+
+
+def test_merges_turns_and_marks_time():
+    """同一說話者連續的片段合併為一個輪替，每分鐘標示一次時間"""
+    df = _df([
+        (0.0, 2.0, "SPEAKER_00", "大家好"),
+        (2.0, 4.0, "SPEAKER_00", "今天開會"),
+        (61.0, 63.0, "SPEAKER_00", "第二分鐘"),
+        (64.0, 66.0, "SPEAKER_01", "收到"),
+    ])
+
+    text = compact_transcript(df, title="會議.mp3", marker_interval=60)
+
+    assert text == (
+        "會議.mp3\n\n"
+        "SPEAKER_00:\n[00:00] 大家好 今天開會\n[01:01] 第二分鐘\n\n"
+        "SPEAKER_01:\n收到"
+    )
+
+
+def test_without_markers_and_missing_values():
+    """不標示時間；空白片段略過，缺少說話者時標示為未知說話者"""
+    df = _df([
+        (0.0, 1.0, None, "  你好   世界 "),
+        (1.0, 2.0, "SPEAKER_00", "   "),
+        (2.0, 3.0, "SPEAKER_00", None),
+    ])
+
+    assert compact_transcript(df, marker_interval=0) == "未知說話者:\n你好 世界"
+
+
+def test_filler_words_removed():
+    """移除中英文語助詞及其後的標點，英文只比對完整單字"""
+    pattern = build_filler_pattern(["嗯", "um", "uh"])
+
+    assert normalize_text("嗯嗯，我們開始吧", pattern) == "我們開始吧"
+    assert normalize_text("Um, the umbrella, uh, is here", pattern) == "the umbrella, is here"
+    assert build_filler_pattern([]) is None
+    assert normalize_text("保留 原文", None) == "保留 原文"
@@ -0,0 +1,126 @@
+"""分段上傳工作階段測試"""
+import datetime
+import hashlib
+import io
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_migrate")
+pytest.importorskip("flask_login")
+
+from flask import Flask  # noqa: E402
+
+from extensions import db  # noqa: E402
+from models.db_models import UploadSession  # noqa: E402
+from models.user import User  # noqa: E402
+from processors import upload_sessions  # noqa: E402
+from processors.upload_sessions import (  # noqa: E402
+    ChunkOutOfOrder, UploadSessionException, cleanup_expired_sessions, create_upload_session,
+    finish_upload_session, write_chunk
+)
+
+CHUNK_SIZE = 1000
+
+# WAV 標頭開頭 + 內容，總長度不是分段大小的整數倍
+CONTENT = b'RIFF\x00\x00\x00\x00WAVE' + bytes(range(256)) * 15
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'uploads.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[User.__table__, UploadSession.__table__])
+        yield app
+
+
+def _create(tmp_path, content=CONTENT):
+    return create_upload_session(1, "會議 錄音.wav", len(content), str(tmp_path / "uploads"), CHUNK_SIZE)
+
+
+def _chunk(index, content=CONTENT):
+    return io.BytesIO(content[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE])
+
+
+def test_upload_in_chunks(app, tmp_path):
+    """依序上傳所有分段後，檔案內容與雜湊值正確，工作階段記錄被移除"""
+    session = _create(tmp_path)
+    upload_id = session.id
+    assert upload_sessions.total_chunks(session) == 4
+
+    for index in range(4):
+        state = write_chunk(session, index, _chunk(index))
+    assert state["complete"]
+
+    file_path, size, content_hash = finish_upload_session(session)
+
+    with open(file_path, "rb") as f:
+        assert f.read() == CONTENT
+    assert size == len(CONTENT)
+    assert content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert db.session.get(UploadSession, upload_id) is None
+
+
+def test_resume_after_interrupted_chunk(app, tmp_path):
+    """分段不完整時不更新進度，從同一個分段續傳；雜湊狀態遺失時從檔案補算"""
+    session = _create(tmp_path)
+    write_chunk(session, 0, _chunk(0))
+
+    with pytest.raises(UploadSessionException, match="不完整"):
+        write_chunk(session, 1, io.BytesIO(CONTENT[CHUNK_SIZE:CHUNK_SIZE + 10]))
+    assert session.received_chunks == 1
+
+    # 模擬由其他行程接收剩餘的分段
+    upload_sessions._hashers.clear()
+    for index in range(1, 4):
+        write_chunk(session, index, _chunk(index))
+
+    assert finish_upload_session(session)[2] == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_out_of_order_and_duplicate_chunks(app, tmp_path):
+    """跳過分段時回報預期的分段，重送已接收的分段視為成功"""
+    session = _create(tmp_path)
+    write_chunk(session, 0, _chunk(0))
+
+    with pytest.raises(ChunkOutOfOrder) as excinfo:
+        write_chunk(session, 2, _chunk(2))
+    assert excinfo.value.expected == 1
+
+    assert write_chunk(session, 0, _chunk(0))["received_chunks"] == 1
+
+    with pytest.raises(UploadSessionException, match="尚未接收完整檔案"):
+        finish_upload_session(session)
+
+
+def test_rejects_non_audio_and_oversized_chunks(app, tmp_path):
+    """第一個分段不是音訊格式時拒絕，分段超過預期大小時拒絕"""
+    session = _create(tmp_path)
+    with pytest.raises(UploadSessionException, match="音訊格式"):
+        write_chunk(session, 0, io.BytesIO(b'<html>' + bytes(CHUNK_SIZE - 6)))
+    assert session.received_bytes == 0
+
+    with pytest.raises(UploadSessionException, match="超過預期大小"):
+        write_chunk(session, 0, io.BytesIO(CONTENT[:CHUNK_SIZE + 1]))
+    assert session.received_bytes == 0
+
+    with pytest.raises(UploadSessionException, match="大小上限"):
+        create_upload_session(1, "a.wav", 10 * 1024 * 1024, str(tmp_path), CHUNK_SIZE, max_file_size=1024 * 1024)
+
+
+def test_cleanup_expired_sessions(app, tmp_path):
+    """刪除過期的工作階段與其上傳目錄"""
+    expired = _create(tmp_path)
+    active = _create(tmp_path)
+    expired_id, expired_path = expired.id, expired.file_path
+    expired.updated_at = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+    db.session.commit()
+
+    assert cleanup_expired_sessions(3600) == 1
+
+    assert db.session.get(UploadSession, expired_id) is None
+    assert db.session.get(UploadSession, active.id) is not None
+    assert not (tmp_path / "uploads" / expired_id).exists()
+    assert expired_path.startswith(str(tmp_path / "uploads" / expired_id))
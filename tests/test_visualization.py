@@ -0,0 +1,82 @@
+"""說話者分割可視化測試"""
+import os
+
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from utils import visualization  # noqa: E402
+from utils.visualization import THUMBNAIL, ensure_rendered, thumbnail_path_for  # noqa: E402
+
+
+def _write_csv(path, mtime):
+    path.write_text("start,end,speaker,text\n0.0,1.5,SPEAKER_00,你好\n1.5,3.0,SPEAKER_01,早安\n",
+                    encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """記錄實際繪圖的次數"""
+    calls = []
+    render = visualization.render_diarization
+
+    def counting(segments, output_path, resolution):
+        calls.append(output_path)
+        return render(segments, output_path, resolution)
+
+    monkeypatch.setattr(visualization, "render_diarization", counting)
+    return calls
+
+
+def test_renders_missing_image(tmp_path, renders):
+    """圖檔不存在時從 CSV 繪製"""
+    csv_path = _write_csv(tmp_path / "a.csv", 1000)
+    output = str(tmp_path / "out" / "a.png")
+
+    assert ensure_rendered(csv_path, output, THUMBNAIL) == output
+    assert renders == [output]
+    with open(output, "rb") as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+def test_rerenders_when_csv_is_newer(tmp_path, renders):
+    """CSV 比圖檔新 (例如編輯過轉錄) 時重新繪製，否則沿用既有圖檔"""
+    csv_path = tmp_path / "a.csv"
+    output = tmp_path / "a.png"
+    output.write_bytes(b"old")
+    os.utime(output, (2000, 2000))
+
+    _write_csv(csv_path, 1000)
+    assert ensure_rendered(str(csv_path), str(output), THUMBNAIL) == str(output)
+    assert renders == []
+    assert output.read_bytes() == b"old"
+
+    _write_csv(csv_path, 3000)
+    assert ensure_rendered(str(csv_path), str(output), THUMBNAIL) == str(output)
+    assert renders == [str(output)]
+    assert output.read_bytes() != b"old"
+
+
+def test_missing_csv(tmp_path, renders):
+    """CSV 不存在時只返回既有的圖檔"""
+    output = tmp_path / "a.png"
+    assert ensure_rendered(str(tmp_path / "missing.csv"), str(output)) is None
+
+    output.write_bytes(b"old")
+    assert ensure_rendered(None, str(output)) == str(output)
+    assert renders == []
+
+
+def test_invalid_csv_returns_none(tmp_path):
+    """CSV 缺少必要欄位時返回 None"""
+    csv_path = tmp_path / "a.csv"
+    csv_path.write_text("text\n你好\n", encoding="utf-8")
+    assert ensure_rendered(str(csv_path), str(tmp_path / "a.png")) is None
+
+
+def test_thumbnail_path():
+    """縮圖位於靜態目錄中相同上傳 ID 的子目錄"""
+    path = thumbnail_path_for(os.path.join("viz", "upload-1", "meeting.png"), "static")
+    assert path == os.path.join("static", "upload-1", "meeting_thumb.png")
@@ -0,0 +1,151 @@
+"""
+音訊解碼工具
+將音訊檔案解碼一次為標準格式 (16 kHz、單聲道、float32) 的波形，
+供 Whisper 與 Pyannote 共用，避免各自重新解碼與重新取樣
+"""
+import logging
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# Whisper 與 Pyannote 模型使用的取樣率
+CANONICAL_SAMPLE_RATE = 16000
+
+# 從 ffmpeg 讀取資料的區塊大小 (位元組)
+_READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class AudioDecodeException(Exception):
+    """音訊解碼異常"""
+    pass
+
+
+def decode_canonical(path, cache_path=None, sample_rate=CANONICAL_SAMPLE_RATE):
+    """
+    將音訊檔案解碼為單聲道 float32 波形
+
+    若提供 cache_path，解碼結果會以串流方式寫入該檔案 (原始 float32 little-endian)，
+    並以唯讀的 numpy.memmap 返回，記憶體用量不隨錄音長度增加
+
+    Args:
+        path: 音訊檔案路徑
+        cache_path: 解碼結果的暫存檔路徑 (可選)
+        sample_rate: 目標取樣率
+
+    Returns:
+        numpy.ndarray: 一維 float32 波形
+    """
+    if cache_path and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        logger.info(f"使用已解碼的波形: {cache_path}")
+        return load_canonical(cache_path)
+
+    try:
+        return _decode_with_ffmpeg(path, cache_path, sample_rate)
+    except FileNotFoundError:
+        logger.warning("找不到 ffmpeg，改用 librosa 解碼")
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"ffmpeg 解碼失敗，改用 librosa 解碼: {e.stderr.decode(errors='ignore')[-500:]}")
+
+    return _decode_with_librosa(path, cache_path, sample_rate)
+
+
+def load_canonical(cache_path):
+    """以唯讀 memmap 載入已解碼的波形檔案"""
+    if os.path.getsize(cache_path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(cache_path, dtype='<f4', mode='r')
+
+
+def waveform_duration(waveform, sample_rate=CANONICAL_SAMPLE_RATE):
+    """計算波形時長 (秒)"""
+    return len(waveform) / sample_rate
+
+
+def to_pyannote_input(waveform, sample_rate=CANONICAL_SAMPLE_RATE):
+    """
+    將波形轉換為 Pyannote 管線接受的記憶體內輸入格式
+
+    Returns:
+        dict: {"waveform": (1, time) 的 torch.Tensor, "sample_rate": 取樣率}
+    """
+    import torch
+
+    tensor = torch.from_numpy(np.asarray(waveform, dtype=np.float32))
+    return {"waveform": tensor.unsqueeze(0), "sample_rate": sample_rate}
+
+
+def _decode_with_ffmpeg(path, cache_path, sample_rate):
+    """使用 ffmpeg 子行程串流解碼"""
+    command = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+        "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(sample_rate), "-"
+    ]
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # 讀取 stderr 的線程，避免管道塞滿造成死結
+    stderr_chunks = []
+
+    def drain_stderr():
+        for line in process.stderr:
+            stderr_chunks.append(line)
+
+    stderr_thread = threading.Thread(target=drain_stderr)
+    stderr_thread.daemon = True
+    stderr_thread.start()
+
+    try:
+        if cache_path:
+            tmp_path = f"{cache_path}.part"
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = process.stdout.read(_READ_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+        else:
+            chunks = []
+            while True:
+                chunk = process.stdout.read(_READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+        return_code = process.wait()
+        stderr_thread.join(timeout=5)
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, command, stderr=b"".join(stderr_chunks))
+
+    if cache_path:
+        os.replace(tmp_path, cache_path)
+        waveform = load_canonical(cache_path)
+    else:
+        waveform = np.frombuffer(b"".join(chunks), dtype='<f4')
+
+    logger.info(f"已解碼音訊 {path}: {waveform_duration(waveform, sample_rate):.2f} 秒 @ {sample_rate} Hz")
+    return waveform
+
+
+def _decode_with_librosa(path, cache_path, sample_rate):
+    """使用 librosa 解碼 (ffmpeg 無法使用時的備援方案)"""
+    import librosa
+
+    try:
+        waveform, _ = librosa.load(path, sr=sample_rate, mono=True, dtype=np.float32)
+    except Exception as e:
+        raise AudioDecodeException(f"無法解碼音訊檔案 {path}: {e}")
+
+    if cache_path:
+        waveform.astype('<f4').tofile(cache_path)
+        return load_canonical(cache_path)
+
+    return waveform
@@ -0,0 +1,565 @@
+"""
+音訊探測工具
+只讀取容器與編碼標頭來取得音訊時長、取樣率與聲道數，避免為了讀取資訊而解碼整個檔案
+支援 WAV (RIFF/RF64)、FLAC、OGG (Vorbis/Opus/FLAC)、MP3 與 M4A (MP4)
+標頭資訊不足時才退而使用串流解碼計算長度，結果依檔案快取
+"""
+import logging
+import os
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 探測結果快取 (依檔案路徑、大小與修改時間)
+_PROBE_CACHE_SIZE = 256
+_probe_cache = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+# MP3 位元率表 (kbps)，依 (MPEG 版本, Layer) 區分
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# MP3 取樣率表，依 MPEG 版本區分 (2.5 版以 2.5 表示)
+_MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+
+def probe_audio(path, use_cache=True):
+    """
+    探測音訊檔案資訊
+
+    Args:
+        path: 音訊檔案路徑
+        use_cache: 是否使用快取結果
+
+    Returns:
+        dict: 包含 sample_rate、sample_width、n_channels、n_frames、duration、format 與 source
+              (資訊來源: header / soundfile / ffprobe / stream)，無法探測時返回 None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logger.error(f"無法讀取音訊檔案: {e}")
+        return None
+
+    cache_key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+    if use_cache:
+        with _probe_cache_lock:
+            cached = _probe_cache.get(cache_key)
+            if cached is not None:
+                _probe_cache.move_to_end(cache_key)
+                return dict(cached)
+
+    info = None
+    for probe in (_probe_header, _probe_soundfile, _probe_ffprobe, _probe_stream):
+        try:
+            info = probe(path, stat.st_size)
+        except Exception as e:
+            logger.debug(f"{probe.__name__} 無法探測 {path}: {e}")
+            info = None
+
+        if info and info.get('duration'):
+            break
+
+    if not info or not info.get('duration'):
+        logger.error(f"無法探測音訊檔案資訊: {path}")
+        return None
+
+    with _probe_cache_lock:
+        _probe_cache[cache_key] = dict(info)
+        while len(_probe_cache) > _PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+
+    return info
+
+
+def sniff_audio_format(header):
+    """
+    依檔案開頭的位元組判斷容器格式 (分段上傳收到第一個分段時即可拒絕非音訊檔案)
+
+    Args:
+        header: 檔案開頭的位元組 (至少 12 bytes)
+
+    Returns:
+        str: 'wav'、'ogg'、'mp4'、'flac' 或 'mp3'；無法辨識時返回 None
+    """
+    if header[:4] in (b'RIFF', b'RIFX', b'RF64'):
+        return 'wav'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    if header[4:8] == b'ftyp':
+        return 'mp4'
+    if header[:4] == b'fLaC':
+        return 'flac'
+    if header[:3] == b'ID3':
+        # ID3v2 標籤後可能是 MP3 或 FLAC，留待完整探測時判斷
+        return 'mp3'
+    if _parse_mp3_frame_header(header[:4]) is not None:
+        return 'mp3'
+    return None
+
+
+def clear_probe_cache():
+    """清除探測結果快取"""
+    with _probe_cache_lock:
+        _probe_cache.clear()
+
+
+def _make_info(fmt, sample_rate, n_channels, n_frames=None, duration=None, sample_width=None, source="header"):
+    """建立統一格式的探測結果"""
+    if duration is None and n_frames is not None and sample_rate:
+        duration = n_frames / sample_rate
+    if n_frames is None and duration is not None and sample_rate:
+        n_frames = int(round(duration * sample_rate))
+
+    return {
+        "sample_rate": sample_rate,
+        "sample_width": sample_width,
+        "n_channels": n_channels,
+        "n_frames": n_frames,
+        "duration": duration,
+        "format": fmt,
+        "source": source,
+    }
+
+
+def _probe_header(path, file_size):
+    """依檔案開頭的魔術位元組選擇標頭解析器"""
+    with open(path, 'rb') as f:
+        magic = f.read(12)
+        f.seek(0)
+
+        if magic[:4] in (b'RIFF', b'RIFX', b'RF64'):
+            return _probe_wav(f, file_size)
+        if magic[:4] == b'OggS':
+            return _probe_ogg(f, file_size)
+        if magic[4:8] == b'ftyp':
+            return _probe_mp4(f, file_size)
+
+        audio_start = _skip_id3v2(f)
+        f.seek(audio_start)
+        if f.read(4) == b'fLaC':
+            return _probe_flac(f, audio_start + 4)
+
+        return _probe_mp3(f, file_size, audio_start)
+
+
+def _skip_id3v2(f):
+    """略過 ID3v2 標籤，返回音訊資料起始位置"""
+    f.seek(0)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _probe_wav(f, file_size):
+    """解析 WAV (RIFF/RIFX/RF64) 標頭"""
+    riff = f.read(12)
+    endian = '>' if riff[:4] == b'RIFX' else '<'
+    is_rf64 = riff[:4] == b'RF64'
+
+    fmt = None
+    ds64_data_size = None
+
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            return None
+
+        chunk_id = chunk_header[:4]
+        chunk_size = struct.unpack(endian + 'I', chunk_header[4:])[0]
+
+        if chunk_id == b'data':
+            if fmt is None:
+                return None
+
+            data_offset = f.tell()
+            data_size = chunk_size
+            if is_rf64 and chunk_size == 0xFFFFFFFF and ds64_data_size is not None:
+                data_size = ds64_data_size
+
+            # 串流寫入的檔案可能沒有填寫正確的資料長度
+            if data_size in (0, 0xFFFFFFFF) or data_offset + data_size > file_size:
+                data_size = file_size - data_offset
+
+            channels, sample_rate, block_align, bits = fmt
+            if not block_align or not sample_rate:
+                return None
+
+            return _make_info("wav", sample_rate, channels,
+                              n_frames=data_size // block_align,
+                              sample_width=bits // 8 if bits else None)
+
+        if chunk_id == b'fmt ':
+            payload = f.read(chunk_size)
+            if len(payload) < 16:
+                return None
+            _, channels, sample_rate, _, block_align, bits = struct.unpack(endian + 'HHIIHH', payload[:16])
+            fmt = (channels, sample_rate, block_align, bits)
+        elif chunk_id == b'ds64':
+            payload = f.read(chunk_size)
+            if len(payload) >= 16:
+                ds64_data_size = struct.unpack('<Q', payload[8:16])[0]
+        else:
+            f.seek(chunk_size, os.SEEK_CUR)
+
+        # RIFF 區塊以偶數位元組對齊
+        if chunk_size % 2:
+            f.seek(1, os.SEEK_CUR)
+
+
+def _parse_flac_streaminfo(streaminfo):
+    """解析 FLAC STREAMINFO 區塊，返回 (取樣率, 聲道數, 位元深度, 總取樣數)"""
+    if len(streaminfo) < 18:
+        return None
+
+    sample_rate = (streaminfo[10] << 12) | (streaminfo[11] << 4) | (streaminfo[12] >> 4)
+    channels = ((streaminfo[12] >> 1) & 0x07) + 1
+    bits = (((streaminfo[12] & 0x01) << 4) | (streaminfo[13] >> 4)) + 1
+    total_samples = ((streaminfo[13] & 0x0F) << 32) | struct.unpack('>I', streaminfo[14:18])[0]
+    return sample_rate, channels, bits, total_samples
+
+
+def _probe_flac(f, offset):
+    """解析 FLAC STREAMINFO 標頭"""
+    f.seek(offset)
+    block_header = f.read(4)
+    if len(block_header) < 4 or (block_header[0] & 0x7F) != 0:
+        return None
+
+    parsed = _parse_flac_streaminfo(f.read(34))
+    if parsed is None:
+        return None
+
+    sample_rate, channels, bits, total_samples = parsed
+
+    # 總取樣數為 0 表示編碼器未記錄，交由後續方法處理
+    if not sample_rate or not total_samples:
+        return None
+
+    return _make_info("flac", sample_rate, channels, n_frames=total_samples, sample_width=(bits + 7) // 8)
+
+
+def _probe_ogg(f, file_size):
+    """解析 OGG 第一頁的識別標頭，並以最後一頁的 granule position 計算長度"""
+    page_header = f.read(27)
+    if len(page_header) < 27:
+        return None
+
+    serial = struct.unpack('<I', page_header[14:18])[0]
+    segment_table = f.read(page_header[26])
+    packet = f.read(sum(segment_table))
+
+    pre_skip = 0
+    sample_width = None
+    if packet.startswith(b'\x01vorbis') and len(packet) >= 16:
+        channels = packet[11]
+        sample_rate = struct.unpack('<I', packet[12:16])[0]
+        granule_rate = sample_rate
+        codec = "vorbis"
+    elif packet.startswith(b'OpusHead') and len(packet) >= 16:
+        channels = packet[9]
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+        sample_rate = struct.unpack('<I', packet[12:16])[0] or 48000
+        granule_rate = 48000  # Opus 的 granule position 固定以 48 kHz 計算
+        codec = "opus"
+    elif packet.startswith(b'\x7fFLAC') and len(packet) >= 17 + 18:
+        parsed = _parse_flac_streaminfo(packet[17:])
+        if parsed is None:
+            return None
+        sample_rate, channels, bits, _ = parsed
+        granule_rate = sample_rate
+        sample_width = (bits + 7) // 8
+        codec = "flac"
+    else:
+        return None
+
+    granule = _last_ogg_granule(f, file_size, serial)
+    if granule is None or granule <= 0 or not granule_rate:
+        return None
+
+    duration = max(0, granule - pre_skip) / granule_rate
+    info = _make_info("ogg", sample_rate, channels, duration=duration, sample_width=sample_width)
+    info["codec"] = codec
+    return info
+
+
+def _last_ogg_granule(f, file_size, serial, window=65536):
+    """從檔案尾端往前尋找指定串流的最後一個 OGG 頁面，返回其 granule position"""
+    end = file_size
+    while end > 0:
+        start = max(0, end - window)
+        f.seek(start)
+        # 多讀 27 位元組以涵蓋跨越視窗邊界的頁面標頭
+        data = f.read(end - start + 27)
+
+        index = data.rfind(b'OggS')
+        while index != -1:
+            if index + 27 <= len(data):
+                page_serial = struct.unpack('<I', data[index + 14:index + 18])[0]
+                granule = struct.unpack('<q', data[index + 6:index + 14])[0]
+                if page_serial == serial and granule != -1:
+                    return granule
+            index = data.rfind(b'OggS', 0, index)
+
+        end = start
+
+    return None
+
+
+def _parse_mp3_frame_header(header):
+    """解析 MP3 影格標頭，無效時返回 None"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = {3: 1, 2: 2, 0: 2.5}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if (header[3] >> 6) == 3 else 2
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 1:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+    }
+
+
+def _probe_mp3(f, file_size, audio_start):
+    """解析 MP3 影格標頭，優先使用 Xing/Info 或 VBRI 標頭的影格數，否則以位元率估算 (CBR)"""
+    f.seek(audio_start)
+    data = f.read(65536)
+
+    frame = None
+    frame_offset = 0
+    for index in range(len(data) - 4):
+        if data[index] != 0xFF:
+            continue
+        frame = _parse_mp3_frame_header(data[index:index + 4])
+        if frame is None:
+            continue
+
+        # 檢查下一個影格也是有效的同步字，避免誤判
+        next_index = index + frame["frame_length"]
+        if next_index + 4 <= len(data) and _parse_mp3_frame_header(data[next_index:next_index + 4]) is None:
+            frame = None
+            continue
+
+        frame_offset = index
+        break
+
+    if frame is None:
+        return None
+
+    # Xing/Info 標頭位於 side information 之後
+    if frame["version"] == 1:
+        side_info = 17 if frame["channels"] == 1 else 32
+    else:
+        side_info = 9 if frame["channels"] == 1 else 17
+
+    frame_count = None
+    xing_offset = frame_offset + 4 + side_info
+    if data[xing_offset:xing_offset + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 0x01:
+            frame_count = struct.unpack('>I', data[xing_offset + 8:xing_offset + 12])[0]
+
+    vbri_offset = frame_offset + 4 + 32
+    if frame_count is None and data[vbri_offset:vbri_offset + 4] == b'VBRI':
+        frame_count = struct.unpack('>I', data[vbri_offset + 14:vbri_offset + 18])[0]
+
+    if frame_count:
+        duration = frame_count * frame["samples_per_frame"] / frame["sample_rate"]
+    else:
+        # 固定位元率：以音訊資料大小估算長度，並扣除 ID3v1 標籤
+        audio_bytes = file_size - audio_start - frame_offset
+        f.seek(max(0, file_size - 128))
+        if f.read(3) == b'TAG':
+            audio_bytes -= 128
+        duration = audio_bytes * 8 / frame["bitrate"]
+
+    return _make_info("mp3", frame["sample_rate"], frame["channels"], duration=duration, sample_width=2)
+
+
+def _iter_mp4_atoms(f, start, end):
+    """逐一列出 MP4 容器中指定範圍內的 atom，返回 (類型, 內容起點, 結束位置)"""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+
+        size, atom_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+
+        if size < header_size:
+            return
+
+        yield atom_type, position + header_size, position + size
+        position += size
+
+
+def _find_mp4_atom(f, start, end, atom_type):
+    """在指定範圍內尋找第一個指定類型的 atom"""
+    for found_type, payload_start, atom_end in _iter_mp4_atoms(f, start, end):
+        if found_type == atom_type:
+            return payload_start, atom_end
+    return None
+
+
+def _probe_mp4(f, file_size):
+    """解析 MP4/M4A 的 moov atom，取得音訊軌的時長、取樣率與聲道數"""
+    moov = _find_mp4_atom(f, 0, file_size, b'moov')
+    if moov is None:
+        return None
+
+    for atom_type, trak_start, trak_end in _iter_mp4_atoms(f, *moov):
+        if atom_type != b'trak':
+            continue
+
+        mdia = _find_mp4_atom(f, trak_start, trak_end, b'mdia')
+        if mdia is None:
+            continue
+
+        # 只處理音訊軌
+        hdlr = _find_mp4_atom(f, *mdia, b'hdlr')
+        if hdlr is None:
+            continue
+        f.seek(hdlr[0] + 8)
+        if f.read(4) != b'soun':
+            continue
+
+        mdhd = _find_mp4_atom(f, *mdia, b'mdhd')
+        if mdhd is None:
+            continue
+        f.seek(mdhd[0])
+        version = f.read(4)[0]
+        if version == 1:
+            f.seek(16, os.SEEK_CUR)
+            timescale, duration = struct.unpack('>IQ', f.read(12))
+        else:
+            f.seek(8, os.SEEK_CUR)
+            timescale, duration = struct.unpack('>II', f.read(8))
+
+        if not timescale:
+            continue
+
+        channels = None
+        sample_rate = timescale
+        sample_width = None
+
+        minf = _find_mp4_atom(f, *mdia, b'minf')
+        stbl = _find_mp4_atom(f, *minf, b'stbl') if minf else None
+        stsd = _find_mp4_atom(f, *stbl, b'stsd') if stbl else None
+        if stsd:
+            # stsd: version/flags(4) + entry_count(4) + 第一個 sample entry
+            f.seek(stsd[0] + 8)
+            entry = f.read(36)
+            if len(entry) >= 36:
+                channels = struct.unpack('>H', entry[24:26])[0]
+                sample_width = struct.unpack('>H', entry[26:28])[0] // 8 or None
+                entry_rate = struct.unpack('>I', entry[32:36])[0] >> 16
+                if entry_rate:
+                    sample_rate = entry_rate
+
+        info = _make_info("m4a", sample_rate, channels, duration=duration / timescale, sample_width=sample_width)
+        return info
+
+    return None
+
+
+def _probe_soundfile(path, file_size):
+    """使用 libsndfile 讀取標頭資訊"""
+    import soundfile as sf
+
+    info = sf.info(path)
+    if not info.frames or info.frames < 0:
+        return None
+
+    return _make_info(info.format.lower(), info.samplerate, info.channels,
+                      n_frames=info.frames, source="soundfile")
+
+
+def _probe_ffprobe(path, file_size):
+    """使用 ffprobe 讀取容器標頭資訊"""
+    import json
+
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a:0",
+         "-show_entries", "stream=sample_rate,channels,duration:format=duration,format_name",
+         "-of", "json", path],
+        capture_output=True, timeout=30, check=True
+    )
+    data = json.loads(result.stdout or b"{}")
+    streams = data.get("streams") or [{}]
+    stream = streams[0]
+    duration = stream.get("duration") or data.get("format", {}).get("duration")
+    if not duration or duration == "N/A":
+        return None
+
+    sample_rate = int(stream["sample_rate"]) if stream.get("sample_rate") else None
+    return _make_info(data.get("format", {}).get("format_name", ""), sample_rate, stream.get("channels"),
+                      duration=float(duration), source="ffprobe")
+
+
+def _probe_stream(path, file_size, block_size=65536):
+    """標頭缺少長度資訊時，以串流方式逐塊解碼並計算取樣數，不會將整個檔案載入記憶體"""
+    import soundfile as sf
+
+    with sf.SoundFile(path) as audio:
+        n_frames = 0
+        while True:
+            block = audio.read(block_size, dtype='int16', always_2d=True)
+            if not len(block):
+                break
+            n_frames += len(block)
+
+        return _make_info(audio.format.lower(), audio.samplerate, audio.channels,
+                          n_frames=n_frames, source="stream")
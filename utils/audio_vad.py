@@ -0,0 +1,165 @@
+"""
+語音活動偵測工具
+以能量為基礎的簡易語音活動偵測，用於在靜音處將長錄音切割為有上限長度的視窗，
+以逐區塊方式讀取波形，記憶體用量不隨錄音長度增加
+
+語音門檻會受錄音中最大聲的部分影響，音量很小的說話者可能完全低於門檻；
+因此只有音量也接近背景噪音的視窗才標記為靜音 (silent)，可以略過不轉錄
+"""
+import logging
+
+import numpy as np
+
+from utils.audio_decode import CANONICAL_SAMPLE_RATE
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 計算能量時每次讀取的影格數量
+_ENERGY_BLOCK_FRAMES = 65536
+
+# 能量下限 (dB)，避免完全靜音時出現 -inf
+_ENERGY_FLOOR_DB = -100.0
+
+# 估計視窗音量時使用的百分位數 (只要有少量語音就會明顯高於背景噪音)
+_WINDOW_LEVEL_PERCENTILE = 95
+
+
+def frame_energies(waveform, frame_length):
+    """
+    計算每個影格的能量 (dB)
+
+    Args:
+        waveform: 一維波形 (可為 numpy.memmap)
+        frame_length: 每個影格的取樣數
+
+    Returns:
+        numpy.ndarray: 每個影格的能量 (dB)，最後不足一個影格的取樣會併入最後一個影格
+    """
+    n_frames = max(1, len(waveform) // frame_length)
+    energies = np.empty(n_frames, dtype=np.float32)
+
+    for block_start in range(0, n_frames, _ENERGY_BLOCK_FRAMES):
+        block_end = min(block_start + _ENERGY_BLOCK_FRAMES, n_frames)
+        start = block_start * frame_length
+        # 最後一個區塊包含剩餘的取樣
+        end = len(waveform) if block_end == n_frames else block_end * frame_length
+        block = np.asarray(waveform[start:end], dtype=np.float32)
+
+        # 除最後一個影格外皆為完整影格，最後一個影格可能較長或較短
+        regular = (block_end - block_start - 1) * frame_length
+        power = np.empty(block_end - block_start, dtype=np.float32)
+        if regular > 0:
+            frames = block[:regular].reshape(-1, frame_length)
+            power[:-1] = np.mean(frames * frames, axis=1)
+        tail = block[regular:]
+        power[-1] = np.mean(tail * tail) if len(tail) > 0 else 0.0
+
+        energies[block_start:block_end] = 10.0 * np.log10(np.maximum(power, 1e-10))
+
+    return np.maximum(energies, _ENERGY_FLOOR_DB)
+
+
+def speech_threshold(energies, margin_db=12.0, dynamic_range_db=30.0, min_threshold_db=-60.0):
+    """
+    估計語音門檻 (dB)
+
+    以最安靜影格的能量作為背景噪音並加上差距，但不超過較大聲影格往下一段動態範圍，
+    避免整段都在說話 (幾乎沒有靜音) 的錄音被判定為沒有語音
+    """
+    if len(energies) == 0:
+        return min_threshold_db
+    loud_level = float(np.percentile(energies, 90))
+    return max(min(noise_floor(energies) + margin_db, loud_level - dynamic_range_db), min_threshold_db)
+
+
+def noise_floor(energies):
+    """估計背景噪音的能量 (dB)，即最安靜影格的能量"""
+    if len(energies) == 0:
+        return _ENERGY_FLOOR_DB
+    return float(np.percentile(energies, 5))
+
+
+def split_on_silence(waveform, sample_rate=CANONICAL_SAMPLE_RATE, max_window_seconds=600.0,
+                     min_window_seconds=None, frame_seconds=0.03, smooth_seconds=0.5, silence_margin_db=6.0):
+    """
+    在靜音處將波形切割為長度有上限的視窗
+
+    每個視窗的切割點選在 [最短長度, 最長長度] 範圍內平滑後能量最低的位置，
+    因此切割點會落在停頓中，而不會切斷正在說話的句子
+
+    沒有影格超過語音門檻、且視窗音量與背景噪音相差不到 silence_margin_db 的視窗標記為靜音；
+    低於語音門檻但明顯高於背景噪音的視窗 (音量很小的說話者) 不標記為靜音
+
+    Args:
+        waveform: 一維波形 (可為 numpy.memmap)
+        sample_rate: 取樣率
+        max_window_seconds: 視窗最長秒數
+        min_window_seconds: 視窗最短秒數，若為 None 則為最長秒數的一半
+        frame_seconds: 計算能量的影格長度 (秒)
+        smooth_seconds: 平滑能量的視窗長度 (秒)
+        silence_margin_db: 視窗音量高於背景噪音不到此值 (dB) 時才可能標記為靜音
+
+    Returns:
+        list: 視窗列表，每個元素為 {"start": 起始取樣, "end": 結束取樣, "speech_ratio": 語音影格比例,
+              "level_db": 視窗音量, "silent": 是否為靜音}
+    """
+    total_samples = len(waveform)
+    if total_samples == 0:
+        return []
+
+    if min_window_seconds is None:
+        min_window_seconds = max_window_seconds / 2
+
+    frame_length = max(1, int(round(frame_seconds * sample_rate)))
+    energies = frame_energies(waveform, frame_length)
+    threshold = speech_threshold(energies)
+    silence_level = noise_floor(energies) + silence_margin_db
+    is_speech = energies > threshold
+
+    # 以移動平均平滑能量，使最低點落在較長停頓的中央
+    smooth_frames = max(1, int(round(smooth_seconds / frame_seconds)))
+    if smooth_frames > 1 and len(energies) > smooth_frames:
+        kernel = np.ones(smooth_frames, dtype=np.float32) / smooth_frames
+        smoothed = np.convolve(energies, kernel, mode='same')
+    else:
+        smoothed = energies
+
+    n_frames = len(energies)
+    max_frames = max(1, int(max_window_seconds / frame_seconds))
+    min_frames = max(1, min(max_frames, int(min_window_seconds / frame_seconds)))
+
+    windows = []
+    start_frame = 0
+    while start_frame < n_frames:
+        if n_frames - start_frame <= max_frames:
+            end_frame = n_frames
+        else:
+            # 在 [最短長度, 最長長度] 範圍內 (含兩端) 尋找切割點
+            search_start = start_frame + min_frames
+            search_end = start_frame + max_frames + 1
+            end_frame = search_start + int(np.argmin(smoothed[search_start:search_end]))
+
+        start = start_frame * frame_length
+        end = total_samples if end_frame == n_frames else end_frame * frame_length
+        speech_ratio = float(np.mean(is_speech[start_frame:end_frame]))
+        level_db = float(np.percentile(energies[start_frame:end_frame], _WINDOW_LEVEL_PERCENTILE))
+        windows.append({
+            "start": start,
+            "end": end,
+            "speech_ratio": speech_ratio,
+            "level_db": level_db,
+            "silent": speech_ratio == 0 and level_db < silence_level,
+        })
+        start_frame = end_frame
+
+    quiet = sum(1 for window in windows if window["speech_ratio"] == 0 and not window["silent"])
+    logger.info(f"語音活動偵測: 門檻 {threshold:.1f} dB，靜音上限 {silence_level:.1f} dB，"
+                f"切割為 {len(windows)} 個視窗 (靜音 {sum(w['silent'] for w in windows)} 個，"
+                f"低於門檻但仍保留 {quiet} 個)")
+    return windows
+
+
+def window_span(window, sample_rate=CANONICAL_SAMPLE_RATE):
+    """將視窗範圍格式化為秒數，例如 "120.0-240.0 秒"，用於日誌"""
+    return f"{window['start'] / sample_rate:.1f}-{window['end'] / sample_rate:.1f} 秒"
@@ -4,6 +4,7 @@
 """
 import os
 import shutil
+import hashlib
 import uuid
 import mimetypes
 from werkzeug.utils import secure_filename
@@ -105,6 +106,65 @@ def save_uploaded_file(file, upload_folder=None, filename=None):
     return file_path, file_size
 
 
+def save_stream_with_hash(stream, file_path, chunk_size=1024 * 1024):
+    """
+    以串流方式寫入檔案，同時計算內容的 SHA-256 雜湊值
+
+    Args:
+        stream: 可讀取的檔案串流 (例如 FileStorage.stream)
+        file_path: 保存路徑
+        chunk_size: 每次讀取的位元組數
+
+    Returns:
+        tuple: (檔案大小, SHA-256 十六進位字串)
+    """
+    hasher = hashlib.sha256()
+    file_size = 0
+
+    with open(file_path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            f.write(chunk)
+            file_size += len(chunk)
+
+    return file_size, hasher.hexdigest()
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """
+    計算檔案內容的 SHA-256 雜湊值 (與 save_stream_with_hash 的結果相同)
+
+    Returns:
+        str: SHA-256 十六進位字串
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def link_or_copy(source_path, target_path):
+    """
+    以硬連結建立檔案，不支援硬連結 (例如不同檔案系統) 時改為複製
+
+    刪除其中一個路徑不影響另一個路徑的檔案內容
+
+    Returns:
+        bool: 是否以硬連結建立
+    """
+    try:
+        os.link(source_path, target_path)
+        return True
+    except OSError as e:
+        logger.debug(f"無法建立硬連結，改為複製檔案: {e}")
+        shutil.copyfile(source_path, target_path)
+        return False
+
+
 def delete_file(file_path):
     """
     刪除檔案
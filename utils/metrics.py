@@ -0,0 +1,299 @@
+"""
+應用程式指標
+不依賴第三方套件的計數器 (Counter)、量測值 (Gauge) 與直方圖 (Histogram)，
+以 Prometheus 文字格式 (text exposition format 0.0.4) 輸出，供 /metrics 端點抓取
+
+每次更新只有一次字典查詢與一次加鎖，可以放在 token 串流迴圈等熱路徑中
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# 預設的直方圖區間 (秒)，涵蓋 HTTP 請求到長時間的處理階段
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# 處理階段使用的直方圖區間 (秒)
+STAGE_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400)
+
+
+def _escape(value):
+    """跳脫標籤值中的反斜線、雙引號與換行"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """指標基底類別"""
+
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指標 {self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def labels(self, **labels):
+        """
+        預先綁定標籤值，返回只需傳入數值的更新物件
+
+        熱路徑中 (例如逐 token 計數) 在迴圈外綁定一次，省去每次建立標籤鍵的成本
+        """
+        return _BoundMetric(self, self._key(labels))
+
+    def _samples(self):
+        """返回 [(後綴, 標籤值, 額外標籤, 數值), ...]"""
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+    def expose(self):
+        """輸出此指標的文字格式"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labelvalues, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} "
+                         f"{_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _BoundMetric:
+    """已綁定標籤值的指標"""
+
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount=1):
+        self._metric._inc(self._key, amount)
+
+    def dec(self, amount=1):
+        self._metric._inc(self._key, -amount)
+
+    def observe(self, value):
+        self._metric._observe(self._key, value)
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._inc(self._key(labels), amount)
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可減的量測值，也可在輸出時才呼叫函數取得目前數值"""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        Args:
+            function: 輸出時呼叫的函數 (可選)；無標籤時返回數值，有標籤時返回 {標籤值 tuple: 數值}
+        """
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        self._inc(self._key(labels), amount)
+
+    def _inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """在區塊執行期間將量測值加一"""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+
+        value = self._function()
+        if not self.labelnames:
+            return [] if value is None else [("", (), None, value)]
+        return [("", tuple(str(v) for v in key), None, v) for key, v in (value or {}).items()]
+
+
+class CounterFunction(Gauge):
+    """在輸出時才呼叫函數取得數值的計數器 (例如其他元件自行維護的累計次數)"""
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        super().__init__(name, documentation, labelnames, function=function)
+
+
+class Histogram(_Metric):
+    """累積區間直方圖"""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value, **labels):
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各區間次數 (不累積)..., 超出最大區間的次數, 總和]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """量測區塊的執行時間 (秒)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            states = [(key, list(state)) for key, state in self._values.items()]
+
+        samples = []
+        for key, state in states:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", key, None, state[-1]))
+            samples.append(("_count", key, None, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """指標註冊表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指標 {name} 已註冊為 {type(metric).__name__}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        metric = self._get_or_create(Gauge, name, documentation, labelnames, function=function)
+        if function is not None:
+            # 重新建立應用 (例如測試) 時改用新的取值函數
+            metric._function = function
+        return metric
+
+    def counter_function(self, name, documentation, function, labelnames=()):
+        metric = self._get_or_create(CounterFunction, name, documentation, function, labelnames)
+        metric._function = function
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def unregister(self, name):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def expose(self):
+        """以 Prometheus 文字格式輸出所有指標；單一指標輸出失敗時略過該指標"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        parts = []
+        for metric in metrics:
+            try:
+                parts.append(metric.expose())
+            except Exception as e:
+                parts.append(f"# 指標 {metric.name} 輸出失敗: {_escape(e)}")
+        return "\n".join(parts) + "\n"
+
+
+# 行程內共享的指標註冊表
+REGISTRY = MetricsRegistry()
+
+# 應用程式各處共用的指標
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間 (秒)",
+    ("method", "endpoint", "status"), buckets=DEFAULT_BUCKETS[:12]
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "音訊處理與報告生成各階段的耗時 (秒)",
+    ("job_type", "stage", "outcome"), buckets=STAGE_BUCKETS
+)
+OLLAMA_REQUEST_DURATION = REGISTRY.histogram(
+    "ollama_request_duration_seconds", "Ollama API 請求耗時 (秒，串流請求計到最後一個片段)",
+    ("api",)
+)
+OLLAMA_REQUEST_ERRORS = REGISTRY.counter(
+    "ollama_request_errors_total", "Ollama API 請求失敗次數", ("api",)
+)
+OLLAMA_TOKENS = REGISTRY.counter(
+    "ollama_generated_tokens_total", "Ollama 串流生成的片段數", ("model",)
+)
+SSE_CONNECTIONS = REGISTRY.gauge(
+    "sse_connections", "目前開啟的 Server-Sent Events 連線數", ("stream",)
+)
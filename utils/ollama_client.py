@@ -0,0 +1,273 @@
+"""
+Ollama HTTP 客戶端
+所有 Ollama API 請求共用同一個連線池 (keep-alive)，避免每次請求重新建立 TCP 連線
+
+- 連線與讀取分別設定逾時；串流請求的讀取逾時是兩個片段之間的最長等待時間，
+  Ollama 停止回應時請求會失敗，而不會永遠佔用工作線程
+- 只對連線錯誤 (請求尚未送達 Ollama) 進行有限次數的重試，生成請求不會被重複執行
+- 串流回應 (NDJSON) 逐行解析，生成內容先收集為片段列表再一次合併，累積時間與輸出長度成正比
+"""
+import json
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.metrics import OLLAMA_REQUEST_DURATION, OLLAMA_REQUEST_ERRORS, OLLAMA_TOKENS
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 逐行讀取串流回應時每次從連線讀取的位元組數
+_STREAM_READ_SIZE = 8192
+
+
+class OllamaClientException(Exception):
+    """Ollama 請求異常"""
+    pass
+
+
+class OllamaClient:
+    """共用連線池的 Ollama API 客戶端 (線程安全)"""
+
+    def __init__(self, host, port, connect_timeout=5.0, read_timeout=300.0, max_retries=3,
+                 retry_backoff=0.5, pool_size=10):
+        """
+        初始化客戶端
+
+        Args:
+            host: Ollama 主機地址
+            port: Ollama 端口
+            connect_timeout: 建立連線的逾時 (秒)
+            read_timeout: 等待回應資料的逾時 (秒)；串流請求為兩個片段之間的最長間隔
+            max_retries: 連線錯誤的最大重試次數
+            retry_backoff: 重試間隔的退避係數 (秒)
+            pool_size: 連線池保留的連線數量 (應不小於同時進行的請求數)
+        """
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = (connect_timeout, read_timeout)
+
+        # 讀取錯誤與錯誤狀態碼不重試: 生成請求可能已經在 Ollama 上執行
+        retry = Retry(total=max_retries, connect=max_retries, read=False, status=0,
+                      backoff_factor=retry_backoff, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        # 模型名稱 -> 最大 context 長度
+        self._context_lengths = {}
+
+    def list_models(self, timeout=3.0):
+        """
+        獲取 Ollama 上可用的模型名稱
+
+        Args:
+            timeout: 請求逾時 (秒)，頁面載入時使用較短的逾時
+
+        Returns:
+            list: 模型名稱
+        """
+        try:
+            with OLLAMA_REQUEST_DURATION.time(api="tags"):
+                response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+        except requests.RequestException as e:
+            OLLAMA_REQUEST_ERRORS.inc(api="tags")
+            raise OllamaClientException(f"連接 Ollama 服務時發生錯誤: {e}")
+
+        if response.status_code != 200:
+            OLLAMA_REQUEST_ERRORS.inc(api="tags")
+            raise OllamaClientException(f"Ollama API 返回錯誤: {response.status_code} - {response.text}")
+
+        return [model['name'] for model in response.json().get('models', [])]
+
+    def context_length(self, model, timeout=10.0):
+        """
+        查詢模型支援的最大 context 長度 (結果會快取)
+
+        Args:
+            model: 模型名稱
+            timeout: 請求逾時 (秒)
+
+        Returns:
+            int: 最大 context token 數；無法取得時返回 None
+        """
+        if model in self._context_lengths:
+            return self._context_lengths[model]
+
+        try:
+            with OLLAMA_REQUEST_DURATION.time(api="show"):
+                response = self.session.post(f"{self.base_url}/api/show", json={"model": model}, timeout=timeout)
+            if response.status_code != 200:
+                raise OllamaClientException(f"Ollama API 返回錯誤: {response.status_code} - {response.text}")
+            model_info = response.json().get("model_info") or {}
+        except (requests.RequestException, ValueError, OllamaClientException) as e:
+            OLLAMA_REQUEST_ERRORS.inc(api="show")
+            logger.warning(f"無法取得模型 {model} 的 context 長度: {e}")
+            return None
+
+        # 例如 "llama.context_length"、"phi3.context_length"
+        length = next((value for key, value in model_info.items() if key.endswith(".context_length")), None)
+        self._context_lengths[model] = int(length) if length else None
+        return self._context_lengths[model]
+
+    def generate(self, model, prompt, system=None, options=None, on_chunk=None, keep_raw=False):
+        """
+        發送串流生成請求並收集完整輸出
+
+        Args:
+            model: 模型名稱
+            prompt: 提示詞
+            system: 系統提示詞 (可選)
+            options: 生成參數 (可選)
+            on_chunk: 每收到一個片段時呼叫，簽名為 on_chunk(chunk, tokens_received) (可選)
+            keep_raw: 是否保留每一行原始回應 (調試用)
+
+        Returns:
+            dict: content、chunks (輸出片段列表)、final_chunk、tokens、request_started、first_token_at、
+                finished_at，keep_raw 時另有 raw_chunks
+
+        Raises:
+            OllamaClientException: 請求失敗、Ollama 回報錯誤，或串流在 done 回應之前結束
+        """
+        data = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True
+        }
+        if system:
+            data["system"] = system
+        if options:
+            data["options"] = options
+
+        request_started = time.perf_counter()
+        first_token_at = None
+        final_chunk = None
+        tokens_received = 0
+        parts = []
+        raw_chunks = [] if keep_raw else None
+        token_counter = OLLAMA_TOKENS.labels(model=model)
+
+        try:
+            with self.session.post(f"{self.base_url}/api/generate", json=data, stream=True,
+                                   timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    raise OllamaClientException(
+                        f"Ollama API 返回錯誤: {response.status_code} - {response.text}"
+                    )
+
+                for line in response.iter_lines(chunk_size=_STREAM_READ_SIZE):
+                    if not line:
+                        continue
+                    try:
+                        json_line = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"無法解析 JSON: {line}")
+                        continue
+
+                    if keep_raw:
+                        raw_chunks.append(json_line)
+
+                    if "error" in json_line:
+                        raise OllamaClientException(f"Ollama 生成失敗: {json_line['error']}")
+
+                    chunk = json_line.get("response")
+                    if chunk:
+                        parts.append(chunk)
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        token_counter.inc()
+
+                        tokens_received += 1
+                        if on_chunk is not None:
+                            on_chunk(chunk, tokens_received)
+
+                    # 檢查是否完成生成
+                    if json_line.get("done", False):
+                        final_chunk = json_line
+                        break
+
+        except OllamaClientException:
+            OLLAMA_REQUEST_ERRORS.inc(api="generate")
+            raise
+        except requests.RequestException as e:
+            OLLAMA_REQUEST_ERRORS.inc(api="generate")
+            raise OllamaClientException(f"連接 Ollama 服務時發生錯誤: {e}")
+
+        finished_at = time.perf_counter()
+        OLLAMA_REQUEST_DURATION.observe(finished_at - request_started, api="generate")
+
+        # 連線在 done 回應之前結束時輸出不完整，不能當作成功的結果使用 (也不可存入快取)
+        if final_chunk is None:
+            OLLAMA_REQUEST_ERRORS.inc(api="generate")
+            raise OllamaClientException(f"Ollama 串流在完成前結束 (已收到 {tokens_received} 個片段)")
+
+        result = {
+            "content": "".join(parts),
+            "chunks": parts,
+            "final_chunk": final_chunk,
+            "tokens": tokens_received,
+            "request_started": request_started,
+            "first_token_at": first_token_at,
+            "finished_at": finished_at,
+        }
+        if keep_raw:
+            result["raw_chunks"] = raw_chunks
+        return result
+
+    def close(self):
+        """關閉連線池"""
+        self.session.close()
+
+
+# 行程內共享的客戶端實例 (依主機與端口區分)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ollama_client(host=None, port=None, config=None):
+    """
+    取得行程內共享的 Ollama 客戶端
+
+    Args:
+        host: Ollama 主機地址，為 None 時使用 DEFAULT_OLLAMA_HOST
+        port: Ollama 端口，為 None 時使用 DEFAULT_OLLAMA_PORT
+        config: 應用配置，僅在第一次建立客戶端時使用；為 None 時使用 current_app.config
+
+    Returns:
+        OllamaClient 實例
+    """
+    if host is None or port is None:
+        if config is None:
+            from flask import current_app
+            config = current_app.config
+        host = host or config.get('DEFAULT_OLLAMA_HOST', 'localhost')
+        port = port or config.get('DEFAULT_OLLAMA_PORT', '11434')
+
+    key = (host, str(port))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if config is None:
+                from flask import current_app
+                config = current_app.config
+
+            client = OllamaClient(
+                host,
+                port,
+                connect_timeout=config.get('OLLAMA_CONNECT_TIMEOUT', 5.0),
+                read_timeout=config.get('OLLAMA_READ_TIMEOUT', 300.0),
+                max_retries=config.get('OLLAMA_MAX_RETRIES', 3),
+                pool_size=config.get('OLLAMA_POOL_SIZE', 10)
+            )
+            _clients[key] = client
+
+    return client
@@ -0,0 +1,46 @@
+"""
+處理結果產物
+將模型的原始輸出保存為精簡的檔案，供之後只重跑部分階段時使用
+"""
+import gzip
+import json
+import logging
+import os
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    """將 numpy 純量等非標準型別轉換為 JSON 可序列化的值"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"無法序列化的型別: {type(value).__name__}")
+
+
+def save_whisper_result(result, path):
+    """
+    將 Whisper 轉錄結果 (含片段與逐字時間戳記) 保存為 gzip 壓縮的 JSON
+
+    Args:
+        result: whisper_model.transcribe 的返回值
+        path: 輸出路徑 (建議使用 .json.gz 副檔名)
+
+    Returns:
+        str: 輸出路徑
+    """
+    tmp_path = f"{path}.part"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(result, f, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+    os.replace(tmp_path, path)
+
+    logger.info(f"已保存 Whisper 原始結果到: {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    return path
+
+
+def load_whisper_result(path):
+    """讀取 save_whisper_result 保存的 Whisper 轉錄結果"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,120 @@
+"""
+說話者指派工具
+為每個轉錄片段找出重疊時間最長的說話者片段
+
+以排序後的區間陣列取代逐一比對所有 (轉錄片段, 說話者片段) 組合:
+只有可能重疊的組合會被列為候選，重疊時間以 NumPy 向量化計算
+"""
+import heapq
+
+import numpy as np
+
+# 沒有任何說話者片段重疊時使用的標籤
+UNKNOWN_SPEAKER = "unknown"
+
+
+def assign_speakers(transcript_segments, speaker_segments, unknown=UNKNOWN_SPEAKER):
+    """
+    為每個轉錄片段指派說話者
+
+    與逐一比對的結果完全相同: 取重疊時間最長的說話者片段；
+    重疊時間相同時取原始順序中較前面的片段；沒有正的重疊時間時為 unknown
+
+    Args:
+        transcript_segments: 轉錄片段列表，每個元素包含 "start" 與 "end"
+        speaker_segments: 說話者片段列表，每個元素包含 "start"、"end" 與 "speaker"
+        unknown: 沒有重疊時使用的標籤
+
+    Returns:
+        list: 與 transcript_segments 相同長度的說話者標籤列表
+    """
+    n_transcripts = len(transcript_segments)
+    if n_transcripts == 0:
+        return []
+    if not speaker_segments:
+        return [unknown] * n_transcripts
+
+    t_start = np.array([seg["start"] for seg in transcript_segments], dtype=np.float64)
+    t_end = np.array([seg["end"] for seg in transcript_segments], dtype=np.float64)
+    s_start = np.array([seg["start"] for seg in speaker_segments], dtype=np.float64)
+    s_end = np.array([seg["end"] for seg in speaker_segments], dtype=np.float64)
+
+    pair_t, pair_s = _candidate_pairs(t_start, t_end, s_start, s_end)
+
+    labels = [unknown] * n_transcripts
+    if len(pair_t) == 0:
+        return labels
+
+    # 向量化計算重疊時間
+    overlap = np.minimum(t_end[pair_t], s_end[pair_s]) - np.maximum(t_start[pair_t], s_start[pair_s])
+    positive = overlap > 0
+    pair_t, pair_s, overlap = pair_t[positive], pair_s[positive], overlap[positive]
+
+    if len(pair_t) == 0:
+        return labels
+
+    # 依 (轉錄片段, 重疊時間由大到小, 原始順序) 排序，每個轉錄片段取第一個
+    order = np.lexsort((pair_s, -overlap, pair_t))
+    pair_t, pair_s = pair_t[order], pair_s[order]
+    first = np.ones(len(pair_t), dtype=bool)
+    first[1:] = pair_t[1:] != pair_t[:-1]
+
+    for t_index, s_index in zip(pair_t[first].tolist(), pair_s[first].tolist()):
+        labels[t_index] = speaker_segments[s_index]["speaker"]
+
+    return labels
+
+
+def _candidate_pairs(t_start, t_end, s_start, s_end):
+    """
+    列出可能重疊的 (轉錄片段, 說話者片段) 索引組合
+
+    說話者片段與轉錄片段 [a, b) 有正的重疊時間時，必定屬於以下兩者之一:
+    1. 起點落在 [a, b) 之間: 在依起點排序的陣列中是連續區間，以二分搜尋取得
+    2. 起點早於 a 且終點晚於 a (涵蓋 a): 以掃描線依 a 的順序維護涵蓋中的片段
+    兩類互不重疊，因此不會產生重複的組合
+
+    Returns:
+        tuple: (轉錄片段索引陣列, 說話者片段原始索引陣列)
+    """
+    s_order = np.argsort(s_start, kind="stable")
+    sorted_start = s_start[s_order]
+
+    # 1. 起點落在轉錄片段內的說話者片段
+    lo = np.searchsorted(sorted_start, t_start, side="left")
+    hi = np.searchsorted(sorted_start, t_end, side="left")
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+
+    range_t = np.repeat(np.arange(len(t_start)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    range_s = s_order[np.repeat(lo, counts) + offsets]
+
+    # 2. 涵蓋轉錄片段起點的說話者片段 (掃描線 + 以終點排序的最小堆積)
+    cover_t = []
+    cover_s = []
+    active = []
+    next_speaker = 0
+    sorted_end = s_end[s_order].tolist()
+    sorted_start_list = sorted_start.tolist()
+    s_order_list = s_order.tolist()
+    t_start_list = t_start.tolist()
+
+    for t_index in np.argsort(t_start, kind="stable").tolist():
+        point = t_start_list[t_index]
+
+        while next_speaker < len(sorted_start_list) and sorted_start_list[next_speaker] < point:
+            heapq.heappush(active, (sorted_end[next_speaker], s_order_list[next_speaker]))
+            next_speaker += 1
+
+        # 移除已結束的片段後，堆積中剩餘的片段終點皆晚於 point
+        while active and active[0][0] <= point:
+            heapq.heappop(active)
+
+        for _, s_index in active:
+            cover_t.append(t_index)
+            cover_s.append(s_index)
+
+    pair_t = np.concatenate([range_t, np.array(cover_t, dtype=range_t.dtype)])
+    pair_s = np.concatenate([range_s, np.array(cover_s, dtype=range_s.dtype)])
+    return pair_t, pair_s
@@ -107,66 +107,25 @@ def stream_from_ollama(ollama_host, ollama_port, model, prompt, system=None,
     Returns:
         bool: 是否成功
     """
-    import requests
+    from utils.ollama_client import get_ollama_client
 
-    # 建立請求 URL
-    url = f"http://{ollama_host}:{ollama_port}/api/generate"
+    def handle_chunk(chunk, tokens_received):
+        # 如果提供了隊列，將 chunk 加入隊列
+        if queue_obj is not None:
+            queue_obj.put(chunk)
 
-    # 構建請求數據
-    data = {
-        "model": model,
-        "prompt": prompt,
-        "stream": True
-    }
-
-    if system:
-        data["system"] = system
-
-    if options:
-        data["options"] = options
-
-    # 准備請求 headers
-    headers = {"Content-Type": "application/json"}
+        # 如果提供了回調函數，調用回調
+        if on_chunk is not None:
+            on_chunk(chunk)
 
     try:
         # 發送請求
         logger.info(f"連接到 Ollama 服務 ({ollama_host}:{ollama_port})")
         logger.info(f"使用模型: {model}")
 
-        response = requests.post(url, headers=headers, json=data, stream=True)
-
-        # 檢查響應狀態
-        if response.status_code != 200:
-            logger.error(f"Ollama API 返回錯誤: {response.status_code} - {response.text}")
-            return False
-
-        # 處理響應
-        content = ""
-
-        for line in response.iter_lines():
-            if line:
-                try:
-                    json_line = json.loads(line)
-
-                    # 獲取生成的文本
-                    if "response" in json_line:
-                        chunk = json_line["response"]
-                        content += chunk
-
-                        # 如果提供了隊列，將 chunk 加入隊列
-                        if queue_obj is not None:
-                            queue_obj.put(chunk)
-
-                        # 如果提供了回調函數，調用回調
-                        if on_chunk is not None:
-                            on_chunk(chunk)
-
-                    # 檢查是否完成生成
-                    if json_line.get("done", False):
-                        break
-
-                except json.JSONDecodeError:
-                    logger.warning(f"無法解析 JSON: {line}")
+        get_ollama_client(ollama_host, ollama_port).generate(
+            model, prompt, system=system, options=options, on_chunk=handle_chunk
+        )
 
         # 返回成功標誌
         return True
@@ -0,0 +1,54 @@
+"""
+Token 數量估算工具
+不依賴特定模型的分詞器，以字元類別粗估 LLM 的 token 數量，用於決定提示詞切割與 context 大小
+
+- CJK 文字 (中日韓漢字、假名、諺文與全形標點) 大約每個字一個 token
+- 英文單字大約每 6 個字母一個 token，數字大約每 3 位一個 token
+- 其他標點與符號各自算一個 token，空白併入相鄰的 token 不另外計算
+
+估算值可能低於實際值 (部分模型的中文字會拆成多個 token)，決定 context 大小時應另外保留餘裕
+"""
+import re
+
+# CJK 文字
+_CJK_CHARS = r'\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef'
+_CJK_PATTERN = re.compile(f'[{_CJK_CHARS}]')
+
+# 非 CJK 的文字片段: 英文單字、數字、其他非空白字元
+_TOKEN_PATTERN = re.compile(f'([A-Za-z]+)|([0-9]+)|[^\\s{_CJK_CHARS}A-Za-z0-9]')
+
+# 字數統計: 英文單字、數字或單一的 CJK 文字 (不含全形標點)
+_WORD_PATTERN = re.compile(r"[A-Za-z]+(?:['\u2019][A-Za-z]+)*|[0-9]+(?:[.,][0-9]+)*|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text):
+    """粗估文字的 token 數量"""
+    if not text:
+        return 0
+
+    tokens = len(_CJK_PATTERN.findall(text))
+    for match in _TOKEN_PATTERN.finditer(text):
+        word, number = match.group(1), match.group(2)
+        if word:
+            tokens += (len(word) + 5) // 6
+        elif number:
+            tokens += (len(number) + 2) // 3
+        else:
+            tokens += 1
+    return tokens
+
+
+def count_words(text):
+    """
+    計算文本中的字數
+    中文以單字為單位，英文以空格分隔的單詞為單位 (標點符號與空白不計)
+
+    Args:
+        text: 要計算的文本
+
+    Returns:
+        字數
+    """
+    if not text:
+        return 0
+    return len(_WORD_PATTERN.findall(text))
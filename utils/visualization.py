@@ -0,0 +1,130 @@
+"""
+說話者分割可視化工具
+使用 matplotlib 物件導向 API (Figure + Agg 畫布) 繪圖，不使用 pyplot 的全域狀態，
+可在多個線程中同時繪製；每位說話者的所有片段以一次 hlines 呼叫批次繪製
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib import cm
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# 設定日誌
+logger = logging.getLogger(__name__)
+
+# 圖表解析度設定: (寬度英吋, dpi)
+THUMBNAIL = "thumbnail"
+FULL = "full"
+RESOLUTIONS = {
+    THUMBNAIL: (8, 80),
+    FULL: (12, 300),
+}
+
+# 背景繪圖的線程池 (繪圖不在音訊處理的關鍵路徑上)
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+
+def thumbnail_path_for(visualization_path, static_folder):
+    """
+    取得網頁顯示用縮圖的路徑 (位於靜態目錄中與完整圖表相同的上傳 ID 子目錄)
+
+    Args:
+        visualization_path: 完整解析度圖表路徑
+        static_folder: 靜態可視化圖表根目錄
+    """
+    upload_id = os.path.basename(os.path.dirname(visualization_path))
+    stem = os.path.splitext(os.path.basename(visualization_path))[0]
+    return os.path.join(static_folder, upload_id, f"{stem}_thumb.png")
+
+
+def render_diarization(segments, output_path, resolution=FULL):
+    """
+    繪製說話者分割時間軸並儲存為 PNG
+
+    Args:
+        segments: 含 start、end、speaker 欄位的 DataFrame
+        output_path: 輸出圖檔路徑
+        resolution: THUMBNAIL 或 FULL
+
+    Returns:
+        str: 輸出圖檔路徑
+    """
+    width, dpi = RESOLUTIONS[resolution]
+
+    speakers = list(pd.unique(segments['speaker']))
+    colors = cm.tab10(np.linspace(0, 1, max(len(speakers), 1)))
+    height = max(3.0, min(12.0, 1.5 + 0.5 * len(speakers)))
+
+    fig = Figure(figsize=(width, height))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.set_title("Speech Diarization Visualization")
+    ax.set_xlabel("Time (seconds)")
+    ax.set_ylabel("Speaker")
+
+    # 每位說話者以一次呼叫繪製所有片段
+    line_width = 6 if resolution == FULL else 4
+    for index, speaker in enumerate(speakers):
+        speaker_df = segments[segments['speaker'] == speaker]
+        ax.hlines(
+            y=np.full(len(speaker_df), index),
+            xmin=speaker_df['start'].to_numpy(),
+            xmax=speaker_df['end'].to_numpy(),
+            colors=[colors[index]],
+            linewidth=line_width
+        )
+
+    ax.set_yticks(range(len(speakers)))
+    ax.set_yticklabels([str(speaker) for speaker in speakers])
+    ax.set_ylim(-0.5, len(speakers) - 0.5)
+
+    # 添加網格
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.tight_layout()
+
+    # 先寫入暫存檔再取代，避免同時繪製或讀取到寫入一半的圖檔
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.{threading.get_ident()}.part"
+    fig.savefig(tmp_path, dpi=dpi, bbox_inches='tight', format='png')
+    os.replace(tmp_path, output_path)
+
+    logger.info(f"已儲存可視化圖表 ({resolution}) 到: {output_path}")
+    return output_path
+
+
+def ensure_rendered(csv_path, output_path, resolution=FULL):
+    """
+    確保圖表存在且比轉錄 CSV 新，必要時從 CSV 重新繪製
+
+    Returns:
+        str: 圖檔路徑；CSV 不存在或繪圖失敗時返回 None
+    """
+    if not csv_path or not os.path.exists(csv_path):
+        return output_path if os.path.exists(output_path) else None
+
+    if os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(csv_path):
+        return output_path
+
+    try:
+        segments = pd.read_csv(csv_path, usecols=['start', 'end', 'speaker'])
+        return render_diarization(segments, output_path, resolution)
+    except Exception as e:
+        logger.error(f"生成可視化圖表時發生錯誤: {e}")
+        return None
+
+
+def render_in_background(csv_path, output_path, resolution=THUMBNAIL):
+    """在背景線程中繪製圖表"""
+    global _render_executor
+
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="visualization")
+
+    return _render_executor.submit(ensure_rendered, csv_path, output_path, resolution)